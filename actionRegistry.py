@@ -0,0 +1,54 @@
+import time
+from importlib import import_module
+
+from logger import Logger
+from consts import *
+
+#Modules and classes required by each action. Modules are imported only when action is selected.
+ACTION_MODULES = {
+                  ACTION_CLEAN : [ ('cleanup', 'Cleanup') ],
+                  ACTION_CREATE_USERDEF : [],
+                  ACTION_PREPARE : [ ('prepare', 'Preparation'), ('cleanup', 'Cleanup') ],
+                  ACTION_BUILD : [ ('builder', 'Builder'), ('cleanup', 'Cleanup') ],
+                  ACTION_BACKUP : [ ('backup', 'Backup') ],
+                  ACTION_UPLOAD_BACKUP : [ ('backup', 'Backup'), ('uploadBackup', 'UploadBackup') ],
+                  ACTION_RESTORE_BACKUP : [ ('uploadBackup', 'UploadBackup') ],
+                  ACTION_CREATE_NUGET : [ ('createNuget', 'CreateNuget') ],
+                  ACTION_RELEASE_NOTES : [ ('releaseNotes', 'ReleaseNotes') ],
+                  ACTION_UPDATE_SAMPLE : [ ('updateSample', 'UpdateSample') ],
+                  ACTION_PUBLISH_NUGET : [ ('publishNuget', 'PublishNuget') ],
+                  ACTION_RUN_UNITTESTS : [ ('unitTestRunner', 'UnitTestRunner') ],
+                  ACTION_SET_NUGET_KEY : [ ('nugetUtility', 'NugetUtility') ],
+                  ACTION_SET_SERVER_NOTE_VERSION : [ ('releaseNotes', 'ReleaseNotes') ],
+                  ACTION_RENDER_RELEASE_NOTES : [ ('releaseNotes', 'ReleaseNotes') ],
+                }
+
+class ActionRegistry:
+  """
+    Maps actions to the modules that implement them and imports only modules required for selected actions.
+  """
+
+  #Import time in seconds for each loaded action
+  importTimes = dict()
+
+  @classmethod
+  def load(cls, actions, showTiming = False):
+    """
+      Imports modules required for specified actions.
+      :param actions: List of actions to load.
+      :param showTiming: If True, import time for each action is logged.
+      :return classes: Dictionary with class name as key and loaded class as value.
+    """
+    classes = dict()
+    logger = Logger.getLogger('ActionRegistry')
+
+    for action in actions:
+      start_time = time.time()
+      for moduleName, className in ACTION_MODULES.get(action, []):
+        classes[className] = getattr(import_module(moduleName), className)
+      cls.importTimes[action] = time.time() - start_time
+
+      if showTiming:
+        logger.info('Import time for action ' + action + ': ' + '%.3f' % cls.importTimes[action] + 's')
+
+    return classes
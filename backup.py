@@ -1,4 +1,7 @@
 import os
+import glob
+import json
+import time
 from datetime import datetime
 
 import config
@@ -8,6 +11,7 @@ from helper import convertToPlatformPath
 import errors
 from errors import NO_ERROR
 from logger import Logger
+from backupStore import BackupStore
 class Backup:
 
   @classmethod
@@ -20,11 +24,14 @@ class Backup:
       backupFolder = 'Backup'
           
     cls.backupPath = os.path.join(Settings.userWorkingPath,convertToPlatformPath(backupFolder))
+    #Files are stored once in content store, and backup folders contain hard links to them
+    BackupStore.init(os.path.join(Settings.userWorkingPath, config.BACKUP_STORE_PATH))
     #If backup folder exists delete it, or add time suffix to folder name
     if os.path.exists(cls.backupPath):
       if Settings.overwriteBackup:
-        if not Utility.deleteFolders([cls.backupPath]):
+        if not BackupStore.deleteBackup(cls.backupPath):
           ret = errors.ERROR_BUILD_BACKUP_DELETION_FAILED
+        cls.removeFromIndex(cls.getBackupName(cls.backupPath))
       else:
         timeSuffix = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
         cls.backupPath = os.path.join(Settings.userWorkingPath,convertToPlatformPath(backupFolder) + '_' + timeSuffix)
@@ -44,14 +51,18 @@ class Backup:
     ret = NO_ERROR
     #Backup folder name
     targetFolder = target + '_' + platform + '_' + cpu + '_' + configuration 
+    #Content hash of each backed up file, by relative path
+    manifest = dict()
 
-    nativeOutputPath = convertToPlatformPath(config.BUILT_LIBS_DESTINATION_PATH.replace('[BUILD_OUTPUT]',config.BUILD_OUTPUT_PATH).replace('[TARGET]',target).replace('[PLATFORM]',platform).replace('[CPU]',cpu).replace('[CONFIGURATION]',configuration))
-    nativeOutputPathLib = os.path.join(Settings.webrtcPath, nativeOutputPath)
+    nativeOutputPathLib, wrapperOutputPath = cls.getOutputPaths(target, platform, cpu, configuration)
 
     if ret == NO_ERROR:
       nativeDestinationPath = os.path.join(cls.backupPath,targetFolder,'native')
-      if not Utility.copyFolder(nativeOutputPathLib, nativeDestinationPath):
+      result, nativeManifest = BackupStore.addFolder(nativeOutputPathLib, nativeDestinationPath)
+      if not result:
         ret = errors.ERROR_BUILD_BACKUP_FAILED
+      for relativePath, fileHash in nativeManifest.items():
+        manifest['native/' + relativePath] = fileHash
       if ret == NO_ERROR:
         cls.logger.debug("Native output copied: " + nativeOutputPathLib)
       else:
@@ -59,15 +70,13 @@ class Backup:
 
     if ret == NO_ERROR:  
       if Settings.buildWrapper:
-        #Determine wrapper projects output path
-        wrapperRelativeOutputPath = convertToPlatformPath(Utility.getValueForTargetAndPlatformDict(config.TARGET_WRAPPER_PROJECTS_OUTPUT_PATHS, target, platform))
-        if wrapperRelativeOutputPath != '':
-          wrapperRootOutputPath = os.path.join(Settings.rootSdkPath,wrapperRelativeOutputPath)
-          #wrapperRootOutputPath = os.path.join(Settings.rootSdkPath,convertToPlatformPath(config.WEBRTC_WRAPPER_PROJECTS_OUTPUT_PATH))
-          wrapperOutputPath =  os.path.join(wrapperRootOutputPath, configuration, cpu)
+        if wrapperOutputPath != '':
           wrapperDestinationPath = os.path.join(cls.backupPath,targetFolder,'wrapper')
-          if not Utility.copyFolder(wrapperOutputPath, wrapperDestinationPath):
+          result, wrapperManifest = BackupStore.addFolder(wrapperOutputPath, wrapperDestinationPath)
+          if not result:
             ret = errors.ERROR_BUILD_BACKUP_FAILED
+          for relativePath, fileHash in wrapperManifest.items():
+            manifest['wrapper/' + relativePath] = fileHash
           if ret == NO_ERROR:
             cls.logger.debug("Wrapper projects copied: " + wrapperOutputPath)
           else:
@@ -75,8 +84,207 @@ class Backup:
         else:
           cls.logger.warning('Wrapper output folder doesn\'t exist!')
 
+    if ret == NO_ERROR:
+      try:
+        with open(os.path.join(cls.backupPath, targetFolder, config.BACKUP_MANIFEST_FILE_NAME), 'w') as manifestFile:
+          json.dump(manifest, manifestFile, indent=2, sort_keys=True)
+        cls.addToIndex(targetFolder, manifest)
+      except Exception as error:
+        cls.logger.error(str(error))
+        ret = errors.ERROR_BUILD_BACKUP_FAILED
+
     if ret != NO_ERROR:
       cls.logger.error('Backup failed!')
 
     return ret
-    
\ No newline at end of file
+    
+
+  @staticmethod
+  def getOutputPaths(target, platform, cpu, configuration):
+    """
+      Returns native and wrapper output paths that are backed up.
+      :param target: Target name (ortc or webrtc)
+      :param platform: Platform name
+      :param cpu: Target CPU
+      :param configuration: Configuration
+      :return nativeOutputPath, wrapperOutputPath: Wrapper output path is empty string if target doesn't have wrapper projects.
+    """
+    nativeOutputPath = convertToPlatformPath(config.BUILT_LIBS_DESTINATION_PATH.replace('[BUILD_OUTPUT]',config.BUILD_OUTPUT_PATH).replace('[TARGET]',target).replace('[PLATFORM]',platform).replace('[CPU]',cpu).replace('[CONFIGURATION]',configuration))
+    nativeOutputPathLib = os.path.join(Settings.webrtcPath, nativeOutputPath)
+
+    #Determine wrapper projects output path
+    wrapperOutputPath = ''
+    wrapperRelativeOutputPath = convertToPlatformPath(Utility.getValueForTargetAndPlatformDict(config.TARGET_WRAPPER_PROJECTS_OUTPUT_PATHS, target, platform))
+    if wrapperRelativeOutputPath != '':
+      wrapperRootOutputPath = os.path.join(Settings.rootSdkPath,wrapperRelativeOutputPath)
+      wrapperOutputPath =  os.path.join(wrapperRootOutputPath, configuration, cpu)
+
+    return nativeOutputPathLib, wrapperOutputPath
+
+  @classmethod
+  def getBackupName(cls, backupPath):
+    """
+      Returns backup name used in backups index. It is backup folder path relative to user working directory.
+    """
+    return os.path.relpath(backupPath, Settings.userWorkingPath).replace(os.sep, '/')
+
+  @classmethod
+  def getBackupPath(cls, backupName):
+    """
+      Returns backup folder path for backup name from index.
+    """
+    return os.path.join(Settings.userWorkingPath, backupName.replace('/', os.sep))
+
+  @classmethod
+  def loadIndex(cls):
+    """
+      Loads backups index.
+      :return index: Dictionary with 'latest' backup name and 'backups' dictionary,
+                     with backup name as key and dictionary with timestamp, combinations and size as value.
+    """
+    index = { 'latest' : '', 'backups' : dict() }
+    indexPath = os.path.join(Settings.userWorkingPath, config.BACKUP_INDEX_FILE)
+    if os.path.isfile(indexPath):
+      try:
+        with open(indexPath, 'r') as indexFile:
+          index = json.load(indexFile)
+      except Exception as error:
+        Logger.getLogger('backup').warning('Failed reading backups index: ' + str(error))
+    return index
+
+  @classmethod
+  def saveIndex(cls, index):
+    """
+      Saves backups index.
+    """
+    Utility.writeFileAtomically(os.path.join(Settings.userWorkingPath, config.BACKUP_INDEX_FILE), json.dumps(index, indent=2, sort_keys=True))
+
+  @classmethod
+  def getLatestBackup(cls):
+    """
+      Returns the latest backup from index.
+      :return backupName: Latest backup folder, relative to user working directory, or empty string if index doesn't exist.
+    """
+    latest = cls.loadIndex().get('latest', '')
+    if latest != '' and os.path.isdir(cls.getBackupPath(latest)):
+      return latest
+    return ''
+
+  @classmethod
+  def addToIndex(cls, targetFolder, manifest):
+    """
+      Adds backed up combination to the current backup in index, and marks current backup as the latest.
+      :param targetFolder: Combination folder name.
+      :param manifest: Dictionary with relative file path as key and hash as value.
+    """
+    index = cls.loadIndex()
+    backupName = cls.getBackupName(cls.backupPath)
+    backup = index['backups'].setdefault(backupName, { 'timestamp' : time.time(), 'combinations' : dict() })
+    backup['combinations'][targetFolder] = sum(BackupStore.getObjectSize(fileHash) for fileHash in manifest.values())
+    backup['size'] = sum(backup['combinations'].values())
+    index['latest'] = backupName
+    cls.saveIndex(index)
+
+  @classmethod
+  def removeFromIndex(cls, backupName):
+    """
+      Removes backup from index.
+    """
+    index = cls.loadIndex()
+    if backupName in index['backups']:
+      del index['backups'][backupName]
+      if index['latest'] == backupName:
+        index['latest'] = max(index['backups'], key=lambda name: index['backups'][name]['timestamp']) if len(index['backups']) > 0 else ''
+      cls.saveIndex(index)
+
+  @classmethod
+  def getBackupHashes(cls, backupName):
+    """
+      Returns set of hashes of all files in backup, read from combinations manifests.
+    """
+    hashes = set()
+    backupPath = cls.getBackupPath(backupName)
+    for manifestPath in glob.iglob(os.path.join(backupPath, '*', config.BACKUP_MANIFEST_FILE_NAME)):
+      with open(manifestPath, 'r') as manifestFile:
+        hashes.update(json.load(manifestFile).values())
+    return hashes
+
+  @classmethod
+  def selectBackupsToKeep(cls, backups, retention):
+    """
+      Selects backups that satisfy retention rules: the last N, the newest per day for the last N days,
+      the newest per week for the last N weeks. The current backup is always kept.
+      :param backups: Dictionary from backups index.
+      :param retention: Dictionary with keepLast, keepDaily and keepWeekly values.
+      :return keep: List of backup names to keep, the newest first.
+    """
+    newestFirst = sorted(backups, key=lambda name: backups[name]['timestamp'], reverse=True)
+    keep = set(newestFirst[:max(retention.get('keepLast', 0), 1)])
+
+    for rule, periodFormat in (('keepDaily', '%Y-%m-%d'), ('keepWeekly', '%Y-%W')):
+      periods = []
+      for name in newestFirst:
+        period = datetime.fromtimestamp(backups[name]['timestamp']).strftime(periodFormat)
+        if period not in periods:
+          if len(periods) >= retention.get(rule, 0):
+            break
+          periods.append(period)
+          keep.add(name)
+
+    return [name for name in newestFirst if name in keep]
+
+  @classmethod
+  def prune(cls):
+    """
+      Deletes backups that don't satisfy retention rules from backupRetention, or exceed its maximal total size,
+      and deletes stored files that are no longer referenced. Stored files are collected even without retention rules,
+      so files of overwritten backup don't stay in the store.
+      :return ret: NO_ERROR if pruning was successfull. Otherwise returns error code
+    """
+    ret = NO_ERROR
+    retention = Settings.backupRetention
+
+    index = cls.loadIndex()
+    backups = index['backups']
+
+    #Backups deleted outside of script are removed from index
+    for name in list(backups):
+      if not os.path.isdir(cls.getBackupPath(name)):
+        del backups[name]
+
+    if retention.get('keepLast', 0) > 0 or retention.get('keepDaily', 0) > 0 or retention.get('keepWeekly', 0) > 0:
+      keep = cls.selectBackupsToKeep(backups, retention)
+    else:
+      keep = sorted(backups, key=lambda name: backups[name]['timestamp'], reverse=True)
+    hashes = dict((name, cls.getBackupHashes(name)) for name in backups)
+
+    #Drop the oldest backups until total size of stored files is under the limit
+    maxTotalBytes = int(retention.get('maxTotalGB', 0) * 1024 * 1024 * 1024)
+    if maxTotalBytes > 0:
+      while len(keep) > 1:
+        totalBytes = sum(BackupStore.getObjectSize(fileHash) for fileHash in set().union(*[hashes[name] for name in keep]))
+        if totalBytes <= maxTotalBytes:
+          break
+        keep.pop()
+
+    for name in sorted(backups, key=lambda name: backups[name]['timestamp']):
+      if name in keep:
+        continue
+      #Files held exclusively by backup are the space that deleting it frees
+      referencedByOthers = set().union(*[hashes[other] for other in backups if other != name])
+      exclusiveBytes = sum(BackupStore.getObjectSize(fileHash) for fileHash in hashes[name] - referencedByOthers)
+      cls.logger.info('Pruning backup ' + name + ' (' + str(backups[name].get('size', 0)) + ' bytes, ' + str(exclusiveBytes) + ' bytes held exclusively)')
+      if BackupStore.deleteBackup(cls.getBackupPath(name)):
+        del backups[name]
+        del hashes[name]
+      else:
+        ret = errors.ERROR_BUILD_BACKUP_DELETION_FAILED
+
+    freedBytes = BackupStore.removeUnreferencedObjects(set().union(*hashes.values()) if len(hashes) > 0 else set())
+    cls.logger.info('Backup store: ' + str(freedBytes) + ' bytes freed by pruning.')
+
+    if index.get('latest', '') not in backups:
+      index['latest'] = keep[0] if len(keep) > 0 and keep[0] in backups else ''
+    cls.saveIndex(index)
+
+    return ret
@@ -0,0 +1,254 @@
+import os
+import json
+import stat
+import shutil
+import hashlib
+import tempfile
+from multiprocessing.pool import ThreadPool
+
+import config
+from logger import Logger
+from utility import Utility
+
+#Mode of stored files, that are shared by all backups
+READ_ONLY_MODE = stat.S_IREAD | stat.S_IRGRP | stat.S_IROTH
+
+class BackupStore:
+  """
+    Content addressed store for backup files. Each file is kept once, under its content hash,
+    and backups are trees of hard links to stored files, so unchanged files don't take additional space.
+    Stored files are read-only, so writing to file in backup tree can't change the same file in other backups.
+  """
+
+  logger = None
+  storePath = None
+  #Memoised hashes {absolute file path : [size, mtime, hash]}
+  hashCache = dict()
+
+  @classmethod
+  def init(cls, storePath):
+    """
+      Inits logger and loads hash cache.
+      :param storePath: Folder where files are stored.
+    """
+    cls.logger = Logger.getLogger('BackupStore')
+    cls.storePath = storePath
+    cls.hashCache = dict()
+
+    cacheFilePath = os.path.join(cls.storePath, config.BACKUP_STORE_HASH_CACHE_FILE)
+    if os.path.isfile(cacheFilePath):
+      try:
+        with open(cacheFilePath, 'r') as cacheFile:
+          cls.hashCache = json.load(cacheFile)
+      except Exception as error:
+        cls.logger.warning('Failed loading backup hash cache: ' + str(error))
+
+  @classmethod
+  def saveHashCache(cls):
+    """
+      Saves hash cache, so files that are not changed are not hashed again by next backup.
+    """
+    try:
+      if not os.path.isdir(cls.storePath):
+        os.makedirs(cls.storePath)
+      Utility.writeFileAtomically(os.path.join(cls.storePath, config.BACKUP_STORE_HASH_CACHE_FILE), json.dumps(cls.hashCache))
+    except Exception as error:
+      cls.logger.warning('Failed saving backup hash cache: ' + str(error))
+
+  @classmethod
+  def hashFiles(cls, filePaths):
+    """
+      Returns content hashes of files. Hashes of files whose size and modification time are not changed are taken from cache,
+      others are calculated in parallel.
+      :param filePaths: List of file paths.
+      :return hashes: Dictionary with file path as key and hash as value.
+    """
+    hashes = dict()
+    filesToHash = []
+    for filePath in filePaths:
+      fileStat = os.stat(filePath)
+      cached = cls.hashCache.get(os.path.abspath(filePath))
+      if cached != None and cached[0] == fileStat.st_size and cached[1] == fileStat.st_mtime:
+        hashes[filePath] = cached[2]
+      else:
+        filesToHash.append((filePath, fileStat.st_size, fileStat.st_mtime))
+
+    if len(filesToHash) > 0:
+      cls.logger.debug('Hashing ' + str(len(filesToHash)) + ' files, ' + str(len(hashes)) + ' hashes taken from cache.')
+      pool = ThreadPool(config.BACKUP_STORE_HASHING_WORKERS)
+      try:
+        fileHashes = pool.map(cls.__hashFile, [filePath for filePath, size, mtime in filesToHash])
+      finally:
+        pool.close()
+        pool.join()
+      for (filePath, size, mtime), fileHash in zip(filesToHash, fileHashes):
+        hashes[filePath] = fileHash
+        cls.hashCache[os.path.abspath(filePath)] = [size, mtime, fileHash]
+
+    return hashes
+
+  @classmethod
+  def addFolder(cls, source, destination):
+    """
+      Stores all files from source folder and recreates folder structure in destination folder, using hard links to stored files.
+      :param source: Folder to backup.
+      :param destination: Backup folder.
+      :return ret, manifest: True if folder is backed up, and dictionary with relative file path as key and hash as value.
+    """
+    manifest = dict()
+    if not os.path.exists(source):
+      cls.logger.error(source + ' folder doesn\'t exist.')
+      return False, manifest
+
+    filePaths = []
+    for root, dirs, files in os.walk(source):
+      for file in files:
+        filePaths.append(os.path.join(root, file))
+
+    try:
+      hashes = cls.hashFiles(filePaths)
+      storedFiles = 0
+      for filePath in filePaths:
+        fileHash = hashes[filePath]
+        objectPath = cls.getObjectPath(fileHash)
+        if not os.path.isfile(objectPath):
+          cls.__storeFile(filePath, objectPath)
+          storedFiles += 1
+        else:
+          cls.__protectObject(objectPath)
+
+        relativePath = os.path.relpath(filePath, source)
+        destinationPath = os.path.join(destination, relativePath)
+        if not os.path.exists(os.path.dirname(destinationPath)):
+          os.makedirs(os.path.dirname(destinationPath))
+        cls.__linkFile(objectPath, destinationPath)
+        manifest[relativePath.replace(os.sep, '/')] = fileHash
+
+      cls.logger.debug('Backed up ' + source + ': ' + str(len(filePaths)) + ' files, ' + str(storedFiles) + ' new in store.')
+    except Exception as error:
+      cls.logger.error(str(error))
+      return False, manifest
+    finally:
+      cls.saveHashCache()
+
+    return True, manifest
+
+  @classmethod
+  def getObjectPath(cls, fileHash):
+    """
+      Returns path of stored file with specified hash.
+    """
+    return os.path.join(cls.storePath, 'objects', fileHash[:2], fileHash)
+
+  @classmethod
+  def getObjectSize(cls, fileHash):
+    """
+      Returns size of stored file with specified hash, or 0 if it is not in the store.
+    """
+    objectPath = cls.getObjectPath(fileHash)
+    return os.path.getsize(objectPath) if os.path.isfile(objectPath) else 0
+
+  @classmethod
+  def deleteBackup(cls, backupPath):
+    """
+      Deletes backup folder. On Windows, read-only flag, shared with stored file, is cleared to delete the link,
+      and it is set again when stored file is linked to a new backup or when unreferenced files are removed.
+      :param backupPath: Backup folder.
+      :return ret: True if folder is deleted or if it doesn't exist.
+    """
+    if not os.path.exists(backupPath):
+      return True
+    try:
+      shutil.rmtree(backupPath, onerror=cls.__onDeleteError)
+    except Exception as error:
+      cls.logger.warning(str(error))
+      return False
+    return True
+
+  @classmethod
+  def removeUnreferencedObjects(cls, referencedHashes):
+    """
+      Deletes stored files that are not referenced by any backup, and makes sure that referenced ones are read-only.
+      :param referencedHashes: Set of hashes referenced by remaining backups.
+      :return freedBytes: Number of deleted bytes.
+    """
+    freedBytes = 0
+    objectsPath = os.path.join(cls.storePath, 'objects')
+    if not os.path.isdir(objectsPath):
+      return freedBytes
+
+    for prefix in os.listdir(objectsPath):
+      prefixPath = os.path.join(objectsPath, prefix)
+      for fileHash in os.listdir(prefixPath):
+        objectPath = os.path.join(prefixPath, fileHash)
+        if fileHash in referencedHashes:
+          cls.__protectObject(objectPath)
+        else:
+          try:
+            fileSize = os.path.getsize(objectPath)
+            os.chmod(objectPath, stat.S_IWRITE | stat.S_IREAD)
+            os.remove(objectPath)
+            freedBytes += fileSize
+          except Exception as error:
+            cls.logger.warning('Failed deleting ' + objectPath + ': ' + str(error))
+      if len(os.listdir(prefixPath)) == 0:
+        os.rmdir(prefixPath)
+
+    return freedBytes
+
+  #---------------------------------- Private methods --------------------------------------------
+  @staticmethod
+  def __hashFile(filePath):
+    """
+      Calculates sha256 hash of file content.
+    """
+    fileHash = hashlib.sha256()
+    with open(filePath, 'rb') as fileToHash:
+      for chunk in iter(lambda: fileToHash.read(config.BACKUP_STORE_HASH_CHUNK_SIZE), b''):
+        fileHash.update(chunk)
+    return fileHash.hexdigest()
+
+  @staticmethod
+  def __storeFile(filePath, objectPath):
+    """
+      Copies file to the store. File is copied to temporary file first, so interrupted copy doesn't leave incomplete object.
+    """
+    objectFolder = os.path.dirname(objectPath)
+    if not os.path.exists(objectFolder):
+      os.makedirs(objectFolder)
+    tempFile, tempPath = tempfile.mkstemp(dir=objectFolder)
+    os.close(tempFile)
+    try:
+      shutil.copyfile(filePath, tempPath)
+      if os.path.exists(objectPath):
+        os.remove(tempPath)
+      else:
+        os.chmod(tempPath, READ_ONLY_MODE)
+        os.rename(tempPath, objectPath)
+    except Exception:
+      if os.path.exists(tempPath):
+        os.remove(tempPath)
+      raise
+
+  @staticmethod
+  def __protectObject(objectPath):
+    """
+      Makes stored file read-only, if it is not.
+    """
+    if os.stat(objectPath).st_mode & (stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH):
+      os.chmod(objectPath, READ_ONLY_MODE)
+
+  @staticmethod
+  def __onDeleteError(function, path, excinfo):
+    """
+      Clears read only flag and retries deletion.
+    """
+    os.chmod(path, stat.S_IWRITE | stat.S_IREAD)
+    function(path)
+
+  @staticmethod
+  def __linkFile(objectPath, destinationPath):
+    """
+      Creates hard link to stored file. If hard link can't be created (i.e. backup is on another volume), file is copied.
+    """
+    Utility.linkFile(objectPath, destinationPath)
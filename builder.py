@@ -2,8 +2,11 @@ import os
 import subprocess
 import shutil 
 import signal
+import re
 import time
+import tempfile
 from datetime import datetime
+from multiprocessing.pool import ThreadPool
 
 import config
 from logger import Logger
@@ -16,6 +19,9 @@ from errors import error_codes, NO_ERROR
 from nugetUtility import NugetUtility
 
 class Builder:
+  #Worker that builds wrapper projects in background, while native libraries for other targets are built
+  wrapperPool = None
+
   @classmethod
   def init(cls):
     """
@@ -84,10 +90,6 @@ class Builder:
 
     #Switch to previously working directory
     Utility.popd()
-  
-    #Build wrapper library if option is enabled
-    if Settings.buildWrapper and ret == NO_ERROR:
-      ret = cls.buildWrapper(targetName ,platform, cpu, configuration)
 
     if ret == NO_ERROR:
       cls.logger.info('Running build for target: ' + targetName + '; platform: ' + platform + '; cpu: ' + cpu + '; configuration: ' + configuration + ', finished successfully!')
@@ -96,17 +98,45 @@ class Builder:
     return ret
 
   @classmethod
-  def buildWrapper(cls, target, platform, targetCPU, configuration):
+  def checkIfNativeLibsExist(cls, target, platform, cpu, configuration):
     """
-      Builds wrapper projects.
+      Checks if native libraries, required by wrapper projects, are copied to output folder.
       :param target: Name of the main target (ortc or webrtc)
       :param platform: Platform name
-      :param targetCPU: Target CPU
-      :param configuration: Configuration to build for
-      :return: NO_ERROR if build was successfull. Otherwise returns error code
+      :param cpu: Target CPU
+      :param configuration: Configuration
+      :return: True if output folder contains native libraries.
     """
+    destinationPath = convertToPlatformPath(config.BUILT_LIBS_DESTINATION_PATH.replace('[BUILD_OUTPUT]',config.BUILD_OUTPUT_PATH).replace('[TARGET]',target).replace('[PLATFORM]',platform).replace('[CPU]',cpu).replace('[CONFIGURATION]',configuration))
+    destinationPathLib = os.path.join(Settings.webrtcPath, destinationPath)
+    return os.path.isdir(destinationPathLib) and any(file.endswith('.lib') for file in os.listdir(destinationPathLib))
+
+  @classmethod
+  def startWrapperBuild(cls, target, platform, combinations):
+    """
+      Starts building wrapper projects in background, so native libraries for other targets and platforms can be built meanwhile.
+      :param target: Name of the main target (ortc or webrtc)
+      :param platform: Platform name
+      :param combinations: List of (cpu, configuration) tuples with built native libraries.
+      :return: Async result. Its get() returns build result and execution time.
+    """
+    if cls.wrapperPool == None:
+      #One wrapper solution is built at the time. MSBuild builds its projects in parallel.
+      cls.wrapperPool = ThreadPool(1)
+    return cls.wrapperPool.apply_async(cls.buildWrappers, (target, platform, combinations))
+
+  @classmethod
+  def buildWrappers(cls, target, platform, combinations):
+    """
+      Builds wrapper projects for all cpu and configuration combinations in one msbuild session.
+      :param target: Name of the main target (ortc or webrtc)
+      :param platform: Platform name
+      :param combinations: List of (cpu, configuration) tuples.
+      :return: NO_ERROR if build was successfull, otherwise returns error code, and execution time
+    """
+    start_time = time.time()
     ret = NO_ERROR
-    cls.logger.info('Building ' + target + ' wrapper projects for ' + targetCPU + ' for configuration  '+ configuration)
+    cls.logger.info('Building ' + target + ' ' + platform + ' wrapper projects for ' + str(combinations))
 
     #Get solution to build, for specified target and platform. Solution is obtained from config.TARGET_WRAPPER_SOLUTIONS
     solutionName = convertToPlatformPath(Utility.getValueForTargetAndPlatformDict(config.TARGET_WRAPPER_SOLUTIONS, target, platform))
@@ -114,44 +144,91 @@ class Builder:
     #If solution is not provided, return True like it was succefull
     if solutionName == '':
       cls.logger.warning('Solution with wrapper projects is not specified in config!')
-      return NO_ERROR
+      return NO_ERROR, time.time() - start_time
+
+    for cpu, configuration in combinations:
+      if not cls.checkIfNativeLibsExist(target, platform, cpu, configuration):
+        cls.logger.error('Native libraries for ' + target + ' ' + platform + ' ' + cpu + ' ' + configuration + ' are missing!')
+        return errors.ERROR_BUILD_BUILDING_WRAPPER_FAILED, time.time() - start_time
+
+    #Solution template path
+    solutionSourcePath = os.path.join(Settings.rootSdkPath,convertToPlatformPath(config.WEBRTC_SOLUTION_TEMPLATES_PATH),solutionName)
+    #Path where solution template will be copied
+    solutionDestinationPath = os.path.join(Settings.rootSdkPath,convertToPlatformPath(config.WEBRTC_SOLUTION_PATH),solutionName)
+    #Traversal project that builds all combinations for the solution
+    traversalProjectPath = os.path.splitext(solutionDestinationPath)[0] + config.WRAPPER_BUILD_PROJECT_SUFFIX
+    #Binary log is kept after build, so it can be inspected with MSBuild Structured Log Viewer
+    binaryLogPath = os.path.splitext(solutionDestinationPath)[0] + '.binlog'
 
     try:
-      #Solution template path
-      solutionSourcePath = os.path.join(Settings.rootSdkPath,convertToPlatformPath(config.WEBRTC_SOLUTION_TEMPLATES_PATH),solutionName)
-      #Path where solution template will be copied
-      solutionDestinationPath = os.path.join(Settings.rootSdkPath,convertToPlatformPath(config.WEBRTC_SOLUTION_PATH),solutionName)
-      
       #Copy template solution to solution folder
       if not Utility.copyFile(solutionSourcePath,solutionDestinationPath):
-        return errors.ERROR_BUILD_BUILDING_WRAPPER_FAILED
+        return errors.ERROR_BUILD_BUILDING_WRAPPER_FAILED, time.time() - start_time
+
+      with open(traversalProjectPath, 'w') as traversalProject:
+        traversalProject.write(Utility.createTraversalProject(solutionDestinationPath, 'Build', combinations))
 
-      #Restore nugets
-      cmdBuild = Settings.nugetExecutablePath + ' restore ' + solutionDestinationPath
-      result = NugetUtility.nuget_cli('restore', solutionDestinationPath)
-      #result = Utility.runSubprocess([cmdBuild], Settings.logLevel == 'DEBUG')
+      #Restore nugets, if package references changed since the last restore
+      result = NugetUtility.restore(solutionDestinationPath)
       if result == NO_ERROR:
-        #MSBuild command for building wrapper projects
-        cmdBuild = 'msbuild ' + solutionDestinationPath + ' /t:Build' + ' /p:Configuration=\"' + configuration + '\" /p:Platform=\"' + targetCPU + '\"'
+        #Toolsets are selected by msbuild for each platform, so environment for host cpu is used for all combinations
+        cmdVcVarsAll = '\"' +  Settings.vcvarsallPath + '\" ' + config.WINDOWS_COMPILER_OPTIONS[System.hostCPU][System.hostCPU]
+        cmdVcVarsAllClean = '\"' +  Settings.vcvarsallPath + '\" ' + '/clean_env'
+        #MSBuild command for building wrapper projects, for all combinations in parallel, reusing msbuild nodes between runs
+        cmdBuild = 'msbuild \"' + traversalProjectPath + '\" /m /nodeReuse:true /nologo /t:Build /bl:\"' + binaryLogPath + '\"'
         #Execute MSBuild command
-        result = Utility.runSubprocess([cls.cmdVcVarsAll, cmdBuild, cls.cmdVcVarsAllClean], Settings.logLevel == 'DEBUG')
+        result = Utility.runSubprocess([cmdVcVarsAll, cmdBuild, cmdVcVarsAllClean], Settings.logLevel == 'DEBUG')
         if result != NO_ERROR:
           ret = errors.ERROR_BUILD_BUILDING_WRAPPER_FAILED
-          cls.logger.error('Failed building ' + target + ' wrapper projects for ' + targetCPU + ' for configuration  '+ configuration)
+          cls.logger.error('Failed building ' + target + ' ' + platform + ' wrapper projects for ' + str(combinations))
+        cls.logWrapperBuildTimings(binaryLogPath)
       else:
         ret = errors.ERROR_BUILD_RESTORING_NUGET_FAILED
     except Exception as error:
       cls.logger.error(str(error))
-      cls.logger.error('Failed building ' + target + ' wrapper projects for ' + targetCPU + ' for configuration  '+ configuration)
+      cls.logger.error('Failed building ' + target + ' ' + platform + ' wrapper projects for ' + str(combinations))
       ret = errors.ERROR_BUILD_BUILDING_WRAPPER_FAILED
     finally:
-      #Delete solution used for building wrapper projects.
-      Utility.deleteFiles([solutionDestinationPath])
+      #Delete solution and traversal project used for building wrapper projects.
+      Utility.deleteFiles([solutionDestinationPath, traversalProjectPath])
 
     if ret == NO_ERROR:
-      cls.logger.info('Successfully finished building wrappers for target ' + target)
+      cls.logger.info('Successfully finished building wrappers for target ' + target + ' ' + platform)
 
-    return ret
+    return ret, time.time() - start_time
+
+  @classmethod
+  def logWrapperBuildTimings(cls, binaryLogPath):
+    """
+      Replays msbuild binary log with performance summary and logs the slowest wrapper projects.
+      :param binaryLogPath: Path to msbuild binary log.
+      :return timings: List of (milliseconds, project path) tuples, the slowest first.
+    """
+    timings = []
+    if not os.path.isfile(binaryLogPath):
+      return timings
+
+    summaryFile, summaryLogPath = tempfile.mkstemp(suffix='.log')
+    os.close(summaryFile)
+    try:
+      cmdReplay = 'msbuild \"' + binaryLogPath + '\" /nologo /noconlog /flp:PerformanceSummary;Verbosity=quiet;LogFile=\"' + summaryLogPath + '\"'
+      if Utility.runSubprocess([cmdReplay]) == NO_ERROR:
+        with open(summaryLogPath, 'r') as summaryLog:
+          summary = summaryLog.read()
+        #Project section lists lines like "  1234 ms  C:\path\project.vcxproj   2 calls"
+        projectSection = summary.split('Project Performance Summary:')[-1].split('Target Performance Summary:')[0]
+        for milliseconds, projectPath in re.findall(r'^\s*(\d+)\s+ms\s+(.+?)\s+\d+\s+calls', projectSection, re.MULTILINE):
+          if not projectPath.endswith(config.WRAPPER_BUILD_PROJECT_SUFFIX) and not projectPath.endswith('.sln'):
+            timings.append((int(milliseconds), projectPath))
+        timings.sort(reverse=True)
+        for milliseconds, projectPath in timings[:config.WRAPPER_BUILD_TIMINGS_TO_LOG]:
+          cls.logger.info('Wrapper project build time: ' + '%.1f' % (milliseconds / 1000.0) + 's ' + projectPath)
+    except Exception as error:
+      cls.logger.warning('Failed reading wrapper build timings: ' + str(error))
+    finally:
+      Utility.deleteFiles([summaryLogPath])
+
+    return timings
 
   @classmethod
   def buildTargets(cls, targets, targetCPU):
@@ -0,0 +1,675 @@
+import os
+import json
+import time
+import calendar
+import errno
+import shutil
+import hashlib
+import threading
+from collections import deque
+from multiprocessing.pool import ThreadPool
+try:
+  from urllib.request import Request, urlopen
+  from urllib.error import HTTPError
+except ImportError:
+  from urllib2 import Request, urlopen, HTTPError
+
+import config
+from logger import Logger
+from utility import Utility
+from errors import NO_ERROR, ERROR_UPLOAD_BACKUP_FAILED
+
+def httpRequest(method, url, data = None, headers = None):
+  """
+    Sends HTTP request.
+    :param method: HTTP method (GET, PUT, POST...).
+    :param url: Request URL.
+    :param data: Request body.
+    :param headers: Dictionary with request headers.
+    :return status, body: Response status and body.
+  """
+  #URL of resumed session is read from journal, and in python 2 unicode URL can't be sent with binary body
+  request = Request(str(url), data=data, headers=headers or dict())
+  request.get_method = lambda: method
+  response = urlopen(request, timeout=config.UPLOAD_REQUEST_TIMEOUT)
+  try:
+    return response.getcode(), response.read()
+  finally:
+    response.close()
+
+def httpDownload(url, filePath, headers = None):
+  """
+    Downloads URL content to file.
+    :param url: Request URL.
+    :param filePath: Path of the file to write.
+    :param headers: Dictionary with request headers.
+  """
+  response = urlopen(Request(url, headers=headers or dict()), timeout=config.UPLOAD_REQUEST_TIMEOUT)
+  try:
+    with open(filePath, 'wb') as downloadedFile:
+      for chunk in iter(lambda: response.read(config.UPLOAD_DOWNLOAD_CHUNK_SIZE), b''):
+        downloadedFile.write(chunk)
+  finally:
+    response.close()
+
+class UploadBackend(object):
+  """
+    Interface for upload destinations. Session returned by startSession has to be JSON serializable,
+    because it is saved in resume journal and passed to backend again when interrupted upload is continued.
+  """
+
+  #Maximal number of chunks that can be uploaded at the same time
+  maxChunksInFlight = config.UPLOAD_CHUNKS_IN_FLIGHT
+  #Chunk size has to be multiple of this value
+  chunkSizeMultiple = 1
+  #If True, file size has to be known when upload starts, so content can't be uploaded while it is written
+  requiresSize = False
+
+  def getId(self):
+    """
+      Returns string that identifies destination, so journal of upload to another destination is not resumed.
+    """
+    raise NotImplementedError()
+
+  def startSession(self, remoteName, size):
+    """
+      Starts upload of new file.
+      :param remoteName: File name at destination.
+      :param size: File size, or None if it is not known until the last chunk.
+      :return session: Dictionary with upload session data.
+    """
+    raise NotImplementedError()
+
+  def uploadChunk(self, session, offset, data, checksum, size):
+    """
+      Uploads file chunk.
+      :param session: Upload session.
+      :param offset: Chunk offset in file.
+      :param data: Chunk bytes.
+      :param checksum: SHA256 hex digest of chunk.
+      :param size: Total file size, or None if it is not known yet.
+    """
+    raise NotImplementedError()
+
+  def resumeSession(self, session, checksums, chunkSize):
+    """
+      Checks chunks recorded in journal against destination, before interrupted upload is resumed.
+      :param session: Upload session.
+      :param checksums: Dictionary with chunk index as key and SHA256 hex digest of uploaded chunk as value.
+      :param chunkSize: Chunk size.
+      :return checksums: Chunks that are uploaded, or None if session doesn't exist anymore.
+    """
+    return checksums
+
+  def finish(self, session, checksums, size):
+    """
+      Completes upload, and verifies uploaded file.
+      :param session: Upload session.
+      :param checksums: List with SHA256 hex digest of each chunk, in file order.
+      :param size: Total file size.
+      :return: True if uploaded file is complete, False if it is not, or None if destination can't verify it.
+    """
+    raise NotImplementedError()
+
+  def download(self, remoteName, filePath):
+    """
+      Downloads uploaded file. Raises exception if file doesn't exist at destination.
+      :param remoteName: File name at destination.
+      :param filePath: Path of the file to write.
+    """
+    raise NotImplementedError()
+
+  def read(self, remoteName):
+    """
+      Reads small file, with its version used for conditional write.
+      :param remoteName: File name at destination.
+      :return content, version: File bytes and version, or None, None if file doesn't exist at destination.
+    """
+    raise NotImplementedError()
+
+  def writeIfUnchanged(self, remoteName, content, version):
+    """
+      Writes small file, only if it is not changed since it was read.
+      :param remoteName: File name at destination.
+      :param content: File bytes.
+      :param version: Version returned by read, or None if file must not exist yet.
+      :return: True if file is written, False if it was changed meanwhile.
+    """
+    raise NotImplementedError()
+
+class LocalDirectoryBackend(UploadBackend):
+  """
+    Uploads to local folder. Chunks are written to .part file, which is verified and renamed when upload is finished.
+  """
+
+  def __init__(self, folderPath):
+    self.folderPath = os.path.abspath(folderPath)
+    self.lock = threading.Lock()
+
+  def getId(self):
+    return 'local:' + self.folderPath
+
+  def startSession(self, remoteName, size):
+    if not os.path.isdir(self.folderPath):
+      os.makedirs(self.folderPath)
+    partPath = os.path.join(self.folderPath, remoteName + '.part')
+    if not os.path.isdir(os.path.dirname(partPath)):
+      os.makedirs(os.path.dirname(partPath))
+    with open(partPath, 'wb') as partFile:
+      if size != None:
+        partFile.truncate(size)
+    return { 'partPath' : partPath, 'path' : os.path.join(self.folderPath, remoteName) }
+
+  def uploadChunk(self, session, offset, data, checksum, size):
+    with self.lock:
+      with open(session['partPath'], 'r+b') as partFile:
+        partFile.seek(offset)
+        partFile.write(data)
+
+  def finish(self, session, checksums, size):
+    chunkSize = config.UPLOAD_CHUNK_SIZE
+    if os.path.getsize(session['partPath']) != size:
+      return False
+    with open(session['partPath'], 'rb') as partFile:
+      for checksum in checksums:
+        if hashlib.sha256(partFile.read(chunkSize)).hexdigest() != checksum:
+          return False
+    if os.path.exists(session['path']):
+      os.remove(session['path'])
+    os.rename(session['partPath'], session['path'])
+    return True
+
+  def download(self, remoteName, filePath):
+    shutil.copyfile(os.path.join(self.folderPath, remoteName), filePath)
+
+  def read(self, remoteName):
+    path = os.path.join(self.folderPath, remoteName)
+    if not os.path.isfile(path):
+      return None, None
+    with open(path, 'rb') as remoteFile:
+      content = remoteFile.read()
+    return content, hashlib.sha256(content).hexdigest()
+
+  def writeIfUnchanged(self, remoteName, content, version):
+    #Lock file next to written file is shared by all writers, also from other machines if folder is shared
+    path = os.path.join(self.folderPath, remoteName)
+    lockPath = path + '.lock'
+    if not os.path.isdir(os.path.dirname(path)):
+      os.makedirs(os.path.dirname(path))
+    try:
+      lockFile = os.open(lockPath, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except OSError as error:
+      if error.errno != errno.EEXIST:
+        raise
+      #Lock left by interrupted writer is removed, and write is attempted again
+      if time.time() - os.path.getmtime(lockPath) > config.UPLOAD_LOCK_TIMEOUT:
+        os.remove(lockPath)
+      return False
+    try:
+      if self.read(remoteName)[1] != version:
+        return False
+      tempPath = path + '.tmp'
+      with open(tempPath, 'wb') as tempFile:
+        tempFile.write(content)
+      if os.path.exists(path):
+        os.remove(path)
+      os.rename(tempPath, path)
+      return True
+    finally:
+      os.close(lockFile)
+      os.remove(lockPath)
+
+class HttpPutBackend(UploadBackend):
+  """
+    Uploads chunks with HTTP PUT requests to URL/file name, using Content-Range header, and chunk checksum in header.
+  """
+
+  def __init__(self, url):
+    self.url = url.rstrip('/')
+
+  def getId(self):
+    return 'http:' + self.url
+
+  def startSession(self, remoteName, size):
+    return { 'url' : self.url + '/' + remoteName }
+
+  def uploadChunk(self, session, offset, data, checksum, size):
+    headers = {
+      'Content-Type' : 'application/octet-stream',
+      'Content-Range' : 'bytes ' + str(offset) + '-' + str(offset + len(data) - 1) + '/' + (str(size) if size != None else '*'),
+      config.UPLOAD_CHECKSUM_HEADER : checksum
+    }
+    status, body = httpRequest('PUT', session['url'], data, headers)
+    if status >= 300:
+      raise Exception('Chunk at ' + str(offset) + ' upload failed with status ' + str(status))
+
+  def finish(self, session, checksums, size):
+    #Size of uploaded file is compared with Content-Length of HEAD response, if server supports it
+    try:
+      request = Request(str(session['url']))
+      request.get_method = lambda: 'HEAD'
+      response = urlopen(request, timeout=config.UPLOAD_REQUEST_TIMEOUT)
+      try:
+        contentLength = response.info().get('Content-Length')
+      finally:
+        response.close()
+    except HTTPError as error:
+      if error.code == 404:
+        return False
+      if error.code in (405, 501):
+        return None
+      raise
+    if contentLength == None:
+      return None
+    return int(contentLength) == size
+
+  def download(self, remoteName, filePath):
+    httpDownload(self.url + '/' + remoteName, filePath)
+
+  def read(self, remoteName):
+    try:
+      response = urlopen(Request(str(self.url + '/' + remoteName)), timeout=config.UPLOAD_REQUEST_TIMEOUT)
+      try:
+        #Server without ETag doesn't support conditional write, and file is written unconditionally
+        return response.read(), response.info().get('ETag') or ''
+      finally:
+        response.close()
+    except HTTPError as error:
+      if error.code == 404:
+        return None, None
+      raise
+
+  def writeIfUnchanged(self, remoteName, content, version):
+    headers = { 'Content-Type' : 'application/octet-stream' }
+    if version == None:
+      headers['If-None-Match'] = '*'
+    elif version:
+      headers['If-Match'] = version
+    try:
+      httpRequest('PUT', self.url + '/' + remoteName, content, headers)
+      return True
+    except HTTPError as error:
+      if error.code == 412:
+        return False
+      raise
+
+class OneDriveBackend(UploadBackend):
+  """
+    Uploads to OneDrive through upload session. Session upload URL is preauthenticated, so access token is needed
+    only to create session. OneDrive accepts chunks only in order.
+  """
+
+  maxChunksInFlight = 1
+  chunkSizeMultiple = 320 * 1024
+  requiresSize = True
+
+  def __init__(self, folderName, accessToken):
+    self.folderName = folderName
+    self.accessToken = accessToken
+
+  def getId(self):
+    return 'onedrive:' + self.folderName
+
+  def startSession(self, remoteName, size):
+    url = config.ONEDRIVE_API_URL + '/me/drive/root:/' + self.folderName + '/' + remoteName + ':/createUploadSession'
+    body = json.dumps({ 'item' : { '@microsoft.graph.conflictBehavior' : 'replace' } }).encode('utf-8')
+    status, response = httpRequest('POST', url, body, { 'Authorization' : 'Bearer ' + self.accessToken, 'Content-Type' : 'application/json' })
+    session = json.loads(response.decode('utf-8'))
+    return { 'uploadUrl' : session['uploadUrl'], 'expirationDateTime' : session.get('expirationDateTime') }
+
+  def uploadChunk(self, session, offset, data, checksum, size):
+    headers = { 'Content-Range' : 'bytes ' + str(offset) + '-' + str(offset + len(data) - 1) + '/' + str(size) }
+    httpRequest('PUT', session['uploadUrl'], data, headers)
+
+  def resumeSession(self, session, checksums, chunkSize):
+    #Session lists ranges it still expects, and chunks from the first expected byte on are uploaded again
+    try:
+      status, response = httpRequest('GET', session['uploadUrl'])
+    except HTTPError as error:
+      if error.code in config.UPLOAD_SESSION_EXPIRED_STATUSES:
+        return None
+      raise
+    expectedRanges = json.loads(response.decode('utf-8')).get('nextExpectedRanges', [])
+    if len(expectedRanges) == 0:
+      return checksums
+    nextOffset = min(int(expectedRange.split('-')[0]) for expectedRange in expectedRanges)
+    return dict((index, checksum) for index, checksum in checksums.items() if (int(index) + 1) * chunkSize <= nextOffset)
+
+  def finish(self, session, checksums, size):
+    #The last chunk returns created item. Session without remaining ranges means that upload is complete.
+    try:
+      status, response = httpRequest('GET', session['uploadUrl'])
+      return len(json.loads(response.decode('utf-8')).get('nextExpectedRanges', [])) == 0
+    except Exception:
+      #Session doesn't exist anymore after the last chunk is uploaded
+      return True
+
+  def download(self, remoteName, filePath):
+    url = config.ONEDRIVE_API_URL + '/me/drive/root:/' + self.folderName + '/' + remoteName + ':/content'
+    httpDownload(url, filePath, { 'Authorization' : 'Bearer ' + self.accessToken })
+
+  def read(self, remoteName):
+    url = config.ONEDRIVE_API_URL + '/me/drive/root:/' + self.folderName + '/' + remoteName
+    try:
+      status, response = httpRequest('GET', url, None, { 'Authorization' : 'Bearer ' + self.accessToken })
+    except HTTPError as error:
+      if error.code == 404:
+        return None, None
+      raise
+    item = json.loads(response.decode('utf-8'))
+    #Download URL is preauthenticated
+    status, content = httpRequest('GET', item['@microsoft.graph.downloadUrl'])
+    return content, item['eTag']
+
+  def writeIfUnchanged(self, remoteName, content, version):
+    url = config.ONEDRIVE_API_URL + '/me/drive/root:/' + self.folderName + '/' + remoteName + ':/content'
+    headers = { 'Authorization' : 'Bearer ' + self.accessToken, 'Content-Type' : 'application/octet-stream' }
+    if version == None:
+      url += '?@microsoft.graph.conflictBehavior=fail'
+    else:
+      headers['If-Match'] = version
+    try:
+      httpRequest('PUT', url, content, headers)
+      return True
+    except HTTPError as error:
+      if error.code in (409, 412):
+        return False
+      raise
+
+class UploadStream(object):
+  """
+    Writable stream that uploads written data in chunks, while it is written. The last chunk is held back until the stream
+    is closed, so it is uploaded with total size. Chunks that resume journal records as uploaded are not uploaded again,
+    but their checksums are compared with the journal, to make sure that the same content is written again.
+  """
+
+  def __init__(self, backend, journal, saveJournal, pool):
+    """
+      :param backend: Upload backend.
+      :param journal: Resume journal, with upload session, chunk size and checksums of uploaded chunks.
+      :param saveJournal: Function that saves the journal.
+      :param pool: Thread pool that uploads chunks.
+    """
+    self.backend = backend
+    self.journal = journal
+    self.saveJournal = saveJournal
+    self.pool = pool
+    self.chunkSize = journal['chunkSize']
+    self.buffer = []
+    self.bufferSize = 0
+    self.offset = 0
+    self.chunksCount = 0
+    #Chunks that are uploaded, in chunk order (index, checksum, async result)
+    self.pending = deque()
+    #Set if written chunk differs from the chunk recorded in journal
+    self.contentChanged = False
+    #Set if destination doesn't accept chunks for upload session anymore
+    self.sessionExpired = False
+
+  def write(self, data):
+    self.buffer.append(data)
+    self.bufferSize += len(data)
+    self.offset += len(data)
+    while self.bufferSize > self.chunkSize:
+      data = b''.join(self.buffer)
+      self.__sendChunk(data[:self.chunkSize], None)
+      self.buffer = [data[self.chunkSize:]]
+      self.bufferSize = len(self.buffer[0])
+
+  def tell(self):
+    return self.offset
+
+  def close(self):
+    """
+      Uploads the last chunk, and waits until all chunks are uploaded.
+      :return size, checksums: Total size, and list of chunk checksums in file order.
+    """
+    self.__sendChunk(b''.join(self.buffer), self.offset)
+    self.buffer = []
+    while len(self.pending) > 0:
+      self.__recordChunk()
+    return self.offset, [self.journal['checksums'][str(index)] for index in range(self.chunksCount)]
+
+  def __sendChunk(self, data, size):
+    index = self.chunksCount
+    self.chunksCount += 1
+    checksum = hashlib.sha256(data).hexdigest()
+    uploadedChecksum = self.journal['checksums'].get(str(index))
+    if uploadedChecksum != None:
+      if uploadedChecksum != checksum:
+        self.contentChanged = True
+        raise Exception('Chunk ' + str(index) + ' differs from the chunk uploaded before.')
+      return
+    if len(self.pending) >= self.backend.maxChunksInFlight:
+      self.__recordChunk()
+    self.pending.append((index, checksum, self.pool.apply_async(self.backend.uploadChunk,
+                                                                (self.journal['session'], index * self.chunkSize, data, checksum, size))))
+
+  def __recordChunk(self):
+    """
+      Waits for the oldest chunk in flight and records it in journal.
+    """
+    index, checksum, result = self.pending.popleft()
+    try:
+      result.get()
+    except HTTPError as error:
+      self.sessionExpired = error.code in config.UPLOAD_SESSION_EXPIRED_STATUSES
+      raise
+    self.journal['checksums'][str(index)] = checksum
+    self.saveJournal()
+
+class ChunkedUpload:
+  """
+    Uploads file in fixed size chunks, with several chunks in flight. Uploaded chunks and their checksums are recorded
+    in journal next to the file, so interrupted upload continues from the first chunk that is not uploaded.
+  """
+
+  logger = None
+
+  @classmethod
+  def init(cls):
+    """
+      Inits logger.
+    """
+    cls.logger = Logger.getLogger('ChunkedUpload')
+
+  @classmethod
+  def upload(cls, filePath, backend, remoteName = None, journalPath = None, contentKey = None):
+    """
+      Uploads file.
+      :param filePath: File to upload.
+      :param backend: Upload backend.
+      :param remoteName: File name at destination. If None, local file name is used.
+      :param journalPath: Path of resume journal. If None, journal is created next to the file.
+      :param contentKey: String that identifies file content, so upload of the same content is resumed even if file
+        is created again. If None, file modification time is used.
+      :return ret: NO_ERROR if upload was successfull. Otherwise returns error code
+    """
+    if remoteName == None:
+      remoteName = os.path.basename(filePath)
+    if journalPath == None:
+      journalPath = filePath + config.UPLOAD_JOURNAL_SUFFIX
+
+    size = os.path.getsize(filePath)
+    if contentKey == None:
+      contentKey = str(os.path.getmtime(filePath))
+    chunkSize = config.UPLOAD_CHUNK_SIZE - config.UPLOAD_CHUNK_SIZE % backend.chunkSizeMultiple
+    chunksCount = max((size + chunkSize - 1) // chunkSize, 1)
+
+    try:
+      #Upload starts again once with new session, if destination doesn't accept chunks for resumed session
+      for attempt in range(2):
+        journal = cls.__startSession(journalPath, backend, remoteName, size, contentKey, chunkSize)
+        if len(journal['checksums']) > 0:
+          cls.logger.info('Resuming upload of ' + remoteName + ', ' + str(len(journal['checksums'])) + ' of ' + str(chunksCount) + ' chunks already uploaded.')
+        try:
+          cls.__uploadChunks(filePath, backend, journal, journalPath, chunksCount)
+          break
+        except HTTPError as error:
+          if attempt > 0 or error.code not in config.UPLOAD_SESSION_EXPIRED_STATUSES:
+            raise
+          cls.__discardSession(journalPath, remoteName)
+
+      return cls.__finish(backend, journal, journalPath, [journal['checksums'][str(index)] for index in range(chunksCount)], size)
+    except Exception as error:
+      cls.logger.error('Upload of ' + remoteName + ' is interrupted: ' + str(error) + '. It will be resumed next time.')
+      return ERROR_UPLOAD_BACKUP_FAILED
+
+  @classmethod
+  def uploadStream(cls, writeContent, backend, remoteName, contentKey, journalPath):
+    """
+      Uploads content while it is written, without writing it to file first. Backend must not require file size upfront.
+      Content with the same key has to be written in the same way each time. Interrupted upload is resumed by writing
+      the content again, and uploading only chunks that are not recorded in journal.
+      :param writeContent: Function that writes content to stream passed as argument, and returns True if content is written.
+      :param backend: Upload backend.
+      :param remoteName: File name at destination.
+      :param contentKey: String that identifies content.
+      :param journalPath: Path of resume journal.
+      :return ret: NO_ERROR if upload was successfull. Otherwise returns error code
+    """
+    chunkSize = config.UPLOAD_CHUNK_SIZE - config.UPLOAD_CHUNK_SIZE % backend.chunkSizeMultiple
+    pool = ThreadPool(backend.maxChunksInFlight)
+    stream = None
+    try:
+      #Content is written again once with new session, if destination doesn't accept chunks for resumed session
+      for attempt in range(2):
+        journal = cls.__startSession(journalPath, backend, remoteName, None, contentKey, chunkSize)
+        if len(journal['checksums']) > 0:
+          cls.logger.info('Resuming upload of ' + remoteName + ', ' + str(len(journal['checksums'])) + ' chunks already uploaded.')
+        stream = UploadStream(backend, journal, lambda: cls.__saveJournal(journalPath, journal), pool)
+        try:
+          if not writeContent(stream):
+            raise Exception('content is not written')
+          size, checksums = stream.close()
+          break
+        except Exception:
+          if attempt > 0 or not stream.sessionExpired:
+            raise
+          cls.__discardSession(journalPath, remoteName)
+
+      return cls.__finish(backend, journal, journalPath, checksums, size)
+    except Exception as error:
+      if stream != None and stream.contentChanged:
+        cls.logger.error('Content of ' + remoteName + ' differs from interrupted upload. Upload will start again next time.')
+        Utility.deleteFiles([journalPath])
+      else:
+        cls.logger.error('Upload of ' + remoteName + ' is interrupted: ' + str(error) + '. It will be resumed next time.')
+      return ERROR_UPLOAD_BACKUP_FAILED
+    finally:
+      pool.close()
+      pool.join()
+
+  #---------------------------------- Private methods --------------------------------------------
+  @classmethod
+  def __startSession(cls, journalPath, backend, remoteName, size, contentKey, chunkSize):
+    """
+      Resumes upload session from journal, if destination still has it, or starts new session.
+      :return journal: Resume journal, with upload session, chunk size and checksums of uploaded chunks.
+    """
+    journal = cls.__loadJournal(journalPath, backend, remoteName, size, contentKey, chunkSize)
+    if journal != None:
+      checksums = backend.resumeSession(journal['session'], journal['checksums'], chunkSize)
+      if checksums != None:
+        journal['checksums'] = checksums
+        cls.__saveJournal(journalPath, journal)
+        return journal
+      cls.logger.info('Upload session of ' + remoteName + ' doesn\'t exist anymore. Upload starts again.')
+
+    journal = {
+      'backend' : backend.getId(),
+      'remoteName' : remoteName,
+      'size' : size,
+      'contentKey' : contentKey,
+      'chunkSize' : chunkSize,
+      'session' : backend.startSession(remoteName, size),
+      'checksums' : dict()
+    }
+    cls.__saveJournal(journalPath, journal)
+    return journal
+
+  @classmethod
+  def __uploadChunks(cls, filePath, backend, journal, journalPath, chunksCount):
+    """
+      Uploads file chunks that are not recorded in journal.
+    """
+    remoteName = journal['remoteName']
+    chunkSize = journal['chunkSize']
+    size = journal['size']
+    chunksToUpload = [index for index in range(chunksCount) if str(index) not in journal['checksums']]
+
+    def uploadChunk(index):
+      with open(filePath, 'rb') as fileToUpload:
+        fileToUpload.seek(index * chunkSize)
+        data = fileToUpload.read(chunkSize)
+      checksum = hashlib.sha256(data).hexdigest()
+      backend.uploadChunk(journal['session'], index * chunkSize, data, checksum, size)
+      return index, checksum
+
+    pool = ThreadPool(backend.maxChunksInFlight)
+    try:
+      #Chunks are recorded as they finish, so journal always lists only uploaded chunks
+      resultsIterator = pool.imap(uploadChunk, chunksToUpload) if backend.maxChunksInFlight == 1 else pool.imap_unordered(uploadChunk, chunksToUpload)
+      for index, checksum in resultsIterator:
+        journal['checksums'][str(index)] = checksum
+        cls.__saveJournal(journalPath, journal)
+        cls.logger.debug('Uploaded chunk ' + str(index + 1) + '/' + str(chunksCount) + ' of ' + remoteName)
+    finally:
+      pool.close()
+      pool.join()
+
+  @classmethod
+  def __discardSession(cls, journalPath, remoteName):
+    """
+      Removes journal of upload session that destination doesn't accept chunks for anymore.
+    """
+    cls.logger.warning('Upload session of ' + remoteName + ' is not valid anymore. Upload starts again.')
+    Utility.deleteFiles([journalPath])
+
+  @classmethod
+  def __finish(cls, backend, journal, journalPath, checksums, size):
+    """
+      Completes upload and removes resume journal.
+      :return ret: NO_ERROR if uploaded file is complete, or if destination can't verify it.
+    """
+    remoteName = journal['remoteName']
+    complete = backend.finish(journal['session'], checksums, size)
+    if complete == False:
+      cls.logger.error('Uploaded file ' + remoteName + ' is not complete. Upload will start again next time.')
+      Utility.deleteFiles([journalPath])
+      return ERROR_UPLOAD_BACKUP_FAILED
+    if complete == None:
+      cls.logger.warning('Upload destination can\'t verify that ' + remoteName + ' is complete.')
+
+    Utility.deleteFiles([journalPath])
+    cls.logger.info('Uploaded ' + remoteName + ' (' + str(size) + ' bytes).')
+    return NO_ERROR
+
+  @classmethod
+  def __loadJournal(cls, journalPath, backend, remoteName, size, contentKey, chunkSize):
+    """
+      Loads resume journal if it belongs to the same file content, destination and chunk size.
+    """
+    if not os.path.isfile(journalPath):
+      return None
+    try:
+      with open(journalPath, 'r') as journalFile:
+        journal = json.load(journalFile)
+      if journal['backend'] == backend.getId() and journal['remoteName'] == remoteName and journal['size'] == size and \
+         journal.get('contentKey') == contentKey and journal['chunkSize'] == chunkSize:
+        #Expired session is not resumed, its upload URL is not valid anymore
+        expiration = journal['session'].get('expirationDateTime')
+        if expiration != None and calendar.timegm(time.strptime(expiration[:19], '%Y-%m-%dT%H:%M:%S')) <= time.time():
+          cls.logger.info('Upload session of ' + remoteName + ' expired. Upload starts again.')
+          return None
+        return journal
+    except Exception as error:
+      cls.logger.warning('Failed reading upload journal: ' + str(error))
+    return None
+
+  @classmethod
+  def __saveJournal(cls, journalPath, journal):
+    """
+      Saves resume journal.
+    """
+    Utility.writeFileAtomically(journalPath, json.dumps(journal))
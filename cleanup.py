@@ -1,12 +1,16 @@
 import os
 import shutil 
 import glob
+import re
+import json
+import time
 
 import config
 from logger import Logger
 from settings import Settings
 from utility import Utility
 from system import System
+from trash import Trash
 import errors
 from errors import error_codes, NO_ERROR
 from helper import convertToPlatformPath
@@ -54,8 +58,9 @@ class Cleanup:
     for folderPath in glob.iglob(convertToPlatformPath(outputFolderToClean)):
       foldersToDelete.append(folderPath)
 
-    #Delete all folders marked for deletion
-    if not Utility.deleteFolders(foldersToDelete):
+    #Move all folders marked for deletion to trash. They are deleted in background while other actions run.
+    result, tombstonePath = Trash.moveFoldersToTrash(foldersToDelete, Settings.webrtcPath)
+    if not result:
       ret = errors.ERROR_CLEANUP_DELETING_OUTPUT_FAILED
 
     Utility.popd()
@@ -68,7 +73,8 @@ class Cleanup:
   @classmethod
   def cleanWrapperProjects(cls, cleanupTarget='*', cleanupPlatform='*', cleanupCpu='*', configuration='*'):
     """
-      Cleans wrapper projects.
+      Cleans wrapper projects. If wrapper projects don't have custom clean targets, wrapper output folders are deleted directly.
+      Otherwise all cpu and configuration combinations are cleaned by one msbuild run per solution.
       :param target: Target (ortc, webrtc or * )
       :param platform: Platform (win, winuwp or *)
       :param cpu: CPU (arm, x86, x64 or *)
@@ -92,6 +98,11 @@ class Cleanup:
     else:
       cpus = [cleanupCpu]
 
+    if configuration == '*':
+      configurations = Settings.targetConfigurations
+    else:
+      configurations = [configuration]
+
     for target in targets:
       for platform in platforms:
         #Get solution to clean, for specified target and platform. Solution is obtained from config.TARGET_WRAPPER_SOLUTIONS
@@ -102,45 +113,312 @@ class Cleanup:
           cls.logger.warning('Solution with wrapper projects is not specified in config!')
           continue
 
-        for cpu in cpus:
-          #Set the PATH and environment variables for command-line builds (e.g. vcvarsall.bat x64_x86)
-          cls.cmdVcVarsAll = '\"' +  Settings.vcvarsallPath + '\" ' + config.WINDOWS_COMPILER_OPTIONS[System.hostCPU][cpu]
+        #Solution template path
+        solutionSourcePath = os.path.join(Settings.rootSdkPath,convertToPlatformPath(config.WEBRTC_SOLUTION_TEMPLATES_PATH),solutionName)
+        #Path where solution template will be copied
+        solutionDestinationPath = os.path.join(Settings.rootSdkPath,convertToPlatformPath(config.WEBRTC_SOLUTION_PATH),solutionName)
+
+        #Fast path. Without custom clean targets, clean only deletes wrapper output, so folders are deleted without starting msbuild.
+        if not cls.hasCustomCleanTargets(solutionSourcePath, os.path.dirname(solutionDestinationPath)):
+          cls.logger.debug('Deleting ' + target + ' ' + platform + ' wrapper output folders')
+          if not cls.deleteWrapperOutputFolders(target, platform, cpus, configurations):
+            cls.logger.error('Failed deleting ' + target + ' ' + platform + ' wrapper output folders')
+            ret = errors.ERROR_CLEANUP_DELETING_OUTPUT_WRAPPER_FAILED
+          continue
+
+        #Traversal project that cleans all configuration and cpu combinations for the solution
+        traversalProjectPath = os.path.splitext(solutionDestinationPath)[0] + config.WRAPPER_CLEAN_PROJECT_SUFFIX
+        try:
+          #Copy template solution to solution folder
+          if not Utility.copyFile(solutionSourcePath,solutionDestinationPath):
+            return errors.ERROR_CLEANUP_DELETING_OUTPUT_WRAPPER_FAILED
+
+          with open(traversalProjectPath, 'w') as traversalProject:
+            traversalProject.write(Utility.createTraversalProject(solutionDestinationPath, 'Clean', [(cpu, configuration) for cpu in cpus for configuration in configurations]))
+
+          #Clean doesn't depend on target cpu toolset, so environment for host cpu is used for all combinations
+          cls.cmdVcVarsAll = '\"' +  Settings.vcvarsallPath + '\" ' + config.WINDOWS_COMPILER_OPTIONS[System.hostCPU][System.hostCPU]
           cls.cmdVcVarsAllClean = '\"' +  Settings.vcvarsallPath + '\" ' + '/clean_env'
 
-          try:
-            #Solution template path
-            solutionSourcePath = os.path.join(Settings.rootSdkPath,convertToPlatformPath(config.WEBRTC_SOLUTION_TEMPLATES_PATH),solutionName)
-            #Path where solution template will be copied
-            solutionDestinationPath = os.path.join(Settings.rootSdkPath,convertToPlatformPath(config.WEBRTC_SOLUTION_PATH),solutionName)
-            
-            #Copy template solution to solution folder
-            if not Utility.copyFile(solutionSourcePath,solutionDestinationPath):
-              return errors.ERROR_CLEANUP_DELETING_OUTPUT_WRAPPER_FAILED
-
-            if (configuration != '*'):
-              configurationPart = ' /p:Configuration=\"' + configuration + '\"'
-            else:
-              configurationPart = ''
-
-            if (cpu != '*'):
-              cpuPart =  ' /p:Platform=\"' + cpu + '\"'
-            else:
-              cpuPart = ''
-              
-            #MSBuild command for building wrapper projects
-            cmdBuild = 'msbuild ' + solutionDestinationPath + ' /t:Clean' + configurationPart + cpuPart
-            #Execute MSBuild command
-            result = Utility.runSubprocess([cls.cmdVcVarsAll, cmdBuild, cls.cmdVcVarsAllClean], Settings.logLevel == 'DEBUG')
-            if result != NO_ERROR:
-              ret = errors.ERROR_CLEANUP_DELETING_OUTPUT_WRAPPER_FAILED
-              cls.logger.error('Failed cleaning ' + target + ' wrapper projects for ' + cpu + ' for configuration  '+ configuration)
-          except Exception as error:
-            cls.logger.error(str(error))
-            cls.logger.error('Failed cleaning ' + target + ' wrapper projects for ' + cpu + ' for configuration  '+ configuration)
+          #MSBuild command for cleaning wrapper projects, for all combinations in parallel
+          cmdBuild = 'msbuild \"' + traversalProjectPath + '\" /m /nologo /t:Clean'
+          #Execute MSBuild command
+          result = Utility.runSubprocess([cls.cmdVcVarsAll, cmdBuild, cls.cmdVcVarsAllClean], Settings.logLevel == 'DEBUG')
+          if result != NO_ERROR:
             ret = errors.ERROR_CLEANUP_DELETING_OUTPUT_WRAPPER_FAILED
-          finally:
-            #Delete solution used for building wrapper projects.
-            Utility.deleteFiles([solutionDestinationPath])
+            cls.logger.error('Failed cleaning ' + target + ' wrapper projects for ' + str(cpus) + ' for configurations '+ str(configurations))
+        except Exception as error:
+          cls.logger.error(str(error))
+          cls.logger.error('Failed cleaning ' + target + ' wrapper projects for ' + str(cpus) + ' for configurations '+ str(configurations))
+          ret = errors.ERROR_CLEANUP_DELETING_OUTPUT_WRAPPER_FAILED
+        finally:
+          #Delete solution and traversal project used for cleaning wrapper projects.
+          Utility.deleteFiles([solutionDestinationPath, traversalProjectPath])
+
+    return ret
+
+  @classmethod
+  def hasCustomCleanTargets(cls, solutionPath, solutionFolder):
+    """
+      Checks if any project from solution defines or hooks clean targets.
+      :param solutionPath: Path to solution file.
+      :param solutionFolder: Folder from which project paths in solution are resolved.
+      :return ret: True if custom clean targets are found, or if projects can't be read.
+    """
+    try:
+      for projectPath in Utility.getSolutionProjects(solutionPath, solutionFolder):
+        with open(projectPath, 'r') as projectFile:
+          if re.search(config.WRAPPER_CUSTOM_CLEAN_PATTERN, projectFile.read()):
+            cls.logger.debug(projectPath + ' has custom clean targets')
+            return True
+    except Exception as error:
+      cls.logger.debug('Failed checking custom clean targets: ' + str(error))
+      return True
+
+    return False
+
+  @classmethod
+  def deleteWrapperOutputFolders(cls, target, platform, cpus, configurations):
+    """
+      Moves wrapper output folders for specified cpus and configurations to trash.
+      :param target: Target (ortc, webrtc)
+      :param platform: Platform (win, winuwp)
+      :param cpus: List of cpus (arm, x86, x64 or *)
+      :param configurations: List of configurations (debug, release or *)
+      :return ret: True if folders are deleted.
+    """
+    wrapperRelativeOutputPath = convertToPlatformPath(Utility.getValueForTargetAndPlatformDict(config.TARGET_WRAPPER_PROJECTS_OUTPUT_PATHS, target, platform))
+    if wrapperRelativeOutputPath == '':
+      return True
+
+    wrapperRootOutputPath = os.path.join(Settings.rootSdkPath,wrapperRelativeOutputPath)
+    foldersToDelete = list()
+    for configuration in configurations:
+      for cpu in cpus:
+        for folderPath in glob.iglob(os.path.join(wrapperRootOutputPath, configuration, cpu)):
+          foldersToDelete.append(folderPath)
+
+    result, tombstonePath = Trash.moveFoldersToTrash(foldersToDelete, Settings.webrtcPath)
+    return result
+
+  @classmethod
+  def cleanStale(cls, target='*', platform='*', cpu='*', configuration='*'):
+    """
+      Deletes build outputs that ninja doesn't produce anymore and orphaned obj and pdb files, 
+      keeping incremental build state for everything else.
+      :param target: Target (ortc, webrtc or * )
+      :param platform: Platform (win, winuwp or *)
+      :param cpu: CPU (arm, x86, x64 or *)
+      :param configuration: Release (debug, release or *)
+      :return ret: NO_ERROR if stale files deletion was successful. Otherwise returns error code.
+    """
+    ret = NO_ERROR
+    reclaimedBytes = 0
+
+    if target == '': target = '*'
+    if platform == '': platform = '*'
+    if cpu == '': cpu = '*'
+    if configuration == '': configuration = '*'
+
+    #Switch working directory to root webrtc folder
+    Utility.pushd(Settings.webrtcPath)
+
+    gnFolderToClean = Settings.getGnOutputPath(config.GN_OUTPUT_PATH, target, platform, cpu, configuration)
+    for gnFolderPath in glob.iglob(gnFolderToClean):
+      result, folderReclaimedBytes = cls.cleanStaleInFolder(gnFolderPath)
+      reclaimedBytes += folderReclaimedBytes
+      if result != NO_ERROR:
+        ret = result
+
+    Utility.popd()
+
+    cls.logger.info('Reclaimed ' + str(reclaimedBytes) + ' bytes (' + '%.2f' % (reclaimedBytes / (1024.0 * 1024.0)) + ' MB) from stale build files.')
+
+    return ret
+
+  @classmethod
+  def cleanStaleInFolder(cls, gnFolderPath):
+    """
+      Deletes stale files from one gn output folder, using the current ninja graph.
+      :param gnFolderPath: Gn output folder.
+      :return ret, reclaimedBytes: NO_ERROR if stale files are deleted successfully, otherwise error code, and number of deleted bytes.
+    """
+    ret = NO_ERROR
+    reclaimedBytes = 0
+    ninjaCommand = '\"' + Settings.localNinjaPath + '.exe\" -C \"' + gnFolderPath + '\"'
+
+    #Outputs of previous builds that are no longer in the graph. Dry run lists them, so their size can be measured.
+    deadOutputs = Utility.executeCommand(ninjaCommand + ' -n -v -t cleandead')
+    if deadOutputs == 'error':
+      cls.logger.error('Failed listing dead outputs in ' + gnFolderPath)
+      return errors.ERROR_CLEANUP_DELETING_STALE_FILES_FAILED, reclaimedBytes
+
+    for line in deadOutputs.splitlines():
+      if line.startswith('Remove '):
+        deadOutputPath = os.path.join(gnFolderPath, line[len('Remove '):].strip())
+        if os.path.isfile(deadOutputPath):
+          reclaimedBytes += os.path.getsize(deadOutputPath)
+
+    if Utility.executeCommand(ninjaCommand + ' -t cleandead') == 'error':
+      cls.logger.error('Failed deleting dead outputs in ' + gnFolderPath)
+      return errors.ERROR_CLEANUP_DELETING_STALE_FILES_FAILED, reclaimedBytes
+
+    #All outputs produced by the current graph
+    allTargets = Utility.executeCommand(ninjaCommand + ' -t targets all')
+    if allTargets == 'error':
+      cls.logger.error('Failed listing ninja targets in ' + gnFolderPath)
+      return errors.ERROR_CLEANUP_DELETING_STALE_FILES_FAILED, reclaimedBytes
+
+    graphOutputs = set()
+    graphOutputFolders = set()
+    for line in allTargets.splitlines():
+      if ':' in line:
+        outputPath = os.path.normcase(os.path.normpath(line.rsplit(':', 1)[0].strip()))
+        graphOutputs.add(outputPath)
+        graphOutputFolders.add(os.path.dirname(outputPath))
+
+    #Obj files not produced by the graph, and pdb files in folders without any graph output, are orphaned
+    for root, dirs, files in os.walk(gnFolderPath):
+      relativeRoot = os.path.normcase(os.path.normpath(os.path.relpath(root, gnFolderPath)))
+      if relativeRoot == '.':
+        relativeRoot = ''
+      for file in files:
+        extension = os.path.splitext(file)[1].lower()
+        relativePath = os.path.join(relativeRoot, os.path.normcase(file))
+        if relativePath in graphOutputs:
+          continue
+        if extension in config.STALE_OBJECT_EXTENSIONS or (extension in config.STALE_PDB_EXTENSIONS and relativeRoot not in graphOutputFolders):
+          filePath = os.path.join(root, file)
+          fileSize = os.path.getsize(filePath)
+          if Utility.deleteFiles([filePath]):
+            reclaimedBytes += fileSize
+            cls.logger.debug('Deleted orphaned file ' + filePath)
+          else:
+            ret = errors.ERROR_CLEANUP_DELETING_STALE_FILES_FAILED
+
+    return ret, reclaimedBytes
+
+  @classmethod
+  def getOutputFolders(cls, target='*', platform='*', cpu='*', configuration='*'):
+    """
+      Returns gn output and OUTPUT folder paths, relative to root webrtc folder, for specified args.
+      :param target: Target (ortc, webrtc or * )
+      :param platform: Platform (win, winuwp or *)
+      :param cpu: CPU (arm, x86, x64 or *)
+      :param configuration: Release (debug, release or *)
+      :return gnFolder, outputFolder: Gn output folder and OUTPUT folder paths.
+    """
+    gnFolder = Settings.getGnOutputPath(config.GN_OUTPUT_PATH, target, platform, cpu, configuration)
+    outputFolder = convertToPlatformPath(config.BUILT_LIBS_DESTINATION_PATH.replace('[BUILD_OUTPUT]',config.BUILD_OUTPUT_PATH).replace('[TARGET]',target).replace('[PLATFORM]',platform).replace('[CPU]',cpu).replace('[CONFIGURATION]',configuration))
+    return os.path.normpath(gnFolder), os.path.normpath(outputFolder)
+
+  @classmethod
+  def loadOutputUsage(cls):
+    """
+      Loads last used time of output folders.
+      :return usage: Dictionary with folder path, relative to root webrtc folder, as key and last used time as value.
+    """
+    usage = dict()
+    usageFilePath = os.path.join(Settings.webrtcPath, config.OUTPUT_USAGE_FILE_NAME)
+    if os.path.isfile(usageFilePath):
+      try:
+        with open(usageFilePath, 'r') as usageFile:
+          usage = json.load(usageFile)
+      except Exception as error:
+        cls.logger.warning('Failed reading ' + usageFilePath + ': ' + str(error))
+    return usage
+
+  @classmethod
+  def saveOutputUsage(cls, usage):
+    """
+      Saves last used time of output folders.
+      :param usage: Dictionary with folder path, relative to root webrtc folder, as key and last used time as value.
+    """
+    try:
+      Utility.writeFileAtomically(os.path.join(Settings.webrtcPath, config.OUTPUT_USAGE_FILE_NAME), json.dumps(usage, indent=2, sort_keys=True))
+    except Exception as error:
+      cls.logger.warning('Failed saving output folders usage: ' + str(error))
+
+  @classmethod
+  def markOutputUsed(cls, target, platform, cpu, configuration):
+    """
+      Records current time as last used time of gn output and OUTPUT folders for specified combination.
+      :param target: Target (ortc, webrtc)
+      :param platform: Platform (win, winuwp)
+      :param cpu: CPU (arm, x86, x64)
+      :param configuration: Release (debug, release)
+    """
+    usage = cls.loadOutputUsage()
+    now = time.time()
+    for folder in cls.getOutputFolders(target, platform, cpu, configuration):
+      usage[folder] = now
+    cls.saveOutputUsage(usage)
+
+  @classmethod
+  def freeDiskSpace(cls, combinations):
+    """
+      Deletes least recently used gn output and OUTPUT folders, until free disk space reaches diskBudgetFreeSpaceGB.
+      Folders are moved to trash and deleted before function returns, so space is available for prepare and build.
+      :param combinations: List of (target, platform, cpu, configuration) tuples used by the current run. Their folders are never deleted.
+      :return ret: NO_ERROR if folders are deleted successfully. Otherwise returns error code.
+    """
+    ret = NO_ERROR
+
+    requiredFreeSpace = int(Settings.diskBudgetFreeSpaceGB * 1024 * 1024 * 1024)
+    if requiredFreeSpace <= 0:
+      return ret
+
+    freeSpace = Utility.getFreeDiskSpace(Settings.webrtcPath)
+    if freeSpace >= requiredFreeSpace:
+      return ret
+
+    #Switch working directory to root webrtc folder
+    Utility.pushd(Settings.webrtcPath)
+
+    protectedFolders = set()
+    for combination in combinations:
+      protectedFolders.update(cls.getOutputFolders(*combination))
+
+    #Folders of all combinations ever built. Folders without recorded usage take their modification time.
+    usage = cls.loadOutputUsage()
+    candidates = []
+    for pattern in cls.getOutputFolders():
+      for folderPath in glob.iglob(pattern):
+        folderPath = os.path.normpath(folderPath)
+        if os.path.isdir(folderPath) and folderPath not in protectedFolders:
+          candidates.append((usage.get(folderPath, os.path.getmtime(folderPath)), folderPath))
+    candidates.sort()
+
+    cls.logger.info('Free disk space is ' + '%.2f' % (freeSpace / (1024.0 ** 3)) + ' GB, required ' + str(Settings.diskBudgetFreeSpaceGB) + ' GB. Deleting least recently used output folders.')
+
+    evictedFolders = []
+    tombstonePaths = []
+    for lastUsed, folderPath in candidates:
+      if freeSpace >= requiredFreeSpace:
+        break
+      folderSize = Utility.getFolderSize(folderPath)
+      result, tombstonePath = Trash.moveFoldersToTrash([folderPath], Settings.webrtcPath)
+      if tombstonePath != None:
+        tombstonePaths.append(tombstonePath)
+      if result:
+        cls.logger.info('Evicting ' + folderPath + ' (' + '%.2f' % (folderSize / (1024.0 ** 3)) + ' GB), last used ' + time.ctime(lastUsed))
+        freeSpace += folderSize
+        evictedFolders.append(folderPath)
+        usage.pop(folderPath, None)
+      else:
+        ret = errors.ERROR_CLEANUP_DELETING_OUTPUT_FAILED
+
+    if len(evictedFolders) > 0:
+      cls.saveOutputUsage(usage)
+
+    Utility.popd()
+
+    #Space is released only when evicted folders are deleted. Other folders in trash are still deleted in background.
+    Trash.wait(tombstonePaths)
+
+    freeSpace = Utility.getFreeDiskSpace(Settings.webrtcPath)
+    if freeSpace < requiredFreeSpace:
+      cls.logger.warning('Free disk space is ' + '%.2f' % (freeSpace / (1024.0 ** 3)) + ' GB, after deleting all output folders not used by this run.')
 
     return ret
 
@@ -226,7 +504,7 @@ class Cleanup:
   def run(cls, action, target='*', platform='*', cpu='*', configuration='*'):
     """
       Performs cleanup for provided action and specific imput arguments.
-      :param action: Action to perform (cleanOutput, cleanUserDef, cleanIdls or cleanPrepare)
+      :param action: Action to perform (cleanOutput, cleanStale, cleanUserDef, cleanIdls or cleanPrepare)
       :param target: Target (ortc, webrtc or * )
       :param platform: Platform (win, winuwp or *)
       :param cpu: CPU (arm, x86, x64 or *)
@@ -238,6 +516,9 @@ class Cleanup:
     if action.lower() == 'cleanoutput':
       ret = cls.cleanOutput(target, platform, cpu, configuration)
 
+    if action.lower() == 'cleanstale':
+      ret = cls.cleanStale(target, platform, cpu, configuration)
+
     if action.lower() == 'cleanuserdef':
       ret = cls.cleanUserDef()
 
@@ -2,6 +2,7 @@
   This file contains constant config values. 
 
 """
+import multiprocessing
 
 #Filename with user default values.
 USER_DEFAULTS_FILE = 'userdef'
@@ -34,12 +35,130 @@ NATIVE_LIB_SRC = './[TARGET]/windows/solutions/Build/Output/Org.[TARGET]/[CONFIG
 NATIVE_LIB_TARGET = 'runtimes\\win10-[CPU]\\native'
 SAMPLES_FOLDER_PATH = './common/windows/samples/'
 NUGET_EXECUTABLE_PATH = './webrtc/windows/nuget/nuget.exe'
+#Files with package references, next to wrapper projects, that are hashed to decide if nuget restore is required
+NUGET_RESTORE_MANIFESTS = [ 'packages.config', 'packages.lock.json', 'project.json' ]
+#MSBuild files, imported from project folder or any folder above it, that can set package versions, target frameworks or runtime identifiers
+NUGET_RESTORE_IMPORTS = [ 'Directory.Build.props', 'Directory.Build.targets', 'Directory.Packages.props' ]
+#Suffix of file, next to solution, that stores hash of package references from the last successful restore
+NUGET_RESTORE_STAMP_SUFFIX = '.restore'
+#NuGet v3 registration API, used to collect published package versions
+NUGET_REGISTRATION_BASE_URL = 'https://api.nuget.org/v3/registration5-gz-semver2/'
+#Cached registration index, in nuget folder, with published versions of each package
+NUGET_VERSION_INDEX_FILE = '.nugetVersionIndex.json'
+#Number of seconds cached registration index is used before it is revalidated
+NUGET_VERSION_INDEX_TTL = 300
+#Number of registration pages fetched at the same time
+NUGET_VERSION_INDEX_WORKERS = 8
+#Timeout of registration API requests, in seconds
+NUGET_VERSION_INDEX_TIMEOUT = 60
+#Append-only store of release notes, and its index, next to release notes file
+RELEASE_NOTES_STORE_FILE = '.releaseNotes.jsonl'
+RELEASE_NOTES_INDEX_FILE = '.releaseNotes.index.json'
+#NuGet v3 service index of nuget.org, used to find push endpoints when nugetServerURL is 'default'
+NUGET_SERVICE_INDEX_URL = 'https://api.nuget.org/v3/index.json'
+#Environment variable with API key used to publish NuGet packages, if nugetAPIKey is not set
+NUGET_API_KEY_VARIABLE = 'NUGET_API_KEY'
+#Sources under which 'nuget setapikey' stores API key for nuget.org in user NuGet.Config
+NUGET_ORG_API_KEY_SOURCES = [ 'https://www.nuget.org', 'https://www.nuget.org/api/v2/package', NUGET_SERVICE_INDEX_URL ]
+#Entropy nuget.exe uses to encrypt stored API keys with DPAPI
+NUGET_API_KEY_ENTROPY = b'NuGet'
+#Number of NuGet packages pushed at the same time
+NUGET_PUSH_WORKERS = 4
+#Number of retries of push that failed with server error, throttling or connection error
+NUGET_PUSH_RETRIES = 5
+#Delay before the first retry of failed push, in seconds. It is doubled for each following retry
+NUGET_PUSH_RETRY_DELAY = 2
+#Timeout of push requests, in seconds
+NUGET_PUSH_TIMEOUT = 300
+#Size of chunks read while package is sent
+NUGET_PUSH_CHUNK_SIZE = 1024 * 1024
+#Modification time of all entries in created NuGet package, so the same inputs give identical package
+NUPKG_ENTRY_DATE_TIME = (2000, 1, 1, 0, 0, 0)
+#Value of lastModifiedBy core property of created NuGet package
+NUPKG_LAST_MODIFIED_BY = 'webrtc-uwp-sdk scripts'
+#Number of cpu and configuration combinations whose lib files are staged for NuGet package at the same time
+NUGET_STAGING_WORKERS = 4
+#Index of created packages, in nuget folder, with content key and version of each package
+NUGET_PACKAGE_INDEX_FILE = '.nugetPackageIndex.json'
 
 #Paths are relative to the webrtc root path
 GN_OUTPUT_PATH = './out'
 #Path where will ba saved built libs, referenced by wrapper projects
 BUILD_OUTPUT_PATH = './OUTPUT'
 
+#Content store, in user working directory, where backed up files are kept once under their hash
+BACKUP_STORE_PATH = './.contentStore'
+#File in content store with memoised file hashes
+BACKUP_STORE_HASH_CACHE_FILE = 'hashCache.json'
+#Number of threads hashing backed up files
+BACKUP_STORE_HASHING_WORKERS = 8
+#Size of chunks read while hashing files
+BACKUP_STORE_HASH_CHUNK_SIZE = 1024 * 1024
+#Number of threads compressing files for uploaded backup archive
+ZIP_COMPRESSION_WORKERS = multiprocessing.cpu_count()
+#Deflate compression level for backup archive
+ZIP_COMPRESSION_LEVEL = 6
+#Size of chunks read and written while compressing files
+ZIP_CHUNK_SIZE = 1024 * 1024
+#Compressed entries bigger than this are spooled to temporary files, instead of being kept in memory until they are written
+ZIP_SPOOL_MAX_SIZE = 64 * 1024 * 1024
+#Files that are already compressed, and are stored in archive without recompression
+ZIP_STORED_EXTENSIONS = ( '.nupkg', '.snupkg', '.zip', '.7z', '.gz', '.xz', '.jpg', '.png' )
+
+#Size of chunks in which backup archive is uploaded
+UPLOAD_CHUNK_SIZE = 10 * 1024 * 1024
+#Number of chunks uploaded at the same time, for backends that accept chunks out of order
+UPLOAD_CHUNKS_IN_FLIGHT = 4
+#Suffix of upload journal file, next to uploaded file, used to resume interrupted upload
+UPLOAD_JOURNAL_SUFFIX = '.upload.json'
+#Size of chunks read while downloading uploaded files
+UPLOAD_DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+#Timeout of upload HTTP requests, in seconds
+UPLOAD_REQUEST_TIMEOUT = 300
+#HTTP header with SHA256 checksum of uploaded chunk
+UPLOAD_CHECKSUM_HEADER = 'X-Content-SHA256'
+#HTTP statuses of chunk upload that mean upload session doesn't exist anymore, so upload starts again with new session
+UPLOAD_SESSION_EXPIRED_STATUSES = ( 404, 410, 416 )
+#Microsoft Graph API used for OneDrive upload sessions
+ONEDRIVE_API_URL = 'https://graph.microsoft.com/v1.0'
+#Environment variable with OneDrive access token. If it is not set, onedrivecmd is used for upload
+ONEDRIVE_ACCESS_TOKEN_VARIABLE = 'ONEDRIVE_ACCESS_TOKEN'
+#OneDrive folder where backups are uploaded
+ONEDRIVE_BACKUP_FOLDER = 'WebRTC'
+#Local copy of uploaded content index, in user working directory, with uploaded blobs and backup manifests for each upload destination
+UPLOADED_CONTENT_INDEX_FILE = '.uploadedContent.json'
+#Uploaded content index at upload destination, used to refresh local copy
+UPLOAD_REMOTE_INDEX_NAME = 'index.json'
+#Number of attempts to update index at upload destination, when it is changed by another upload at the same time
+UPLOAD_INDEX_UPDATE_ATTEMPTS = 10
+#Age in seconds after which lock file of local upload destination is considered left by interrupted upload
+UPLOAD_LOCK_TIMEOUT = 60
+#Folders at upload destination with file contents and backup manifests
+UPLOAD_BLOBS_FOLDER = 'blobs'
+UPLOAD_MANIFESTS_FOLDER = 'manifests'
+#Folder, in user working directory, where blobs are compressed before upload and downloaded before restore
+UPLOAD_STAGING_PATH = './.uploadStaging'
+#Number of blobs uploaded or downloaded at the same time
+UPLOAD_BLOBS_IN_FLIGHT = 4
+
+#Index of backups, in user working directory, with timestamp, combinations and size of each backup
+BACKUP_INDEX_FILE = '.backupIndex.json'
+#File, in each backed up combination folder, with content hash of each file
+BACKUP_MANIFEST_FILE_NAME = 'manifest.json'
+
+#Folder, relative to the webrtc root path, where deleted output folders are moved before they are deleted in background
+TRASH_FOLDER_NAME = '.trash'
+#Number of threads deleting trash folders in background
+TRASH_DELETION_WORKERS = 8
+
+#File, in the webrtc root path, where last used time of each gn output and OUTPUT folder is recorded
+OUTPUT_USAGE_FILE_NAME = '.outputUsage.json'
+
+#Extensions of files in gn output folder that are deleted by cleanStale if ninja doesn't produce them
+STALE_OBJECT_EXTENSIONS = ( '.obj', '.o' )
+#Extensions of files deleted by cleanStale if there is no ninja output in the same folder
+STALE_PDB_EXTENSIONS = ( '.pdb', )
+
 #WebRtc build tools
 BUILD_TOOL_GN = 'gn'
 BUILD_TOOL_CLANG_FORMAT = 'clang-format'
@@ -250,6 +369,9 @@ CLANG_UPDATE_SCRIPT_PATH = '/tools/clang/scripts/update.py'
 #lastcghange.py path
 LAST_CHANGE_MODULE_PATH = '/build/util'
 
+#Tools whose paths are resolved once and used to launch subprocesses without searching the PATH
+TOOLS_TO_RESOLVE = [ 'git', 'perl', BUILD_TOOL_GN, 'ninja', 'nuget', 'python' ]
+
 PYTHON_PACKAGES_TO_INSTALL = {
                               'win32file' : 'pywin32'
                             }
@@ -292,6 +414,23 @@ TARGET_WRAPPER_PROJECTS_OUTPUT_PATHS = {
                                                     }
                                         }
 
+#Suffixes of msbuild traversal projects, created next to wrapper solution, that build or clean all combinations in one msbuild run
+WRAPPER_BUILD_PROJECT_SUFFIX = '.Build.proj'
+WRAPPER_CLEAN_PROJECT_SUFFIX = '.Clean.proj'
+MSBUILD_TRAVERSAL_PROJECT_TEMPLATE = '''<?xml version="1.0" encoding="utf-8"?>
+<Project DefaultTargets="[TARGET]" xmlns="http://schemas.microsoft.com/developer/msbuild/2003">
+  <ItemGroup>
+[ITEMS]  </ItemGroup>
+  <Target Name="[TARGET]">
+    <MSBuild Projects="@(SolutionConfiguration)" Targets="[TARGET]" BuildInParallel="true" />
+  </Target>
+</Project>
+'''
+#Number of the slowest wrapper projects whose build times are logged
+WRAPPER_BUILD_TIMINGS_TO_LOG = 10
+#If wrapper project matches this pattern, it has custom clean logic and it is cleaned by msbuild instead of deleting output folders
+WRAPPER_CUSTOM_CLEAN_PATTERN = r'<Target\s+Name\s*=\s*"[^"]*Clean[^"]*"|(Before|After)Targets\s*=\s*"[^"]*Clean|CleanDependsOn'
+
 FILES_TO_COPY_FOR_WRAPPER_BUILD = [
                   {'../chromium/third_party/BUILD.gn' : './third_party/BUILD.gn'},
                 ]
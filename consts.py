@@ -8,6 +8,11 @@ ACTION_PUBLISH_NUGET = 'publishnuget'
 ACTION_UPDATE_SAMPLE = 'updatesample'
 ACTION_RELEASE_NOTES = 'releasenotes'
 ACTION_UPLOAD_BACKUP = 'uploadbackup'
+ACTION_RESTORE_BACKUP = 'restorebackup'
 ACTION_RUN_UNITTESTS = 'rununittests'
+#Actions triggered by input arguments, instead of being listed in actions
+ACTION_SET_NUGET_KEY = 'setnugetkey'
+ACTION_SET_SERVER_NOTE_VERSION = 'setservernoteversion'
+ACTION_RENDER_RELEASE_NOTES = 'renderreleasenotes'
 
 MAX_SDK_ROOT_PATH_LENGTH = 64
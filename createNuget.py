@@ -1,8 +1,8 @@
 import os
-import shutil
 import itertools
 import json
 import time
+from multiprocessing.pool import ThreadPool
 from xml.etree import ElementTree as ET
 
 from errors import NO_ERROR, ERROR_NUGET_CREATION_MISSING_FILE, ERROR_GET_NUGET_PACKAGE_VERSIONS_FAILED,\
@@ -10,10 +10,14 @@ ERROR_PACKAGE_VERSION_NOT_SUPPORTED, ERROR_CREATE_NUGET_FILE_FAILED, ERROR_CHANG
 import config
 from logger import Logger,ColoredFormatter
 from settings import Settings
-from helper import convertToPlatformPath, module_exists, yes_no
+from helper import convertToPlatformPath, yes_no
 from utility import Utility
 from summary import Summary
-from nugetUtility import NugetUtility
+from nugetVersionIndex import NugetVersionIndex
+from nuspec import Nuspec
+from nupkgWriter import NupkgWriter
+from backupStore import BackupStore
+from backup import Backup
 from releaseNotes import ReleaseNotes
 
 
@@ -24,9 +28,8 @@ class CreateNuget:
     https://docs.microsoft.com/en-us/nuget/guides/create-uwp-packages#create-and-update-the-nuspec-file
 
     Add, update, delete file elements in .nuspec based on configuration
-    After making .nuspec and .targets run command -nuget pack WebRtc.nuspec
-    using nuget_cli method, if you do not have nuget.exe download_nuget method
-    will be run, which will download the latest nuget.exe file available
+    After making .nuspec and .targets, NuGet package is written by NupkgWriter,
+    so nuget.exe is not needed for creating the package
     """
     @classmethod
     def init(cls):
@@ -55,53 +58,60 @@ class CreateNuget:
         cls.nuspec_file = cls.nugetFolderPath + '/[TARGET].nuspec'
         cls.changelog_file = cls.nugetFolderPath + '/[TARGET].[VERSION]-changelog.txt'
         cls.targets_file = cls.nugetFolderPath + '/[TARGET].targets'
-        cls.versions_file = cls.nugetFolderPath + '/versions.json'
         cls.destinationLibPath = cls.nugetFolderPath + config.NUGET_LIBRARIES
         ret = NO_ERROR
         release_note = ''
+        reused = False
         #Change current working directory to root sdk directory
         Utility.pushd(Settings.rootSdkPath)
-        if Settings.manualNugetVersionNumber is '':
-            ret = cls.get_versions(target)
-            if ret == NO_ERROR:
-                ret = cls.create_versions_storage(cls.versions, target)
-            if ret == NO_ERROR:
-                ret = cls.get_latest_version(versionInfo['number'], target, versionInfo['format'], versionInfo['prerelease'])
-        else:
-            cls.version = Settings.manualNugetVersionNumber
+        release_note = ReleaseNotes.get_note(Settings.releaseNotePath)
+        # version is set when package content is known, so unchanged content doesn't consume a new version number
+        ret = cls.create_nuspec('', target, release_note)
         if ret == NO_ERROR:
-            if os.path.isfile(Settings.releaseNotePath):
-                release_note = ReleaseNotes.get_note(Settings.releaseNotePath)
-            ret = cls.create_nuspec(cls.version, target, release_note)
-        if ret == NO_ERROR:
-            # go to specified nuget folder
-            Utility.pushd(cls.nugetFolderPath)
             ret = cls.add_repo(target)
-            # return to the root sdk directory
-            Utility.popd()
         if ret == NO_ERROR:
             ret = cls.create_targets(target)
         if ret == NO_ERROR:
-            for cpu, configuration in itertools.product(cpus, configurations):                
-                # check and copy all lib files to the specified folder 
-                ret = cls.copy_files(target, platform, configuration, cpu)
-                
-                # go to specified nuget folder
-                Utility.pushd(cls.nugetFolderPath)
-                if ret == NO_ERROR:
-                    # add .dll and .pri files to .nuspec file
-                    ret = cls.add_nuspec_files(target, platform, configuration, cpu)
+            # check and stage lib files of all combinations to the specified folder
+            ret = cls.stage_files(target, platform, cpus, configurations)
+        if ret == NO_ERROR:
+            for cpu, configuration in itertools.product(cpus, configurations):
+                # add .dll and .pri files to .nuspec model
+                ret = cls.add_nuspec_files(target, platform, configuration, cpu)
                 if ret == NO_ERROR:
-                    # update .winmd and .xml tags in nuspec file with the copied files
+                    # update .winmd and .xml tags in nuspec model with the copied files
                     ret = cls.update_nuspec_files(target, platform, configuration, cpu,f_type=['.winmd', '.xml'], target_path=r'lib\uap10.0')
-                # return to the root sdk directory
-                Utility.popd()
-        if ret == NO_ERROR:
-            ret = NugetUtility.nuget_cli('pack', cls.nugetFolderPath + '/webrtc.nuspec')
+                if ret != NO_ERROR:
+                    break
         if ret == NO_ERROR:
-            ret = cls.check_and_move(target, cls.version)            
+            ret = cls.find_created_package(target)
+            reused = ret == NO_ERROR and cls.reused_version is not None
+        if ret == NO_ERROR and reused:
+            cls.version = cls.reused_version
+        elif ret == NO_ERROR:
+            if Settings.manualNugetVersionNumber == '':
+                ret = cls.get_versions(target)
+                if ret == NO_ERROR:
+                    ret = cls.create_versions_index(cls.versions, target)
+                if ret == NO_ERROR:
+                    ret = cls.get_latest_version(versionInfo['number'], target, versionInfo['format'], versionInfo['prerelease'])
+            else:
+                cls.version = Settings.manualNugetVersionNumber
+            if ret == NO_ERROR:
+                cls.nuspec.setVersion(cls.version)
+                ret = cls.write_changelog(target, release_note)
+            if ret == NO_ERROR:
+                # .nuspec is written once, after all files are added to it
+                ret = cls.write_nuspec(target)
+            if ret == NO_ERROR:
+                symbol_files = dict()
+                if Settings.createSymbolsPackage:
+                    symbol_files = cls.get_symbol_files(target, platform, cpus, configurations)
+                ret = cls.pack(target, cls.version, symbol_files)
+            if ret == NO_ERROR:
+                cls.save_created_package(target)
+                cls.logger.info('NuGet package created succesfuly: ' + cls.nugetFolderPath + '/' + cls.version)
         if ret == NO_ERROR:
-            cls.logger.info('NuGet package created succesfuly: ' + cls.nugetFolderPath + '/' + cls.version)
             cls.delete_used()
         end_time = time.time()
         cls.executionTime = end_time - start_time
@@ -114,7 +124,7 @@ class CreateNuget:
     @classmethod
     def add_repo(cls, target):
         """
-        Adds a repository element to the metadata element inside .nuspec file
+        Adds a repository element to the metadata element of .nuspec model
         :param target: webrtc or ortc
         :return: NO_ERROR if successfull. Otherwise returns error code
         """
@@ -128,18 +138,8 @@ class CreateNuget:
         fullRepo = repo + "/tree/" + branch
         
         try:
-            nuspecName = target + '.nuspec'
-            with open(nuspecName, 'rb') as nuspec:
-                tree = ET.parse(nuspec)
-            metadata = tree.find('metadata')
-            
-            #Attribute for the repository element
-            repo_attrib = {'type': "git", 'url': fullRepo}
-            # Make a new repository element with the attributes from above
-            new_file = ET.SubElement(metadata, 'repository', attrib=repo_attrib)
-            new_file.tail = "\n\t\t"
-            cls.logger.debug("repository element added with url: " + repo_attrib['url'])
-            tree.write(nuspecName)
+            cls.nuspec.setRepository(fullRepo, 'git')
+            cls.logger.debug("repository element added with url: " + fullRepo)
         except Exception as error:
             cls.logger.error(str(error))
             ret = ERROR_CHANGE_NUSPEC_FAILED
@@ -149,158 +149,37 @@ class CreateNuget:
     @classmethod
     def get_versions(cls, target):
         """
-        Get NuGet package versions from nuget.org
+        Get NuGet package versions from nuget.org registration API, or cached version index
         :param target: webrtc and/or ortc
         :return: NO_ERROR if successfull. Otherwise returns error code
         """
-        ret = NO_ERROR
-        # Works only if number of published versions of the nuget packet is less than 500
-        search = 'https://api-v2v3search-0.nuget.org/search/query?q=packageid:' + target + '&ignoreFilter=true&prerelease=true&take=500'
-
-        cls.logger.info('Collecting ' + target + ' NuGet package versions from nuget.org...')
-        try:
-            # Python 3:
-            if module_exists('urllib.request'):
-                import urllib.request
-                with urllib.request.urlopen(search) as url:
-                    data = json.loads(url.read().decode())
-            # Python 2:
-            if module_exists('urllib.request') is False:
-                import urllib
-                response = urllib.urlopen(search)
-                data = json.loads(response.read())
-            data_array = data['data']
-
-            versions = []
-            for item in data_array:
-                for key, val in item.items():
-                    if key == 'Version':
-                        versions.append(val)
-            versions = set(versions)
-            versions = sorted(versions)
-            if versions:
-                cls.versions = versions
-            else:
-                ret = ERROR_GET_NUGET_PACKAGE_VERSIONS_FAILED
-                cls.logger.error("Failed to collect NuGet package version numbers for target: " + target)
-        except Exception as error:
-            cls.logger.error(str(error))
-            cls.logger.error("Failed to collect NuGet package version numbers for target: " + target)
+        if Settings.offline:
+            cls.logger.info('Collecting ' + target + ' NuGet package versions from cached version index...')
+        else:
+            cls.logger.info('Collecting ' + target + ' NuGet package versions from nuget.org...')
+        NugetVersionIndex.init()
+        ret, versions = NugetVersionIndex.getVersions(target, cls.nugetFolderPath, Settings.offline)
+        if ret == NO_ERROR and versions:
+            cls.versions = versions
+        else:
             ret = ERROR_GET_NUGET_PACKAGE_VERSIONS_FAILED
+            cls.logger.error("Failed to collect NuGet package version numbers for target: " + target)
         return ret
 
     @classmethod
-    def create_versions_storage(cls, versions, target):
+    def create_versions_index(cls, versions, target):
         """
-        Creates a file with the NuGet package versions
+        Creates index with the latest published version for each version number of the NuGet package
         :param versions: list of NuGet package versions
         :param target: webrtc and/or ortc
         :return: NO_ERROR if successfull. Otherwise returns error code
         """
-        ret = NO_ERROR
-        try:
-            if not os.path.exists(cls.nugetFolderPath):
-                os.makedirs(cls.nugetFolderPath)
-            formated_versions = {}
-            version_numbers = set()
-            storrage = {}
-            if not versions:
-                return ERROR_GET_NUGET_PACKAGE_VERSIONS_FAILED
-            # Get package version numbers
-            for version in versions:
-                v_split = version.split('.')
-                version_number = int(v_split[1])
-                if version_number>40:
-                    version_numbers.add(version_number)
-            version_numbers = sorted(version_numbers, reverse=True)
-            # Set up dictionary format for every version
-            for v in version_numbers:
-                formated_versions[v] = {}
-            # Get latest major number for every version of the package
-            for version in versions:
-                v_split = version.split('.')
-                major_number = False
-                for v in version_numbers:
-                    # Find major number only if the version number matches
-                    if v is int(v_split[1]):
-                        major_number = int(v_split[0])
-                        if "major_number" in formated_versions[v]:
-                            major_number = max(major_number, formated_versions[v]["major_number"])
-                        formated_versions[v]["major_number"] = major_number
-            # Get latest change number if exists for all version numbers
-            for version in versions:
-                v_split = version.split('.')
-                for v in version_numbers:
-                    # Find change number only if the major number and version number match
-                    if v is int(v_split[1]) and formated_versions[v]["major_number"] is int(v_split[0]):
-                        change_number = False
-                        if len(v_split) > 3:
-                            change_number = int(v_split[2])
-                        if change_number is not False:
-                            if "change_number" in formated_versions[v]:
-                                change_number = max(change_number, formated_versions[v]["change_number"])
-                            formated_versions[v]["change_number"] = change_number
-            # Get latest build number for all version numbers while checking if it has chang number or not
-            for version in versions:
-                v_split = version.split('.')
-                is_prerelease = False
-                if '-' in v_split[-1]:
-                    is_prerelease = v_split[-1].split('-')
-                    v_split[-1] = is_prerelease[0]
-                for v in version_numbers:
-                    # Find build number only if the major number and version number match
-                    if v is int(v_split[1]) and formated_versions[v]["major_number"] is int(v_split[0]):
-                        if "change_number" in formated_versions[v]:
-                            if len(v_split) > 3 and int(v_split[2]) is formated_versions[v]["change_number"]:
-                                if is_prerelease is not False:
-                                    build_number = int(is_prerelease[0])
-                                else:
-                                    build_number = int(v_split[3])
-                                if "build_number" in formated_versions[v]:
-                                    build_number = max(build_number, formated_versions[v]["build_number"])
-                                formated_versions[v]["build_number"] = build_number
-                        else:
-                            if is_prerelease is not False:
-                                build_number = int(is_prerelease[0])
-                            else:
-                                build_number = int(v_split[2])
-                            if "build_number" in formated_versions[v]:
-                                build_number = max(build_number, formated_versions[v]["build_number"])
-                            formated_versions[v]["build_number"] = build_number
-            # Check if the latest package version is prerelease or not
-            for version in versions:
-                v_split = version.split('.')
-                is_prerelease = False
-                if '-' in v_split[-1]:
-                    is_prerelease = v_split[-1].split('-')
-                    v_split[-1] = is_prerelease[0]
-                for v in formated_versions.keys():
-                    # Check if version number matches, and if latest major number for that version matches
-                    if v is int(v_split[1]) and formated_versions[v]["major_number"] is int(v_split[0]):
-                        # Check if the latest version has a change number
-                        if "change_number" in formated_versions[v]:
-                            if len(v_split) > 3:
-                                if int(v_split[3]) is formated_versions[v]["build_number"] and int(v_split[2]) is formated_versions[v]["change_number"]:
-                                    if is_prerelease is not False:
-                                        formated_versions[v]["prerelease"] = is_prerelease[1]
-                                    elif "prerelease" in formated_versions[v]:
-                                        del formated_versions[v]["prerelease"]
-                        else:
-                            if len(v_split) is 3:
-                                if int(v_split[2]) is formated_versions[v]["build_number"]:
-                                    if is_prerelease is not False:
-                                        formated_versions[v]["prerelease"] = is_prerelease[1]
-                                    elif "prerelease" in formated_versions[v]:
-                                        del formated_versions[v]["prerelease"]
-            storrage[target] = formated_versions
-
-            with open(cls.versions_file, 'w') as f:
-                json.dump(storrage, f, indent=4)
-        except Exception as error:
-            cls.logger.error(str(error))
-            cls.logger.error("Failed file to store NuGet package version numbers for target: " + target)
-            ret = ERROR_GET_NUGET_PACKAGE_VERSIONS_FAILED
-        return ret
+        if not versions:
+            cls.logger.error("Failed to index NuGet package version numbers for target: " + target)
+            return ERROR_GET_NUGET_PACKAGE_VERSIONS_FAILED
+        # Only version numbers above 40 are published with the current versioning scheme
+        cls.versions_index = NugetVersionIndex.getLatestVersions(versions, 40)
+        return NO_ERROR
 
     @classmethod
     def get_latest_version(cls, version, target, v_format, prerelease="Default"):
@@ -315,40 +194,76 @@ class CreateNuget:
         :return: NO_ERROR if successfull. Otherwise returns error code
         """
         ret = NO_ERROR
-        with open(cls.versions_file, 'r') as f:
-            all_versions = json.load(f)
-        if version in all_versions[target]:
-            this_version = all_versions[target][version]
-            build_no = int(this_version["build_number"])
-            build_no = build_no + 1
+        try:
+            this_version = cls.versions_index.get(int(version))
+        except ValueError:
+            cls.logger.error("Failed retreve latest version of NuGet package for target: " + target + ", version number " + str(version) + " is not a number")
+            return ERROR_PACKAGE_VERSION_NOT_SUPPORTED
+        if this_version is not None:
+            build_no = this_version["build_number"] + 1
             format_version = str(this_version["major_number"]) + '.' + str(version) + '.'
             if "change_number" in this_version:
                 format_version += str(this_version["change_number"]) + '.'
             format_version += str(build_no)
-            if "prerelease" in this_version and prerelease is "Default":
+            if "prerelease" in this_version and prerelease == "Default":
                 format_version += '-' + str(this_version["prerelease"])
-            elif prerelease is not '':
+            elif prerelease != '' and prerelease != "Default":
                 format_version += '-' + prerelease
             cls.version = format_version
         # If the selected major version number has not been published, publish it's initial version.
-        elif version not in all_versions[target]:
-            new_version = v_format.replace('[number]', version)
-            if prerelease is 'Default':
+        else:
+            new_version = v_format.replace('[number]', str(version))
+            if prerelease == 'Default':
                 new_version = new_version.replace('[prerelease]', '-Alpha')
-            elif prerelease is '':
+            elif prerelease == '':
                 new_version = new_version.replace('[prerelease]', '')
             else:
                 new_version = new_version.replace('[prerelease]', '-'+prerelease)
             cls.version = new_version
-        else:
-            cls.logger.error("Failed retreve latest version of NuGet package for target: " + target)
-            ret = ERROR_PACKAGE_VERSION_NOT_SUPPORTED
+        return ret
+
+    @classmethod
+    def stage_files(cls, target, platform, cpus, configurations):
+        """
+        Stages lib files of all cpu and configuration combinations to the destination folder.
+        Combinations are staged concurrently, and staged files are kept between runs,
+        so only files that are changed since the last run are linked again.
+        :param target: webrtc or ortc
+        :param platform: win or winuwp
+        :param cpus: list of target cpus.
+        :param configurations: Debug/Release.
+        :return: NO_ERROR if successfull. Otherwise returns error code
+        """
+        ret = NO_ERROR
+        try:
+            # Create libraries directory if needed
+            if not os.path.exists(cls.nugetFolderPath + '/libraries'):
+                os.makedirs(cls.nugetFolderPath + '/libraries')
+            #Stage license file
+            cls.stage_file(config.LICENSE_PATH, cls.nugetFolderPath + '/libraries/LICENSE.txt')
+        except Exception as error:
+            cls.logger.error(str(error))
+            cls.logger.error("Failed to stage license file")
+            return ERROR_NUGET_CREATION_MISSING_FILE
+
+        combinations = list(itertools.product(cpus, configurations))
+        pool = ThreadPool(min(len(combinations), config.NUGET_STAGING_WORKERS) or 1)
+        try:
+            results = pool.map(lambda combination: cls.copy_files(target, platform, combination[1], combination[0]), combinations)
+        finally:
+            pool.close()
+            pool.join()
+        for result in results:
+            if result != NO_ERROR:
+                ret = result
+                break
         return ret
 
     @classmethod
     def copy_files(cls, target, platform, configuration, cpu, f_type=['.dll', '.pri', '.winmd', '.xml']):
         """
-        Copy lib files that will be used for building nuget package to the destination folder
+        Stage lib files that will be used for building nuget package to the destination folder.
+        Files are hard linked if possible, and files that are already staged are not linked again
         :param target: webrtc or ortc
         :param platform: win or winuwp
         :param configuration: Release or Debug.
@@ -358,12 +273,17 @@ class CreateNuget:
         """
         ret = NO_ERROR
         try:
-            # Create libraries directory if needed
-            if not os.path.exists(cls.nugetFolderPath + '/libraries'):
-                os.makedirs(cls.nugetFolderPath + '/libraries')
-            #Copy license file
-            shutil.copy(config.LICENSE_PATH, cls.nugetFolderPath+'/libraries/LICENSE.txt')
-            
+            dst_path = convertToPlatformPath(
+                cls.destinationLibPath
+                .replace('[TARGET]', target)
+                .replace('[PLATFORM]', platform)
+                .replace('[CONFIGURATION]', configuration)
+                .replace('[CPU]', cpu)
+            )
+            # Create directory for the specified configuration if needed
+            if not os.path.exists(dst_path):
+                os.makedirs(dst_path)
+
             for ft in f_type:
                 f_name = 'Org.' + target + ft
                 src_path = convertToPlatformPath(
@@ -374,20 +294,12 @@ class CreateNuget:
                     .replace('[CPU]', cpu)
                     .replace('[FILE]', f_name)
                 )
-                dst_path = convertToPlatformPath(
-                    cls.destinationLibPath
-                    .replace('[TARGET]', target)
-                    .replace('[PLATFORM]', platform)
-                    .replace('[CONFIGURATION]', configuration)
-                    .replace('[CPU]', cpu)
-                )
-                # Create directory for the specified configuration if needed
-                if not os.path.exists(dst_path):
-                    os.makedirs(dst_path)
-                # Check if file exists and copy it to the specified directory
+                # Check if file exists and stage it to the specified directory
                 if os.path.exists(src_path):
-                    shutil.copy(src_path, dst_path)
-                    cls.logger.debug('FIle copied: ' + dst_path + f_name)
+                    if cls.stage_file(src_path, os.path.join(dst_path, f_name)):
+                        cls.logger.debug('File staged: ' + dst_path + f_name)
+                    else:
+                        cls.logger.debug('File is up to date: ' + dst_path + f_name)
                 else:
                     cls.logger.warning('File does NOT exist! ' + src_path)
                     return ERROR_NUGET_CREATION_MISSING_FILE
@@ -398,58 +310,56 @@ class CreateNuget:
 
         return ret
 
+    @classmethod
+    def stage_file(cls, src_path, dst_path):
+        """
+        Hard links file to the staging folder, or copies it if it can't be linked.
+        Staged file is up to date if it has the same size and modification time as the source file,
+        which is always the case while it is a link to the source file.
+        :param src_path: path of the source file.
+        :param dst_path: path of the staged file.
+        :return: True if file is staged, False if staged file is already up to date
+        """
+        if os.path.exists(dst_path):
+            src_stat = os.stat(src_path)
+            dst_stat = os.stat(dst_path)
+            if src_stat.st_size == dst_stat.st_size and int(src_stat.st_mtime) == int(dst_stat.st_mtime):
+                return False
+            os.remove(dst_path)
+        Utility.linkFile(src_path, dst_path)
+        return True
+
     @classmethod
     def update_nuspec_files(cls, target, platform, configuration, cpu, f_type=['.dll', '.pri'], f_name='Org.WebRtc', target_path=False):
         """
-        Updates existing file elements contained in .nuspec file
+        Update file elements of .nuspec model whose src has given cpu, configuration and file type
         :param target: webrtc or ortc
         :param platform: win or winuwp
         :param configuration: Release or Debug.
         :param cpu: target cpu.
         :param f_type: array of file types to be updated (Default ['.dll', '.pri']).
-        :param f_name: name of the lib file that needs to be added(Default: Org.WebRtc)
+        :param f_name: name of the lib file (Default: Org.WebRtc)
         :param target_path: path for the target attribute of the file element that
             needs to be provided for all non default file types (.dll, .pri).
         :return: NO_ERROR if successfull. Otherwise returns error code
         """
         ret = NO_ERROR
         try:
-            """
-            in order for update to work nuspec must not have   xmlns="..."
-            inside the package tag, otherwise files tag will not be found
-            """
-            nuspecName = target + '.nuspec'
-            with open(nuspecName, 'rb') as nuspec:
-                tree = ET.parse(nuspec)
-            files = tree.find('files')
-            # Element is <file> element, ft is each file type
-            for element, ft in itertools.product(files, f_type):
-                src_attrib = element.attrib.get('src')
-                # Check if <file> element has a src with given cpu, configuration and file type
-                if all(val in src_attrib for val in [cpu, configuration.capitalize(), ft]):
-                    file_name = f_name + ft
-                    # New src path to the lib file with required cpu, configuration and file type
-                    src_path = convertToPlatformPath(
-                        config.NUGET_LIBRARIES
-                        .replace('[TARGET]', target)
-                        .replace('[PLATFORM]', platform)
-                        .replace('[CONFIGURATION]', configuration)
-                        .replace('[CPU]', cpu)
-                    )
-                    src_path += file_name
-                    # New target attribute of the <file> element
-                    # (place where lib file will be placed inside NuGet package)
-                    if target_path is False:
-                        target_path = convertToPlatformPath(config.NATIVE_LIB_TARGET.replace('[CPU]', cpu))
-                    # Check if the file from the new src exists
-                    if os.path.exists(src_path):
-                        element.set('src', src_path)
-                        element.set('target', target_path)
-                        # Save changes to the .nuspec file
-                        tree.write(nuspecName)
-                        cls.logger.debug("File updated: " + src_path)
-                    else:
-                        raise Exception('File does NOT exist: ' + src_path)
+            # Path to the lib files with required cpu and configuration, relative to nuget folder
+            src_folder = convertToPlatformPath(
+                config.NUGET_LIBRARIES
+                .replace('[TARGET]', target)
+                .replace('[PLATFORM]', platform)
+                .replace('[CONFIGURATION]', configuration)
+                .replace('[CPU]', cpu)
+            )
+            # Target attribute of the <file> element (place where lib file will be placed inside NuGet package)
+            if target_path is False:
+                target_path = convertToPlatformPath(config.NATIVE_LIB_TARGET.replace('[CPU]', cpu))
+            for ft in f_type:
+                src_path = src_folder + f_name + ft
+                if cls.nuspec.updateFiles([cpu, configuration.capitalize(), ft], src_path, target_path) > 0:
+                    cls.logger.debug("File updated: " + src_path)
         except Exception as error:
             cls.logger.error(str(error))
             ret = ERROR_CHANGE_NUSPEC_FAILED
@@ -459,7 +369,7 @@ class CreateNuget:
     @classmethod
     def delete_nuspec_files(cls, target, platform, configuration, cpu, f_type=['.dll', '.pri']):
         """
-        Delete file element in .nuspec based on src attribute
+        Delete file elements from .nuspec model based on src attribute
         :param target: webrtc or ortc
         :param platform: win or winuwp
         :param configuration: Release or Debug.
@@ -467,24 +377,9 @@ class CreateNuget:
         :param f_type: array of file types to be updated (Default ['.dll', '.pri']).
         """
         try:
-            """
-            in order for update to work nuspec must not have   xmlns="..."
-            inside the package tag, otherwise files tag will not be found
-            """
-            nuspecName = target + '.nuspec'
-            with open(nuspecName, 'rb') as nuspec:
-                tree = ET.parse(nuspec)
-            files = tree.find('files')
-            # Element is <file> element, ft is each file type
-            for element, ft in itertools.product(files, f_type):
-                src_attrib = element.attrib.get('src')
-                # Check if <file> element has a src with given cpu, configuration
-                # and file type, then remove it from .nuspec
-                if all(val in src_attrib for val in [target, platform, cpu, configuration, ft]):
-                    files.remove(element)
-                    cls.logger.debug("File Deleted: " + src_attrib)
-            # Save changes to the .nuspec file
-            tree.write(nuspecName)
+            for ft in f_type:
+                for src in cls.nuspec.removeFiles([target, platform, cpu, configuration, ft]):
+                    cls.logger.debug("File Deleted: " + src)
         except Exception as error:
             cls.logger.error(str(error))
             cls.logger.error("Failed to delete file elements inside .nuspec file")
@@ -492,9 +387,10 @@ class CreateNuget:
     @classmethod
     def add_nuspec_files(cls, target, platform, configuration, cpu, f_type=['.dll', '.pri'], f_name='Org.WebRtc', target_path=False):
         """
-        Add file elements to .nuspec file based on config
+        Add file elements to .nuspec model based on config
         Every cpu type that you want to add to NuGet package must be built in
-        eather Release or Debug configuration
+        eather Release or Debug configuration. Existence of the files is checked
+        for all combinations at once, when .nuspec file is written.
 
         :param target: webrtc or ortc
         :param platform: win or winuwp
@@ -508,40 +404,21 @@ class CreateNuget:
         """
         ret = NO_ERROR
         try:
-            """
-            in order for update to work nuspec must not have   xmlns="..."
-            inside the package tag, otherwise files tag will not be found
-            """
-            nuspecName = target + '.nuspec'
-            with open(nuspecName, 'rb') as nuspec:
-                tree = ET.parse(nuspec)
-            files = tree.find('files')
+            # Path to the lib files with required cpu and configuration, relative to nuget folder
+            src_folder = convertToPlatformPath(
+                config.NUGET_LIBRARIES
+                .replace('[TARGET]', target)
+                .replace('[PLATFORM]', platform)
+                .replace('[CONFIGURATION]', configuration)
+                .replace('[CPU]', cpu)
+            )
+            # Target attribute of the <file> element (place where lib file will be placed inside NuGet package)
+            if target_path is False:
+                target_path = convertToPlatformPath(config.NATIVE_LIB_TARGET.replace('[CPU]', cpu))
             for ft in f_type:
-                # Add extention to the file name
-                file_name = f_name + ft
-                # Src path to the lib file with required cpu, configuration and file type
-                src_path = convertToPlatformPath(
-                    config.NUGET_LIBRARIES
-                    .replace('[TARGET]', target)
-                    .replace('[PLATFORM]', platform)
-                    .replace('[CONFIGURATION]', configuration)
-                    .replace('[CPU]', cpu)
-                )
-                src_path += file_name
-                # Target attribute of the <file> element (place where lib file will be placed inside NuGet package)
-                if target_path is False:
-                    target_path = convertToPlatformPath(config.NATIVE_LIB_TARGET.replace('[CPU]', cpu))
-                # Check if the file from the new src exists
-                if os.path.exists(src_path):
-                    file_attrib = {'src': src_path, 'target': target_path}
-                    # Make a new file element with the attributes from above
-                    new_file = ET.SubElement(files, 'file', attrib=file_attrib)
-                    new_file.tail = "\n\t\t"
-                    cls.logger.debug("File added: " + file_attrib['src'])
-                else:
-                    raise Exception('File does NOT exist! \n' + src_path)
-            # Save changes to the .nuspec file
-            tree.write(nuspecName)
+                src_path = src_folder + f_name + ft
+                cls.nuspec.addFile(src_path, target_path)
+                cls.logger.debug("File added: " + src_path)
         except Exception as error:
             cls.logger.error(str(error))
             cls.logger.error("Failed to add file element to .nuspec file for target: " + target + "; platform: " + platform + "; configuration: " + configuration + "; cpu: " + cpu)
@@ -624,9 +501,9 @@ class CreateNuget:
     @classmethod
     def create_nuspec(cls, version, target, release_note = False):
         """
-        Create .nuspec file based on a template with default values
-        :param version: version of the nuget package must be specified when
-            copying nuspec file
+        Create .nuspec model based on a template with default values
+        :param version: version of the nuget package, or empty string if
+            version is set later, when package content is known
         :param target: webrtc or ortc
         :return: NO_ERROR if successfull. Otherwise returns error code
         """
@@ -634,21 +511,111 @@ class CreateNuget:
         try:
             if not os.path.exists(cls.nugetFolderPath):
                 os.makedirs(cls.nugetFolderPath)
-            # .nuspec file that is used to build the NuGet package
-            with open(cls.nuspec_file.replace('[TARGET]', target), 'w') as destination:
-                # Template .nuspec file
-                with open(config.NUGET_TEMPLATES_FOLDER + target + '.nuspec', 'r') as source:
-                    for line in source:
-                        if '<version>' in line:
-                            destination.write('\t\t<version>' + version + '</version>\n')
-                            if release_note:
-                                cls.logger.debug('Release note added: ' + release_note)
-                                # Template .nuspec file
-                                with open(cls.changelog_file.replace('[TARGET]', target).replace('[VERSION]', version), 'w') as changelog:
-                                    changelog.write(release_note)
-                                destination.write('\t\t<releaseNotes>' + release_note + '</releaseNotes>\n')
-                        else:
-                            destination.write(line)
+            cls.nuspec = Nuspec(config.NUGET_TEMPLATES_FOLDER + target + '.nuspec', version)
+            if release_note:
+                cls.logger.debug('Release note added: ' + release_note)
+                cls.nuspec.setReleaseNotes(release_note)
+            cls.logger.debug('Nuspec model created successfuly!')
+        except Exception as error:
+            cls.logger.error(str(error))
+            cls.logger.error("Failed to create .nuspec file!")
+            ret = ERROR_CREATE_NUGET_FILE_FAILED
+        return ret
+
+    @classmethod
+    def write_changelog(cls, target, release_note):
+        """
+        Writes release note to changelog file placed along side the created package
+        :param target: webrtc or ortc
+        :param release_note: release note of the package
+        :return: NO_ERROR if successfull. Otherwise returns error code
+        """
+        ret = NO_ERROR
+        if release_note:
+            try:
+                with open(cls.changelog_file.replace('[TARGET]', target).replace('[VERSION]', cls.version), 'w') as changelog:
+                    changelog.write(release_note)
+            except Exception as error:
+                cls.logger.error(str(error))
+                cls.logger.error("Failed to create changelog file!")
+                ret = ERROR_CREATE_NUGET_FILE_FAILED
+        return ret
+
+    @classmethod
+    def find_created_package(cls, target):
+        """
+        Checks that all files referenced by .nuspec model exist, computes content key of the package from hashes
+        of its files and .nuspec model without version, and looks for already created package with the same key in nuget folder.
+        Release note is part of the key, so package with a new release note is not reused.
+        Found package is reused instead of creating a new one, unless --forcePack is used.
+        :param target: webrtc or ortc
+        :return: NO_ERROR if successfull. Otherwise returns error code
+        """
+        cls.reused_version = None
+        missing_files = cls.nuspec.getMissingFiles(cls.nugetFolderPath)
+        if missing_files:
+            for src in missing_files:
+                cls.logger.error('File does NOT exist! ' + src)
+            return ERROR_CHANGE_NUSPEC_FAILED
+        if BackupStore.storePath == None:
+            BackupStore.init(os.path.join(Settings.userWorkingPath, config.BACKUP_STORE_PATH))
+        NupkgWriter.init()
+        # files are resolved once, and used for content key, package and symbols package
+        cls.package_files = NupkgWriter.getPackageFiles(cls.nuspec, cls.nugetFolderPath)
+        if cls.package_files is None:
+            return ERROR_NUGET_CREATION_MISSING_FILE
+        cls.content_key = NupkgWriter.getContentKey(cls.nuspec, cls.package_files)
+
+        version = cls.load_created_packages().get(target, dict()).get(cls.content_key)
+        package = target + '.' + str(version) + '.nupkg'
+        if version is None or not os.path.isfile(cls.nugetFolderPath + '/' + package):
+            return NO_ERROR
+        if Settings.forceNugetPack:
+            cls.logger.info('Package content is not changed since ' + package + ' was created, new package is created because of --forcePack')
+        elif Settings.manualNugetVersionNumber not in ('', version):
+            cls.logger.info('Package content is not changed since ' + package + ' was created, new package is created with requested version ' + Settings.manualNugetVersionNumber)
+        else:
+            cls.logger.info('Nothing changed since ' + package + ' was created, the package is reused. Use --forcePack to create a new package')
+            cls.reused_version = version
+        return NO_ERROR
+
+    @classmethod
+    def load_created_packages(cls):
+        """
+        Loads index of created packages {target : {content key : version}} from nuget folder
+        """
+        index_path = os.path.join(cls.nugetFolderPath, config.NUGET_PACKAGE_INDEX_FILE)
+        if os.path.isfile(index_path):
+            try:
+                with open(index_path, 'r') as index_file:
+                    return json.load(index_file)
+            except Exception as error:
+                cls.logger.warning('Failed loading index of created packages: ' + str(error))
+        return dict()
+
+    @classmethod
+    def save_created_package(cls, target):
+        """
+        Records content key of created package, so package is not created again if its content is not changed
+        :param target: webrtc or ortc
+        """
+        try:
+            packages = cls.load_created_packages()
+            packages.setdefault(target, dict())[cls.content_key] = cls.version
+            Utility.writeFileAtomically(os.path.join(cls.nugetFolderPath, config.NUGET_PACKAGE_INDEX_FILE), json.dumps(packages, indent=2, sort_keys=True))
+        except Exception as error:
+            cls.logger.warning('Failed saving index of created packages: ' + str(error))
+
+    @classmethod
+    def write_nuspec(cls, target):
+        """
+        Writes .nuspec file. Files referenced by .nuspec model are already checked by find_created_package
+        :param target: webrtc or ortc
+        :return: NO_ERROR if successfull. Otherwise returns error code
+        """
+        ret = NO_ERROR
+        try:
+            cls.nuspec.write(cls.nuspec_file.replace('[TARGET]', target))
             cls.logger.debug('Nuspec file created successfuly!')
         except Exception as error:
             cls.logger.error(str(error))
@@ -681,35 +648,90 @@ class CreateNuget:
         return ret
 
     @classmethod
-    def check_and_move(cls, target, version):
+    def get_symbol_files(cls, target, platform, cpus, configurations, f_type=['.dll']):
         """
-        Checks if nuget package was made successfully and moves it to nuget folder
+        Finds pdb files of the packaged dlls, in wrapper output folder or in pdbs folder of native output,
+        and places them along side their dlls in symbols package
+        :param target: webrtc or ortc
+        :param platform: win or winuwp
+        :param cpus: list of target cpus.
+        :param configurations: Debug/Release.
+        :param f_type: array of types of files whose pdbs are packaged (Default ['.dll']).
+        :return: Dictionary with path in symbols package as key and pdb file path as value
+        """
+        symbol_files = dict()
+        for cpu, configuration in itertools.product(cpus, configurations):
+            staged_path = os.path.normpath(convertToPlatformPath(
+                cls.destinationLibPath
+                .replace('[TARGET]', target)
+                .replace('[PLATFORM]', platform)
+                .replace('[CONFIGURATION]', configuration)
+                .replace('[CPU]', cpu)
+            ))
+            wrapper_path = os.path.dirname(convertToPlatformPath(
+                config.NATIVE_LIB_SRC
+                .replace('[TARGET]', target)
+                .replace('[PLATFORM]', platform)
+                .replace('[CONFIGURATION]', configuration)
+                .replace('[CPU]', cpu)
+            ))
+            native_path = Backup.getOutputPaths(target, platform, cpu, configuration)[0]
+            pdb_folders = [wrapper_path, os.path.join(native_path, 'pdbs')]
+
+            for part_name, file_path in cls.package_files.items():
+                name, extension = os.path.splitext(os.path.basename(file_path))
+                if extension.lower() not in f_type or os.path.normpath(os.path.dirname(file_path)) != staged_path:
+                    continue
+                pdb_paths = [os.path.join(folder, name + '.pdb') for folder in pdb_folders if os.path.isfile(os.path.join(folder, name + '.pdb'))]
+                if pdb_paths:
+                    symbol_files[os.path.splitext(part_name)[0] + '.pdb'] = pdb_paths[0]
+                else:
+                    cls.logger.warning('Pdb file of ' + part_name + ' is not found for cpu: ' + cpu + '; configuration: ' + configuration)
+        return symbol_files
+
+    @classmethod
+    def pack(cls, target, version, symbol_files = None):
+        """
+        Creates NuGet package in nuget folder from .nuspec model, without nuget.exe.
+        Symbols package is created at the same time, if there are pdb files for it
         :param target: webrtc or ortc
         :param version: Version of the created NuGet file
+        :param symbol_files: Dictionary with path in symbols package as key and pdb file path as value
         :return: NO_ERROR if successfull. Otherwise returns error code
         """
-        ret = NO_ERROR
+        package = target + '.' + version + '.nupkg'
+        symbols_package = target + '.' + version + '.snupkg'
+        NupkgWriter.init()
+        jobs = [(package, lambda: NupkgWriter.write(cls.nuspec, cls.package_files, cls.nugetFolderPath + '/' + package))]
+        if symbol_files:
+            jobs.append((symbols_package, lambda: NupkgWriter.writeSymbols(cls.nuspec, symbol_files, cls.nugetFolderPath + '/' + symbols_package)))
+        elif os.path.isfile(cls.nugetFolderPath + '/' + symbols_package):
+            # symbols package of the previous package with the same version doesn't match the new package
+            os.remove(cls.nugetFolderPath + '/' + symbols_package)
+
+        pool = ThreadPool(len(jobs))
         try:
-            package = target + '.' + version + '.nupkg'
-            if os.path.isfile(package):
-                shutil.move(package, cls.nugetFolderPath + '/' + package)
-            else:
+            results = pool.map(lambda job: job[1](), jobs)
+        finally:
+            pool.close()
+            pool.join()
+
+        ret = NO_ERROR
+        for (name, job), result in zip(jobs, results):
+            if not result:
+                cls.logger.error('NuGet package ' + name + ' is not created')
                 ret = ERROR_CREATE_NUGET_FILE_FAILED
-                cls.logger.error('NuGet package does not exist')
-        except Exception as error:
-            cls.logger.error(str(error))
-            ret = ERROR_CREATE_NUGET_FILE_FAILED
         return ret
 
-
     @classmethod
     def delete_used(cls):
+        """
+        Deletes .nuspec and .targets files from nuget folder.
+        Staged lib files are kept, so the next run stages only changed files
+        """
         content = os.listdir(cls.nugetFolderPath)
         try:
             for element in content:
-                if 'libraries' in element:
-                    libraries = convertToPlatformPath(cls.nugetFolderPath + '/' + element)
-                    shutil.rmtree(libraries)
                 if '.nuspec' in element:
                     nuspec = convertToPlatformPath(cls.nugetFolderPath + '/' + element)
                     os.remove(nuspec)
@@ -0,0 +1,300 @@
+import os
+import json
+import gzip
+import time
+import shutil
+import hashlib
+from datetime import datetime
+from multiprocessing.pool import ThreadPool
+
+import config
+from logger import Logger
+from utility import Utility
+from backupStore import BackupStore
+from chunkedUpload import ChunkedUpload
+from errors import NO_ERROR, ERROR_UPLOAD_BACKUP_FAILED, ERROR_RESTORE_BACKUP_FAILED
+
+class DedupUpload:
+  """
+    Uploads backup as content addressed blobs and a manifest with content hash of each file. Blobs that are
+    already uploaded are not uploaded again, so only changed files are transferred. Uploaded blobs are recorded
+    in index, kept locally and at upload destination, so local copy can be refreshed from destination. Index at
+    destination is updated with conditional write, so uploads running at the same time don't lose each other's entries.
+    Backup is restored by downloading its manifest and blobs it references.
+  """
+
+  logger = None
+  indexPath = None
+  stagingPath = None
+  #Uploaded content at current destination {'blobs' : {hash : blob name}, 'manifests' : [backup names]}
+  index = None
+
+  @classmethod
+  def init(cls, workingPath):
+    """
+      Inits logger and paths.
+      :param workingPath: Folder with local index and staging folder.
+    """
+    cls.logger = Logger.getLogger('DedupUpload')
+    cls.indexPath = os.path.join(workingPath, config.UPLOADED_CONTENT_INDEX_FILE)
+    cls.stagingPath = os.path.join(workingPath, config.UPLOAD_STAGING_PATH)
+    if not os.path.isdir(cls.stagingPath):
+      os.makedirs(cls.stagingPath)
+    ChunkedUpload.init()
+
+  @classmethod
+  def loadIndex(cls, backend, refresh = False):
+    """
+      Loads index of content uploaded to destination. Local copy is used, unless it doesn't exist or refresh is requested.
+      :param backend: Upload backend.
+      :param refresh: If True, index is downloaded from destination.
+    """
+    cls.index = cls.__loadIndexes().get(backend.getId())
+    if cls.index == None or refresh:
+      remoteIndex = cls.__downloadIndex(backend)
+      if remoteIndex != None:
+        cls.index = remoteIndex
+      elif cls.index == None:
+        cls.index = { 'blobs' : dict(), 'manifests' : [] }
+      cls.saveIndex(backend)
+
+  @classmethod
+  def saveIndex(cls, backend):
+    """
+      Saves local copy of uploaded content index.
+      :param backend: Upload backend.
+    """
+    indexes = cls.__loadIndexes()
+    indexes[backend.getId()] = cls.index
+    Utility.writeFileAtomically(cls.indexPath, json.dumps(indexes))
+
+  @classmethod
+  def upload(cls, backend, backupName, filesToUpload, refresh = False):
+    """
+      Uploads files that are not uploaded yet, and backup manifest.
+      :param backend: Upload backend.
+      :param backupName: Backup name, used as manifest name.
+      :param filesToUpload: List of (file path, name in backup) tuples.
+      :param refresh: If True, index of uploaded content is downloaded from destination first.
+      :return ret: NO_ERROR if upload was successfull. Otherwise returns error code
+    """
+    ret = NO_ERROR
+    cls.loadIndex(backend, refresh)
+
+    if BackupStore.storePath == None:
+      BackupStore.init(os.path.join(os.path.dirname(cls.indexPath), config.BACKUP_STORE_PATH))
+    hashes = BackupStore.hashFiles([filePath for filePath, name in filesToUpload])
+    BackupStore.saveHashCache()
+
+    manifest = { 'name' : backupName, 'created' : datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'files' : dict() }
+    #Files with content that is not uploaded yet {hash : file path}
+    blobsToUpload = dict()
+    totalBytes = 0
+    newBytes = 0
+    for filePath, name in filesToUpload:
+      fileHash = hashes[filePath]
+      size = os.path.getsize(filePath)
+      manifest['files'][name.replace(os.sep, '/')] = { 'hash' : fileHash, 'size' : size }
+      totalBytes += size
+      if fileHash not in cls.index['blobs'] and fileHash not in blobsToUpload:
+        blobsToUpload[fileHash] = filePath
+        newBytes += size
+
+    cls.logger.info('Uploading ' + str(len(blobsToUpload)) + ' new of ' + str(len(filesToUpload)) + ' files, ' +
+                    '%.1f' % (newBytes / 1048576.0) + ' of ' + '%.1f' % (totalBytes / 1048576.0) + ' MB.')
+
+    pool = ThreadPool(config.UPLOAD_BLOBS_IN_FLIGHT)
+    try:
+      #Each uploaded blob is recorded immediately, so interrupted upload doesn't upload it again
+      for fileHash, blobName, result in pool.imap_unordered(lambda blob: cls.__uploadBlob(backend, blob[0], blob[1]), sorted(blobsToUpload.items())):
+        if result == NO_ERROR:
+          cls.index['blobs'][fileHash] = blobName
+          cls.saveIndex(backend)
+        else:
+          ret = result
+    finally:
+      pool.close()
+      pool.join()
+
+    if ret != NO_ERROR:
+      return ret
+
+    for entry in manifest['files'].values():
+      entry['blob'] = cls.index['blobs'][entry['hash']]
+
+    ret = cls.__uploadJson(backend, config.UPLOAD_MANIFESTS_FOLDER + '/' + backupName + '.json', manifest)
+    if ret == NO_ERROR:
+      if backupName not in cls.index['manifests']:
+        cls.index['manifests'].append(backupName)
+      cls.saveIndex(backend)
+      ret = cls.__updateRemoteIndex(backend)
+
+    return ret
+
+  @classmethod
+  def restore(cls, backend, backupName, destination):
+    """
+      Rebuilds uploaded backup from its manifest.
+      :param backend: Upload backend.
+      :param backupName: Name of uploaded backup.
+      :param destination: Folder where backup is restored.
+      :return ret: NO_ERROR if backup is restored. Otherwise returns error code
+    """
+    manifestPath = os.path.join(cls.stagingPath, backupName + '.json')
+    try:
+      backend.download(config.UPLOAD_MANIFESTS_FOLDER + '/' + backupName + '.json', manifestPath)
+      with open(manifestPath, 'r') as manifestFile:
+        manifest = json.load(manifestFile)
+    except Exception as error:
+      cls.logger.error('Failed downloading manifest of ' + backupName + ': ' + str(error))
+      return ERROR_RESTORE_BACKUP_FAILED
+    finally:
+      if os.path.exists(manifestPath):
+        os.remove(manifestPath)
+
+    #Each blob is downloaded once, and copied to all files with the same content
+    blobs = dict()
+    for name, entry in manifest['files'].items():
+      blobs.setdefault(entry['hash'], (entry['blob'], []))[1].append(os.path.join(destination, name.replace('/', os.sep)))
+
+    cls.logger.info('Restoring ' + str(len(manifest['files'])) + ' files of ' + backupName + ' to ' + destination)
+    ret = NO_ERROR
+    pool = ThreadPool(config.UPLOAD_BLOBS_IN_FLIGHT)
+    try:
+      for fileHash, error in pool.imap_unordered(lambda blob: cls.__restoreBlob(backend, blob[0], blob[1][0], blob[1][1]), blobs.items()):
+        if error != None:
+          cls.logger.error('Failed restoring ' + fileHash + ': ' + error)
+          ret = ERROR_RESTORE_BACKUP_FAILED
+    finally:
+      pool.close()
+      pool.join()
+
+    return ret
+
+  #---------------------------------- Private methods --------------------------------------------
+  @classmethod
+  def __loadIndexes(cls):
+    """
+      Loads local copies of uploaded content indexes, for all destinations.
+    """
+    if os.path.isfile(cls.indexPath):
+      try:
+        with open(cls.indexPath, 'r') as indexFile:
+          return json.load(indexFile)
+      except Exception as error:
+        cls.logger.warning('Failed loading uploaded content index: ' + str(error))
+    return dict()
+
+  @classmethod
+  def __downloadIndex(cls, backend):
+    """
+      Downloads uploaded content index from destination.
+      :return index: Downloaded index, or None if it doesn't exist at destination.
+    """
+    try:
+      content, version = backend.read(config.UPLOAD_REMOTE_INDEX_NAME)
+      return json.loads(content.decode('utf-8')) if content != None else None
+    except Exception as error:
+      cls.logger.warning('Uploaded content index is not downloaded: ' + str(error))
+      return None
+
+  @classmethod
+  def __updateRemoteIndex(cls, backend):
+    """
+      Merges local index into index at destination. Index is written only if it is not changed since it was read,
+      otherwise it is read and merged again, so entries of uploads running at the same time are not lost.
+      :return ret: NO_ERROR if index is updated. Otherwise returns error code
+    """
+    try:
+      for attempt in range(config.UPLOAD_INDEX_UPDATE_ATTEMPTS):
+        content, version = backend.read(config.UPLOAD_REMOTE_INDEX_NAME)
+        index = json.loads(content.decode('utf-8')) if content != None else { 'blobs' : dict(), 'manifests' : [] }
+        index['blobs'].update(cls.index['blobs'])
+        index['manifests'] += [name for name in cls.index['manifests'] if name not in index['manifests']]
+        if backend.writeIfUnchanged(config.UPLOAD_REMOTE_INDEX_NAME, json.dumps(index, indent=2, sort_keys=True).encode('utf-8'), version):
+          cls.index = index
+          cls.saveIndex(backend)
+          return NO_ERROR
+        cls.logger.debug('Uploaded content index is changed by another upload, merging again')
+        time.sleep(attempt + 1)
+    except Exception as error:
+      cls.logger.error('Failed updating uploaded content index: ' + str(error))
+      return ERROR_UPLOAD_BACKUP_FAILED
+    cls.logger.error('Uploaded content index is not updated, because it is changed by other uploads')
+    return ERROR_UPLOAD_BACKUP_FAILED
+
+  @classmethod
+  def __uploadBlob(cls, backend, fileHash, filePath):
+    """
+      Uploads file content. Files that are not already compressed are compressed to staging folder first,
+      and kept there until they are uploaded, so interrupted upload can be resumed.
+      :return fileHash, blobName, ret: File hash, name of uploaded blob and NO_ERROR if upload was successfull.
+    """
+    compress = os.path.splitext(filePath)[1].lower() not in config.ZIP_STORED_EXTENSIONS
+    blobName = fileHash + ('.gz' if compress else '')
+    stagedPath = os.path.join(cls.stagingPath, blobName)
+    try:
+      if compress and not os.path.isfile(stagedPath):
+        tempPath = stagedPath + '.tmp'
+        with open(filePath, 'rb') as sourceFile:
+          with open(tempPath, 'wb') as compressedFile:
+            gzipFile = gzip.GzipFile(filename='', mode='wb', compresslevel=config.ZIP_COMPRESSION_LEVEL, fileobj=compressedFile, mtime=0)
+            shutil.copyfileobj(sourceFile, gzipFile, config.ZIP_CHUNK_SIZE)
+            gzipFile.close()
+        os.rename(tempPath, stagedPath)
+    except Exception as error:
+      cls.logger.error('Failed compressing ' + filePath + ': ' + str(error))
+      return fileHash, blobName, ERROR_UPLOAD_BACKUP_FAILED
+
+    ret = ChunkedUpload.upload(stagedPath if compress else filePath, backend, config.UPLOAD_BLOBS_FOLDER + '/' + blobName,
+                               stagedPath + config.UPLOAD_JOURNAL_SUFFIX)
+    if ret == NO_ERROR and compress:
+      Utility.deleteFiles([stagedPath])
+    return fileHash, blobName, ret
+
+  @classmethod
+  def __uploadJson(cls, backend, remoteName, content):
+    """
+      Uploads dictionary as JSON file.
+    """
+    stagedPath = os.path.join(cls.stagingPath, os.path.basename(remoteName))
+    Utility.writeFileAtomically(stagedPath, json.dumps(content, indent=2, sort_keys=True))
+    ret = ChunkedUpload.upload(stagedPath, backend, remoteName)
+    Utility.deleteFiles([stagedPath])
+    return ret
+
+  @classmethod
+  def __restoreBlob(cls, backend, fileHash, blobName, filePaths):
+    """
+      Downloads blob, verifies its content hash and writes it to all files with that content.
+      :return fileHash, error: File hash and error message, or None if files are restored.
+    """
+    stagedPath = os.path.join(cls.stagingPath, blobName)
+    try:
+      backend.download(config.UPLOAD_BLOBS_FOLDER + '/' + blobName, stagedPath)
+      for filePath in filePaths:
+        if not os.path.isdir(os.path.dirname(filePath)):
+          try:
+            os.makedirs(os.path.dirname(filePath))
+          except OSError:
+            #Folder is created by another thread
+            pass
+
+      contentHash = hashlib.sha256()
+      with (gzip.open(stagedPath, 'rb') if blobName.endswith('.gz') else open(stagedPath, 'rb')) as blobFile:
+        with open(filePaths[0], 'wb') as restoredFile:
+          for chunk in iter(lambda: blobFile.read(config.ZIP_CHUNK_SIZE), b''):
+            contentHash.update(chunk)
+            restoredFile.write(chunk)
+      if contentHash.hexdigest() != fileHash:
+        return fileHash, 'downloaded content doesn\'t match its hash'
+
+      for filePath in filePaths[1:]:
+        shutil.copyfile(filePaths[0], filePath)
+    except Exception as error:
+      return fileHash, str(error)
+    finally:
+      if os.path.exists(stagedPath):
+        os.remove(stagedPath)
+
+    return fileHash, None
@@ -34,7 +34,7 @@ targetConfigurations = [ 'Release', 'Debug' ]
 #TODO: Implement logic to update zslib_eventing_tool.gni based on list of specified programming languages.
 targetProgrammingLanguage = [ 'cx', 'cppwinrt', 'c', 'dotnet', 'python' ]
 
-#=========== Supported actions: clean, createuserdef, prepare, build, backup, createnuget, publishnuget, uploadbackup. 
+#=========== Supported actions: clean, createuserdef, prepare, build, backup, createnuget, publishnuget, uploadbackup, restorebackup. 
 # In future it will be added support  updatesample.
 #'clean' : Based on cleanup options set in cleanupOptions dict, it can be choosen desired cleanup actions.
 #'createuserdef' : Deletes existing userdef.py if exists and create a new from defaults.py.
@@ -45,6 +45,7 @@ targetProgrammingLanguage = [ 'cx', 'cppwinrt', 'c', 'dotnet', 'python' ]
 #'releasenote' : Gives user a choice on how to add a release note.
 #'publishnuget' : Publishes nuget package
 #'uploadbackup' : Creates a zipp file with pdb files and nuget package based on configuration and uploads it to onedrive
+#'restorebackup' : Downloads uploaded backup, selected with --restoreBackup or the latest one, to the folder with the backup name
 #List of actions to perform
 actions = [ 'prepare', 'build' ]
 
@@ -55,8 +56,14 @@ buildWrapper = True
 #Flag if rtc_include_tests should be defined. If False, native tests aren't built
 includeTests = False
 
+#Free disk space, in GB, required before prepare and build. If there is less free space, gn output and OUTPUT
+#folders of other target/platform/cpu/configuration combinations are deleted, least recently used first.
+#Folders used by the current run are never deleted. If it is 0, folders are not deleted.
+diskBudgetFreeSpaceGB = 0
+
 #=========== cleanupOptions
-#'actions' : ['cleanOutput', 'cleanIdls', 'cleanUserDef','cleanPrepare'],
+#'actions' : ['cleanOutput', 'cleanStale', 'cleanIdls', 'cleanUserDef','cleanPrepare'],
+#             'cleanStale' deletes only outputs that ninja doesn't produce anymore and orphaned obj and pdb files
 #'targets' :  If [], it will use values from targets variable above. 
 #             If ['*'] it will delete output folders for all targets. 
 #             If ['webrtc'] it will delete just webrtc target
@@ -119,6 +126,32 @@ enabledBackup = False
 libsBackupPath = './Backup'
 #Flag for overwriting current backup folder
 overwriteBackup = False
+#Backup retention rules, applied after backup. Rules with value 0 are not used. If all are 0, backups are not pruned.
+#'keepLast' : Number of the newest backups to keep.
+#'keepDaily' : Number of the last days for which the newest backup of the day is kept.
+#'keepWeekly' : Number of the last weeks for which the newest backup of the week is kept.
+#'maxTotalGB' : Maximal size of all kept backups. The oldest backups are deleted until size is under the limit.
+backupRetention = {
+                    'keepLast' : 0,
+                    'keepDaily' : 0,
+                    'keepWeekly' : 0,
+                    'maxTotalGB' : 0
+                  }
+
+#If set to True, uploadbackup action archives native and wrapper outputs directly, without creating backup folder first
+uploadBackupFromOutput = False
+
+#Compression used for uploaded backup archive. 'deflate' or 'lzma' (better ratio, slower, requires python 3)
+backupArchiveCompression = 'deflate'
+
+#Destination of uploaded backup archive. 'onedrive', 'http' (chunks are sent with PUT requests to uploadBackupURL)
+#or 'local' (archive is copied to uploadBackupURL folder)
+uploadBackend = 'onedrive'
+#URL or folder path for 'http' and 'local' upload backends. It can be overridden with --uploadurl
+uploadBackupURL = ''
+#If set to True, only files whose content is not uploaded yet are uploaded, with manifest of the backup, instead of zipped backup.
+#It requires 'http' or 'local' backend, or ONEDRIVE_ACCESS_TOKEN environment variable for 'onedrive'. Backup is restored with restorebackup action
+uploadDeduplicated = False
 
 #Additional targets that can be built
 #'target_name' : Name of target to build. You can name target as your wish.
@@ -150,6 +183,10 @@ nugetVersionInfo = {
 #Imput NuGet package version number manualy, used if selected version number does not exist on nuget.org, E.g., '1.66.0.3-Alpha'
 manualNugetVersionNumber = ''
 
+#If True, symbols package (.snupkg) with pdb files of the packaged dlls is created together with NuGet package.
+#Pdb files of native dlls are Windows pdbs, which nuget.org doesn't accept, so symbols package is only for private symbol servers
+createSymbolsPackage = False
+
 #Path to a release notes file
 releaseNotePath = 'releases.txt'
 
@@ -54,7 +54,10 @@ ERROR_UNIT_TESTS_WORKING_FOLDER_NOT_EXIST,\
 ERROR_UNIT_TESTS_FAILED_TO_DELETE_OLD_LOG,\
 ERROR_UNIT_TESTS_EXECUTION_FAILED,\
 ERROR_UNIT_TEST_FAILED,\
-TERMINATED_BY_USER = range(53)
+TERMINATED_BY_USER,\
+ERROR_CLEANUP_DELETING_STALE_FILES_FAILED,\
+ERROR_RESTORE_BACKUP_FAILED,\
+ERROR_PUBLISH_NUGET_FAILED = range(56)
 
 
 ERROR_COPY_LIB_FILES_FAILED = "Failed to copy lib file!"
@@ -88,6 +91,7 @@ error_codes = {
   ERROR_CHANGE_NUSPEC_FAILED: 'Failed to change .nuspec file!',
   ERROR_LOADING_NUGET_PACKAGES: 'Failed to load NuGet packages!',
   ERROR_SELECTING_NUGET_PACKAGES: 'Failed to select NuGet package!',
+  ERROR_PUBLISH_NUGET_FAILED: 'Failed to publish NuGet package!',
   ERROR_BUILD_OUTPUT_FOLDER_NOT_EXIST : 'Output folder doesn\'t exist',
   ERROR_BUILD_UPDATING_DEPS_FAILED : 'Failed updating target dependencies!',
   ERROR_BUILD_FAILED : 'Build has failed',
@@ -100,6 +104,7 @@ error_codes = {
   ERROR_BUILD_BACKUP_FAILED : 'Failed creating build backup!',
   ERROR_UPLOAD_BACKUP_FAILED: 'Failed to upload backup!',
   ERROR_UPLOAD_BACKUP_FILES_MISSING: 'Failed to upload backup, files missing!',
+  ERROR_RESTORE_BACKUP_FAILED: 'Failed to restore uploaded backup!',
   ERROR_UPDATE_SAMPLE_COPY_FAILED: 'Failed to copy sample directory content!',
   ERROR_UPDATE_SAMPLE_CLONE_FAILED: 'Failed to clone the sample from the repositorium!',
   ERROR_UPDATE_SAMPLE_USE_NUGET_FAILED: 'Failed to change .csproj file to use nuget package!',
@@ -109,6 +114,7 @@ error_codes = {
   ERROR_CLEANUP_DELETING_FLG_FILES_FAILED : 'Failed deleting .flg files!',
   ERROR_CLEANUP_DELETING_GENERATED_FILES_FAILED : 'Failed deleting files generated with idl compiler!',
   ERROR_CLEANUP_REVERTING_PREPARE_CHANGES_FAILED : 'Failed reverting prepare changes!',
+  ERROR_CLEANUP_DELETING_STALE_FILES_FAILED : 'Failed deleting stale build files!',
   ERROR_UNIT_TESTS_WORKING_FOLDER_NOT_EXIST : 'Working folder doesn\'t exist!',
   ERROR_UNIT_TESTS_FAILED_TO_DELETE_OLD_LOG : 'Failed to delete old unit tests log files',
   ERROR_UNIT_TESTS_EXECUTION_FAILED : 'Unit tests execution has failed!',
@@ -13,7 +13,7 @@ class Input:
     parser = argparse.ArgumentParser()
     parser.add_argument('template', nargs='?', help='Template name, where default settings are overwritten')
     
-    parser.add_argument('-a','--actions', nargs='*', choices=['clean', 'createuserdef', 'prepare', 'build', 'backup', 'uploadbackup', 'createnuget', 'releasenotes', 'updatesample', 'publishnuget', 'rununittests'], type=str.lower, help='Actions to perform')
+    parser.add_argument('-a','--actions', nargs='*', choices=['clean', 'createuserdef', 'prepare', 'build', 'backup', 'uploadbackup', 'restorebackup', 'createnuget', 'releasenotes', 'updatesample', 'publishnuget', 'rununittests'], type=str.lower, help='Actions to perform')
 
     if System.checkIfTargetIsSupported('ortc'):
       parser.add_argument('-t','--targets', nargs='*', choices=['ortc', 'webrtc'], help='Target')
@@ -35,7 +35,7 @@ class Input:
 
     parser.add_argument('--noWrapper', action='store_true', help='Do not build wrapper projects')
 
-    parser.add_argument('--cleanOptions', nargs='*', choices=['cleanoutput', 'cleanidls', 'cleanuserdef','cleanprepare'], type=str.lower, help='Target build configuration')
+    parser.add_argument('--cleanOptions', nargs='*', choices=['cleanoutput', 'cleanstale', 'cleanidls', 'cleanuserdef','cleanprepare'], type=str.lower, help='Target build configuration')
     
     parser.add_argument('--clang', action='store_true', help='Build with clang')
     
@@ -43,17 +43,31 @@ class Input:
 
     parser.add_argument('--uploadurl', nargs='?', action='store', dest='uploadBackupURL', help='Cloud storrage URL to wich backup will be uploaded')
 
+    parser.add_argument('--uploadFromOutput', action='store_true', dest='uploadBackupFromOutput', help='Upload build outputs directly, without creating backup folder first')
+
+    parser.add_argument('--refreshUploadIndex', action='store_true', dest='refreshUploadIndex', help='Refresh local index of uploaded content from upload destination')
+
+    parser.add_argument('--restoreBackup', nargs='?', action='store', dest='restoreBackupName', help='Name of uploaded backup to restore with restorebackup action')
+
     parser.add_argument('--setnugetkey', nargs='?', action='store', dest='setnugetkey', help='Set the api key for the nuget server')
 
     parser.add_argument('-u','--userTarget', nargs='?', help='Target to build if not webrtc or ortc')
 
     parser.add_argument('--includeTests', action='store_true', help='Include webrtc native tests (rtc_include_tests=true)')
     
+    parser.add_argument('--offline', action='store_true', help='Use cached NuGet package versions instead of nuget.org')
+
+    parser.add_argument('--forcePack', action='store_true', dest='forceNugetPack', help='Create new NuGet package even if package with the same content already exists')
+
     parser.add_argument('--setservernoteversion', action='store_true', help='Set release notes version from latest nuget package on nuget.org')
+
+    parser.add_argument('--renderReleaseNotes', action='store_true', dest='renderReleaseNotes', help='Write release notes file from release notes store')
     
     parser.add_argument('--idlImpl', action='store_true', help='Pass impl flag when compiling idls.')
     
     parser.add_argument('--unitTests', nargs='*', help='Unit tests to run.')
 
+    parser.add_argument('--timing-startup', action='store_true', dest='timingStartup', help='Show import time for each selected action')
+
     Settings.inputArgs = parser.parse_args()
     
\ No newline at end of file
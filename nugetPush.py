@@ -0,0 +1,222 @@
+import os
+import json
+import time
+import uuid
+import threading
+from multiprocessing.pool import ThreadPool
+try:
+  from http.client import HTTPConnection, HTTPSConnection
+  from urllib.parse import urlparse
+except ImportError:
+  from httplib import HTTPConnection, HTTPSConnection
+  from urlparse import urlparse
+
+import config
+from logger import Logger
+from errors import NO_ERROR, ERROR_PUBLISH_NUGET_FAILED
+
+#Results of package push
+PUSHED = 'pushed'
+ALREADY_EXISTS = 'exists'
+FAILED = 'failed'
+
+class NugetPush:
+  """
+    Pushes NuGet packages with NuGet push protocol, without nuget.exe. Packages are pushed concurrently, and each worker
+    thread keeps its connections to the feed open, so TLS handshake is not repeated for each request. Pushes that fail
+    with server error, throttling or connection error are retried with exponential backoff. Package that the feed
+    already has (409 Conflict) is not treated as failure.
+  """
+
+  logger = None
+  apiKey = None
+  packageEndpoint = None
+  symbolsEndpoint = None
+  #Open connections of each worker thread {(scheme, host) : connection}
+  local = threading.local()
+
+  @classmethod
+  def init(cls, serverURL, apiKey):
+    """
+      Inits logger and finds push endpoints of the feed. For v3 feed (URL of service index.json), endpoints are taken
+      from service index, otherwise v2 endpoints api/v2/package and api/v2/symbolpackage are used.
+      :param serverURL: Feed URL, or 'default' for nuget.org.
+      :param apiKey: API key of the feed.
+      :return ret: NO_ERROR if push endpoints are found. Otherwise returns error code
+    """
+    cls.logger = Logger.getLogger('NugetPush')
+    cls.apiKey = apiKey
+    if serverURL == 'default':
+      serverURL = config.NUGET_SERVICE_INDEX_URL
+
+    if not serverURL.endswith('.json'):
+      cls.packageEndpoint = serverURL.rstrip('/') + '/api/v2/package'
+      cls.symbolsEndpoint = serverURL.rstrip('/') + '/api/v2/symbolpackage'
+      return NO_ERROR
+
+    try:
+      status, retryAfter, body = cls.__request('GET', serverURL, { 'Accept' : 'application/json' })
+      if status != 200:
+        raise Exception('Service index request failed with status ' + str(status))
+      resources = json.loads(body.decode('utf-8')).get('resources', [])
+    except Exception as error:
+      cls.logger.error('Failed reading service index ' + serverURL + ': ' + str(error))
+      return ERROR_PUBLISH_NUGET_FAILED
+
+    cls.packageEndpoint = cls.__getResource(resources, 'PackagePublish/')
+    cls.symbolsEndpoint = cls.__getResource(resources, 'SymbolPackagePublish/')
+    if cls.packageEndpoint == None:
+      cls.logger.error('Feed ' + serverURL + ' doesn\'t support package push.')
+      return ERROR_PUBLISH_NUGET_FAILED
+    return NO_ERROR
+
+  @classmethod
+  def pushPackages(cls, packages):
+    """
+      Pushes packages concurrently. Symbols package is pushed after its NuGet package is pushed.
+      :param packages: List of (package path, symbols package path or None) tuples.
+      Symbols package that is not pushed is reported as warning, because its NuGet package is already published.
+      :return ret, results: NO_ERROR if all packages are pushed or the feed already has them,
+        and dictionary with package path as key and push result (PUSHED, ALREADY_EXISTS or FAILED) as value.
+    """
+    pool = ThreadPool(max(min(len(packages), config.NUGET_PUSH_WORKERS), 1))
+    try:
+      pushResults = pool.map(lambda package: cls.__pushWithSymbols(package[0], package[1]), packages)
+    finally:
+      pool.close()
+      pool.join()
+
+    ret = NO_ERROR
+    results = dict()
+    for (packagePath, symbolsPath), (result, symbolsResult) in zip(packages, pushResults):
+      results[packagePath] = result
+      if result == FAILED:
+        ret = ERROR_PUBLISH_NUGET_FAILED
+      elif symbolsResult == FAILED:
+        cls.logger.warning(os.path.basename(symbolsPath) + ' is not pushed, but ' + os.path.basename(packagePath) + ' is published without it.')
+    return ret, results
+
+  @classmethod
+  def push(cls, packagePath, symbols = False):
+    """
+      Pushes package to the feed.
+      :param packagePath: Path of .nupkg or .snupkg file.
+      :param symbols: If True, package is pushed to symbols package endpoint.
+      :return result: PUSHED, ALREADY_EXISTS or FAILED.
+    """
+    url = cls.symbolsEndpoint if symbols else cls.packageEndpoint
+    name = os.path.basename(packagePath)
+    boundary = uuid.uuid4().hex
+    head = ('--' + boundary + '\r\n' +
+            'Content-Disposition: form-data; name="package"; filename="' + name + '"\r\n' +
+            'Content-Type: application/octet-stream\r\n\r\n').encode('utf-8')
+    tail = ('\r\n--' + boundary + '--\r\n').encode('utf-8')
+    headers = {
+      'Content-Type' : 'multipart/form-data; boundary=' + boundary,
+      'Content-Length' : str(len(head) + os.path.getsize(packagePath) + len(tail)),
+      'X-NuGet-ApiKey' : cls.apiKey,
+      'X-NuGet-Protocol-Version' : '4.1.0'
+    }
+
+    delay = config.NUGET_PUSH_RETRY_DELAY
+    for attempt in range(config.NUGET_PUSH_RETRIES + 1):
+      try:
+        status, retryAfter, body = cls.__request('PUT', url, headers, (head, packagePath, tail))
+        reason = 'status ' + str(status)
+      except Exception as error:
+        status, retryAfter, reason = None, None, str(error)
+
+      if status in (200, 201, 202):
+        cls.logger.info('Pushed ' + name)
+        return PUSHED
+      if status == 409:
+        cls.logger.info('Feed already has ' + name + ', it is skipped.')
+        return ALREADY_EXISTS
+      if status != None and status != 429 and status < 500:
+        cls.logger.error('Push of ' + name + ' failed with ' + reason + ': ' + body.decode('utf-8', 'replace')[:500])
+        return FAILED
+
+      if attempt < config.NUGET_PUSH_RETRIES:
+        wait = int(retryAfter) if retryAfter != None and retryAfter.isdigit() else delay
+        cls.logger.warning('Push of ' + name + ' failed with ' + reason + ', it is retried in ' + str(wait) + ' seconds.')
+        time.sleep(wait)
+        delay *= 2
+
+    cls.logger.error('Push of ' + name + ' failed after ' + str(config.NUGET_PUSH_RETRIES) + ' retries.')
+    return FAILED
+
+  #---------------------------------- Private methods --------------------------------------------
+  @classmethod
+  def __pushWithSymbols(cls, packagePath, symbolsPath):
+    """
+      Pushes package, and then its symbols package.
+      :return result, symbolsResult: Push results, with symbols result None if symbols package is not pushed.
+    """
+    result = cls.push(packagePath)
+    symbolsResult = None
+    if result != FAILED and symbolsPath != None:
+      if cls.symbolsEndpoint == None:
+        cls.logger.warning('Feed doesn\'t support symbols packages, ' + os.path.basename(symbolsPath) + ' is not pushed.')
+      else:
+        symbolsResult = cls.push(symbolsPath, True)
+    return result, symbolsResult
+
+  @staticmethod
+  def __getResource(resources, resourceType):
+    """
+      Returns URL of the first service index resource of specified type, or None if there is no such resource.
+    """
+    for resource in resources:
+      types = resource.get('@type', [])
+      if not isinstance(types, list):
+        types = [types]
+      if any(type.startswith(resourceType) for type in types):
+        return resource['@id']
+    return None
+
+  @classmethod
+  def __request(cls, method, url, headers, body = None):
+    """
+      Sends HTTP request over connection of current thread, that is kept open for following requests.
+      :param method: HTTP method.
+      :param url: Request URL.
+      :param headers: Dictionary with request headers.
+      :param body: (head bytes, file path, tail bytes) tuple. File is sent in chunks, between head and tail.
+      :return status, retryAfter, body: Response status, Retry-After header and body.
+    """
+    parsedUrl = urlparse(url)
+    path = parsedUrl.path + ('?' + parsedUrl.query if parsedUrl.query else '')
+    if not hasattr(cls.local, 'connections'):
+      cls.local.connections = dict()
+    key = (parsedUrl.scheme, parsedUrl.netloc)
+    connection = cls.local.connections.get(key)
+    if connection == None:
+      connectionClass = HTTPSConnection if parsedUrl.scheme == 'https' else HTTPConnection
+      connection = connectionClass(parsedUrl.netloc, timeout=config.NUGET_PUSH_TIMEOUT)
+      cls.local.connections[key] = connection
+
+    try:
+      connection.putrequest(method, path)
+      for name, value in headers.items():
+        connection.putheader(name, value)
+      if body == None and method != 'GET':
+        connection.putheader('Content-Length', '0')
+      connection.endheaders()
+      if body != None:
+        head, filePath, tail = body
+        connection.send(head)
+        with open(filePath, 'rb') as packageFile:
+          for chunk in iter(lambda: packageFile.read(config.NUGET_PUSH_CHUNK_SIZE), b''):
+            connection.send(chunk)
+        connection.send(tail)
+      response = connection.getresponse()
+      responseBody = response.read()
+    except Exception:
+      #Connection is opened again by the next request
+      connection.close()
+      del cls.local.connections[key]
+      raise
+    if response.getheader('Connection', '').lower() == 'close':
+      connection.close()
+      del cls.local.connections[key]
+    return response.status, response.getheader('Retry-After'), responseBody
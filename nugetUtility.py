@@ -1,6 +1,11 @@
 import os
+import sys
 import glob
 import re
+import base64
+import hashlib
+import threading
+from xml.etree import ElementTree as ET
 from subprocess import Popen, PIPE, call
 
 from errors import NO_ERROR, ERROR_ACQUIRE_NUGET_EXE_FAILED
@@ -8,6 +13,7 @@ from settings import Settings
 from helper import convertToPlatformPath, module_exists
 from logger import Logger,ColoredFormatter
 import config
+from utility import Utility
 
 class NugetUtility:
   api_key_instruction = '\033[94m' + r"""
@@ -16,14 +22,18 @@ class NugetUtility:
     1) Get the API key from nuget.org
     2) Set the API key by eather:
         a) Changing the value of the nugetAPIKey variable inside userdef.py
-        b) running command 'python .\scripts\run.py -setnugetkey <key>' from the command line (webrtc-uwp-sdk folder)
-        c) running command nuget 'nuget setapikey <key>' from the command line (assuming you have nuget cli installed)
+        b) running command 'python .\scripts\run.py -setnugetkey <key>' from the command line (webrtc-uwp-sdk folder),
+           which also stores the key for the following runs, as 'nuget setapikey <key>' does
+        c) Setting NUGET_API_KEY environment variable
     ===================================================================================================================
     """ + '\033[0m'
   set_source_instruction = r"""
   To make the updated sample work, please add nuget folder as a package source inside Visual Studio. 
   You can do this by going to Tools>Options>Nuget Package Manager>Package Sources and clicking the green + sign at the top and changing the Source value at the bottom to: """
   setNugetSourceManualy = False
+  #Locks that prevent concurrent restore of the same solution {solution path : lock}
+  restoreLocks = dict()
+  restoreLocksGuard = threading.Lock()
   @classmethod
   def setUp(cls):
       cls.logger = Logger.getLogger('nugetUtility')
@@ -86,6 +96,176 @@ class NugetUtility:
       ret = ERROR_ACQUIRE_NUGET_EXE_FAILED
     return ret
 
+  @classmethod
+  def set_api_key(cls, key, source = 'default'):
+    """
+      Stores the api key for the nuget server in user NuGet.Config with nuget.exe, so it is used by the following runs
+      :param key: key in a form of a string
+      :param source: server URL address (optional) if left out nuget.org is assumed
+      :return: NO_ERROR if key is stored. Otherwise returns error code
+    """
+    return cls.nuget_cli('setapikey', key, '-Source', 'https://www.nuget.org/' if source == 'default' else source)
+
+  @classmethod
+  def get_stored_api_key(cls, source = 'default'):
+    """
+      Reads the api key for the nuget server stored by 'nuget setapikey' in user NuGet.Config.
+      Stored keys are encrypted for current Windows user, so they can be read only on Windows.
+      :param source: server URL address (optional) if left out nuget.org is assumed
+      :return: Stored key, or empty string if key for the server is not stored or it can't be read
+    """
+    sources = config.NUGET_ORG_API_KEY_SOURCES if source == 'default' else [source]
+    sources = [url.rstrip('/').lower() for url in sources]
+    for configPath in cls.__get_user_config_paths():
+      if not os.path.isfile(configPath):
+        continue
+      try:
+        apiKeys = ET.parse(configPath).findall('apikeys/add')
+      except Exception as error:
+        cls.logger.warning('Failed reading ' + configPath + ': ' + str(error))
+        continue
+      for apiKey in apiKeys:
+        if apiKey.get('key', '').rstrip('/').lower() not in sources:
+          continue
+        try:
+          return cls.__decrypt_api_key(apiKey.get('value', ''))
+        except Exception as error:
+          cls.logger.error('Api key stored with nuget setapikey in ' + configPath + ' can\'t be read: ' + str(error) +
+                           '. Set nugetAPIKey in userdef.py or ' + config.NUGET_API_KEY_VARIABLE + ' environment variable instead.')
+          return ''
+    return ''
+
+  @classmethod
+  def restore(cls, solutionPath):
+    """
+      Restores nuget packages for solution, if its package references changed since the last restore
+      or if some of referenced packages are missing. Different solutions can be restored concurrently.
+      :param solutionPath: Path to solution.
+      :return: NO_ERROR if packages are restored or restore is not needed. Otherwise returns error code
+    """
+    with cls.restoreLocksGuard:
+      lock = cls.restoreLocks.setdefault(os.path.abspath(solutionPath), threading.Lock())
+
+    with lock:
+      stampPath = os.path.join(os.path.dirname(solutionPath), '.' + os.path.basename(solutionPath) + config.NUGET_RESTORE_STAMP_SUFFIX)
+      try:
+        restoreKey, packages, assetsFiles = cls.get_restore_key(solutionPath)
+      except Exception as error:
+        cls.logger.warning('Failed reading package references of ' + solutionPath + ': ' + str(error))
+        restoreKey, packages, assetsFiles = None, [], []
+
+      if restoreKey != None and os.path.isfile(stampPath):
+        with open(stampPath, 'r') as stampFile:
+          previousKey = stampFile.read().strip()
+        if previousKey == restoreKey and cls.check_packages_restored(solutionPath, packages, assetsFiles):
+          cls.logger.info('Packages for ' + os.path.basename(solutionPath) + ' are up to date. Skipping restore.')
+          return NO_ERROR
+
+      ret = cls.nuget_cli('restore', solutionPath, '-NonInteractive')
+      if ret == NO_ERROR and restoreKey != None:
+        with open(stampPath, 'w') as stampFile:
+          stampFile.write(restoreKey)
+      return ret
+
+  @classmethod
+  def get_restore_key(cls, solutionPath):
+    """
+      Calculates hash of all projects in solution, with their package manifests and MSBuild files they import
+      from their folder or folders above it (Directory.Build.props, Directory.Packages.props...).
+      Whole project files are hashed, so changes of package versions, target frameworks or runtime identifiers trigger restore.
+      :param solutionPath: Path to solution.
+      :return: Restore key, list of referenced packages as (id, version, uses packages.config) tuples,
+        and list of project.assets.json files that restore of PackageReference projects creates
+    """
+    solutionFolder = os.path.dirname(solutionPath)
+    manifestHash = hashlib.sha256()
+    packages = []
+    assetsFiles = []
+
+    #NuGet.Config next to solution affects sources used for restore
+    manifests = [os.path.join(solutionFolder, 'NuGet.Config'), os.path.join(solutionFolder, 'nuget.config')]
+    for projectPath in sorted(Utility.getSolutionProjects(solutionPath)):
+      projectFolder = os.path.dirname(projectPath)
+      manifests.append(projectPath)
+      manifests.extend(os.path.join(projectFolder, fileName) for fileName in config.NUGET_RESTORE_MANIFESTS)
+      #MSBuild looks for imported files in project folder and all folders above it
+      folder = os.path.abspath(projectFolder)
+      while True:
+        manifests.extend(os.path.join(folder, fileName) for fileName in config.NUGET_RESTORE_IMPORTS)
+        parentFolder = os.path.dirname(folder)
+        if parentFolder == folder:
+          break
+        folder = parentFolder
+
+      with open(projectPath, 'r') as projectFile:
+        references = cls.get_package_references(projectFile.read())
+      if len(references) > 0:
+        #Restore writes project.assets.json to intermediate output folder of PackageReference project
+        assetsFiles.append(os.path.join(projectFolder, 'obj', 'project.assets.json'))
+      packages.extend((packageId, version, False) for packageId, version in references if version != None)
+
+    hashedManifests = set()
+    for manifestPath in manifests:
+      if manifestPath in hashedManifests or not os.path.isfile(manifestPath):
+        continue
+      hashedManifests.add(manifestPath)
+      with open(manifestPath, 'rb') as manifestFile:
+        content = manifestFile.read()
+      manifestHash.update(manifestPath.encode('utf-8') + b'\n' + hashlib.sha256(content).hexdigest().encode('utf-8') + b'\n')
+      if os.path.basename(manifestPath) == 'packages.config':
+        for packageId, version in re.findall(r'<package\s+id="([^"]+)"\s+version="([^"]+)"', content.decode('utf-8', 'ignore')):
+          packages.append((packageId, version, True))
+
+    return manifestHash.hexdigest(), packages, assetsFiles
+
+  @staticmethod
+  def get_package_references(projectContent):
+    """
+      Finds PackageReference items in project, with version set as attribute or as child Version element.
+      :param projectContent: Content of project file.
+      :return: List of (id, version) tuples, with version None if it is not set in project, i.e. with central package management,
+        or if it is not a single version, i.e. version range or MSBuild property
+    """
+    references = []
+    for attributes, content in re.findall(r'<PackageReference\b([^>]*?)(?:/>|>(.*?)</PackageReference>)', projectContent, re.DOTALL):
+      packageId = re.search(r'\bInclude\s*=\s*"([^"]+)"', attributes)
+      if packageId == None:
+        continue
+      version = re.search(r'\bVersion\s*=\s*"([^"]+)"', attributes) or re.search(r'<Version>\s*([^<]+?)\s*</Version>', content)
+      version = version.group(1) if version != None else None
+      if version != None and not re.match(r'^[0-9A-Za-z.\-+]+$', version):
+        version = None
+      references.append((packageId.group(1), version))
+    return references
+
+  @classmethod
+  def check_packages_restored(cls, solutionPath, packages, assetsFiles):
+    """
+      Checks if projects are restored, i.e. if project.assets.json of each PackageReference project exists,
+      and all referenced packages exist in solution packages folder (packages.config) or global packages folder (PackageReference).
+      :param solutionPath: Path to solution.
+      :param packages: List of (id, version, uses packages.config) tuples.
+      :param assetsFiles: List of project.assets.json files.
+      :return: True if all projects and packages are restored.
+    """
+    for assetsFile in assetsFiles:
+      if not os.path.isfile(assetsFile):
+        cls.logger.debug(assetsFile + ' is missing, project is not restored.')
+        return False
+
+    solutionPackagesPath = os.path.join(os.path.dirname(solutionPath), 'packages')
+    globalPackagesPath = os.environ.get('NUGET_PACKAGES', os.path.join(os.path.expanduser('~'), '.nuget', 'packages'))
+    for packageId, version, usesPackagesConfig in packages:
+      if usesPackagesConfig:
+        packagePath = os.path.join(solutionPackagesPath, packageId + '.' + version, packageId + '.' + version + '.nupkg')
+      else:
+        #Metadata file is written last, so it exists only if package is completely extracted
+        packagePath = os.path.join(globalPackagesPath, packageId.lower(), version.lower(), '.nupkg.metadata')
+      if not os.path.isfile(packagePath):
+        cls.logger.debug('Package ' + packageId + ' ' + version + ' is not restored.')
+        return False
+    return True
+
   @classmethod
   def download_nuget(cls):
     """
@@ -160,3 +340,39 @@ class NugetUtility:
         cls.logger.warning(cls.set_source_instruction+srcPath)
     except Exception as error:
       cls.logger.error(str(error))
+
+  #---------------------------------- Private methods --------------------------------------------
+  @staticmethod
+  def __get_user_config_paths():
+    """
+      Returns possible paths of user NuGet.Config, where nuget.exe stores api keys.
+    """
+    if sys.platform == 'win32':
+      return [os.path.join(os.environ.get('APPDATA', ''), 'NuGet', 'NuGet.Config')]
+    return [os.path.expanduser('~/.nuget/NuGet/NuGet.Config'), os.path.expanduser('~/.config/NuGet/NuGet.Config')]
+
+  @staticmethod
+  def __decrypt_api_key(encryptedKey):
+    """
+      Decrypts api key that nuget.exe encrypted with DPAPI for current user.
+    """
+    if sys.platform != 'win32':
+      raise Exception('keys encrypted for Windows user can be decrypted only on Windows')
+    import ctypes
+    from ctypes import wintypes
+
+    class DataBlob(ctypes.Structure):
+      _fields_ = [('cbData', wintypes.DWORD), ('pbData', ctypes.POINTER(ctypes.c_char))]
+
+    encrypted = base64.b64decode(encryptedKey)
+    encryptedBuffer = ctypes.create_string_buffer(encrypted, len(encrypted))
+    entropyBuffer = ctypes.create_string_buffer(config.NUGET_API_KEY_ENTROPY, len(config.NUGET_API_KEY_ENTROPY))
+    encryptedBlob = DataBlob(len(encrypted), ctypes.cast(encryptedBuffer, ctypes.POINTER(ctypes.c_char)))
+    entropyBlob = DataBlob(len(config.NUGET_API_KEY_ENTROPY), ctypes.cast(entropyBuffer, ctypes.POINTER(ctypes.c_char)))
+    decryptedBlob = DataBlob()
+    if not ctypes.windll.crypt32.CryptUnprotectData(ctypes.byref(encryptedBlob), None, ctypes.byref(entropyBlob), None, None, 0, ctypes.byref(decryptedBlob)):
+      raise ctypes.WinError()
+    try:
+      return ctypes.string_at(decryptedBlob.pbData, decryptedBlob.cbData).decode('utf-8')
+    finally:
+      ctypes.windll.kernel32.LocalFree(decryptedBlob.pbData)
@@ -0,0 +1,250 @@
+import os
+import io
+import json
+import gzip
+import time
+from multiprocessing.pool import ThreadPool
+try:
+  from urllib.request import Request, urlopen
+  from urllib.error import HTTPError
+except ImportError:
+  from urllib2 import Request, urlopen, HTTPError
+
+import config
+from logger import Logger
+from utility import Utility
+from errors import NO_ERROR, ERROR_GET_NUGET_PACKAGE_VERSIONS_FAILED
+
+class NugetVersionIndex:
+  """
+    Index of published NuGet package versions, read from NuGet v3 registration API. Registration pages that are not
+    inlined in registration index are fetched concurrently. Index and pages are cached locally with their ETags,
+    so cached index is used while it is fresh, revalidated when it expires, and used as it is in offline mode.
+  """
+
+  logger = None
+
+  @classmethod
+  def init(cls):
+    """
+      Inits logger.
+    """
+    cls.logger = Logger.getLogger('NugetVersionIndex')
+
+  @classmethod
+  def getVersions(cls, packageId, cacheFolder, offline = False):
+    """
+      Returns all published versions of NuGet package.
+      :param packageId: NuGet package id.
+      :param cacheFolder: Folder where cached index is kept.
+      :param offline: If True, only cached index is used.
+      :return ret, versions: NO_ERROR if versions are collected, and sorted list of versions.
+    """
+    cacheFilePath = os.path.join(cacheFolder, config.NUGET_VERSION_INDEX_FILE)
+    cache = cls.__loadCache(cacheFilePath)
+    cached = cache.get(packageId.lower())
+
+    if offline or (cached != None and time.time() - cached['fetched'] < config.NUGET_VERSION_INDEX_TTL):
+      if cached == None:
+        cls.logger.error('There is no cached version index for ' + packageId + ' to use offline.')
+        return ERROR_GET_NUGET_PACKAGE_VERSIONS_FAILED, []
+      cls.logger.debug('Using cached version index for ' + packageId + '.')
+      return NO_ERROR, sorted(cached['versions'])
+
+    try:
+      cached = cls.__fetch(packageId, cached)
+    except Exception as error:
+      if cached == None:
+        cls.logger.error('Failed fetching version index for ' + packageId + ': ' + str(error))
+        return ERROR_GET_NUGET_PACKAGE_VERSIONS_FAILED, []
+      cls.logger.warning('Failed fetching version index for ' + packageId + ', cached index is used: ' + str(error))
+      return NO_ERROR, sorted(cached['versions'])
+
+    cache[packageId.lower()] = cached
+    try:
+      if not os.path.isdir(cacheFolder):
+        os.makedirs(cacheFolder)
+      Utility.writeFileAtomically(cacheFilePath, json.dumps(cache))
+    except Exception as error:
+      cls.logger.warning('Failed saving version index cache: ' + str(error))
+    return NO_ERROR, sorted(cached['versions'])
+
+  @classmethod
+  def invalidate(cls, packageId, cacheFolder):
+    """
+      Marks cached index as expired, so it is revalidated next time, i.e. after new version is published.
+      :param packageId: NuGet package id.
+      :param cacheFolder: Folder where cached index is kept.
+    """
+    cacheFilePath = os.path.join(cacheFolder, config.NUGET_VERSION_INDEX_FILE)
+    cache = cls.__loadCache(cacheFilePath)
+    if packageId.lower() in cache:
+      cache[packageId.lower()]['fetched'] = 0
+      Utility.writeFileAtomically(cacheFilePath, json.dumps(cache))
+
+  @staticmethod
+  def parseVersion(version):
+    """
+      Parses NuGet package version in major.minor.build[-prerelease] or major.minor.change.build[-prerelease] format.
+      :param version: Version string.
+      :return major, minor, change, build, prerelease: Version numbers, with change set to None for three part versions
+        and empty prerelease for release versions, or None if version is not in supported format.
+    """
+    number, separator, prerelease = version.split('+')[0].partition('-')
+    parts = number.split('.')
+    if len(parts) not in (3, 4) or not all(part.isdigit() for part in parts):
+      return None
+    parts = [int(part) for part in parts]
+    if len(parts) == 4:
+      return parts[0], parts[1], parts[2], parts[3], prerelease
+    return parts[0], parts[1], None, parts[2], prerelease
+
+  @classmethod
+  def getLatestVersions(cls, versions, minMinorNumber = 0):
+    """
+      Finds the latest published version for each minor version number, in a single pass over versions.
+      For each minor number, the highest major number wins, then four part versions win over three part versions,
+      then the highest change and build numbers win, and then release version wins over prerelease versions.
+      :param versions: List of version strings.
+      :param minMinorNumber: Versions with minor number that is not greater than this are ignored.
+      :return latestVersions: Dictionary with minor number as key and dictionary with 'major_number', 'change_number'
+        (only for four part versions), 'build_number' and 'prerelease' (only for prerelease versions) as value.
+    """
+    #{minor number : (sort key, parsed version)}
+    latest = dict()
+    for version in versions:
+      parsed = cls.parseVersion(version)
+      if parsed == None or parsed[1] <= minMinorNumber:
+        continue
+      major, minor, change, build, prerelease = parsed
+      #Release version wins over prerelease versions of the same build, as in getLatestVersion
+      key = (major, change != None, change if change != None else -1, build, prerelease == '', prerelease.lower())
+      if minor not in latest or key > latest[minor][0]:
+        latest[minor] = (key, parsed)
+
+    latestVersions = dict()
+    for minor, (key, (major, minorNumber, change, build, prerelease)) in latest.items():
+      latestVersion = { 'major_number' : major, 'build_number' : build }
+      if change != None:
+        latestVersion['change_number'] = change
+      if prerelease != '':
+        latestVersion['prerelease'] = prerelease
+      latestVersions[minor] = latestVersion
+    return latestVersions
+
+  @classmethod
+  def getLatestVersion(cls, versions):
+    """
+      Finds the highest version, comparing version numbers, with release version higher than prerelease versions of the same number.
+      :param versions: List of version strings.
+      :return version: The highest version, or None if there are no versions in supported format.
+    """
+    latest = None
+    for version in versions:
+      parsed = cls.parseVersion(version)
+      if parsed == None:
+        continue
+      major, minor, change, build, prerelease = parsed
+      #Three part version x.y.z is the same as x.y.z.0
+      numbers = (major, minor, change, build) if change != None else (major, minor, build, 0)
+      key = (numbers, prerelease == '', prerelease.lower())
+      if latest == None or key > latest[0]:
+        latest = (key, version)
+    return latest[1] if latest != None else None
+
+  #---------------------------------- Private methods --------------------------------------------
+  @classmethod
+  def __loadCache(cls, cacheFilePath):
+    """
+      Loads cached indexes {package id : {'fetched', 'etag', 'pages' : {page url : {'etag', 'versions'}}, 'versions'}}.
+    """
+    if os.path.isfile(cacheFilePath):
+      try:
+        with open(cacheFilePath, 'r') as cacheFile:
+          return json.load(cacheFile)
+      except Exception as error:
+        cls.logger.warning('Failed loading version index cache: ' + str(error))
+    return dict()
+
+  @classmethod
+  def __fetch(cls, packageId, cached):
+    """
+      Fetches registration index and pages that are changed since they are cached.
+      :param packageId: NuGet package id.
+      :param cached: Cached index, or None.
+      :return index: Updated index.
+    """
+    if cached == None:
+      cached = { 'fetched' : 0, 'etag' : None, 'pages' : dict(), 'versions' : [] }
+
+    url = config.NUGET_REGISTRATION_BASE_URL.rstrip('/') + '/' + packageId.lower() + '/index.json'
+    registration, etag = cls.__getJson(url, cached['etag'])
+    if registration == None:
+      #Registration index is not changed, so neither are its pages
+      cls.logger.debug('Cached version index for ' + packageId + ' is up to date.')
+      cached['fetched'] = time.time()
+      return cached
+
+    pages = dict()
+    pagesToFetch = []
+    for page in registration.get('items', []):
+      if 'items' in page:
+        pages[page['@id']] = { 'etag' : None, 'versions' : cls.__getPageVersions(page) }
+      else:
+        pagesToFetch.append(page['@id'])
+
+    if len(pagesToFetch) > 0:
+      cls.logger.debug('Fetching ' + str(len(pagesToFetch)) + ' registration pages for ' + packageId + '.')
+      pool = ThreadPool(config.NUGET_VERSION_INDEX_WORKERS)
+      try:
+        fetchedPages = pool.map(lambda pageUrl: cls.__fetchPage(pageUrl, cached['pages'].get(pageUrl)), pagesToFetch)
+      finally:
+        pool.close()
+        pool.join()
+      for pageUrl, page in zip(pagesToFetch, fetchedPages):
+        pages[pageUrl] = page
+
+    versions = set()
+    for page in pages.values():
+      versions.update(page['versions'])
+    return { 'fetched' : time.time(), 'etag' : etag, 'pages' : pages, 'versions' : sorted(versions) }
+
+  @classmethod
+  def __fetchPage(cls, pageUrl, cachedPage):
+    """
+      Fetches registration page, unless cached page is not changed.
+    """
+    page, etag = cls.__getJson(pageUrl, cachedPage['etag'] if cachedPage != None else None)
+    if page == None:
+      return cachedPage
+    return { 'etag' : etag, 'versions' : cls.__getPageVersions(page) }
+
+  @staticmethod
+  def __getPageVersions(page):
+    """
+      Returns versions of all packages on registration page.
+    """
+    return [leaf['catalogEntry']['version'] for leaf in page.get('items', [])]
+
+  @staticmethod
+  def __getJson(url, etag):
+    """
+      Gets JSON document, if it is changed since it was fetched with specified ETag.
+      :return document, etag: Document and its ETag, or None and the same ETag if document is not modified.
+    """
+    headers = { 'Accept-Encoding' : 'gzip' }
+    if etag:
+      headers['If-None-Match'] = etag
+    try:
+      response = urlopen(Request(url, headers=headers), timeout=config.NUGET_VERSION_INDEX_TIMEOUT)
+    except HTTPError as error:
+      if error.code == 304:
+        return None, etag
+      raise
+    try:
+      body = response.read()
+      if response.info().get('Content-Encoding') == 'gzip':
+        body = gzip.GzipFile(fileobj=io.BytesIO(body)).read()
+      return json.loads(body.decode('utf-8')), response.info().get('ETag')
+    finally:
+      response.close()
@@ -0,0 +1,294 @@
+import os
+import re
+import copy
+import shutil
+import hashlib
+import tempfile
+from xml.etree import ElementTree as ET
+try:
+  from urllib.parse import quote
+except ImportError:
+  from urllib import quote
+
+import config
+from logger import Logger
+from parallelZip import ParallelZip
+from backupStore import BackupStore
+
+NUSPEC_NAMESPACE = 'http://schemas.microsoft.com/packaging/2013/05/nuspec.xsd'
+CONTENT_TYPES_NAMESPACE = 'http://schemas.openxmlformats.org/package/2006/content-types'
+RELATIONSHIPS_NAMESPACE = 'http://schemas.openxmlformats.org/package/2006/relationships'
+CORE_PROPERTIES_NAMESPACE = 'http://schemas.openxmlformats.org/package/2006/metadata/core-properties'
+MANIFEST_RELATIONSHIP_TYPE = 'http://schemas.microsoft.com/packaging/2010/07/manifest'
+CORE_PROPERTIES_RELATIONSHIP_TYPE = 'http://schemas.openxmlformats.org/package/2006/relationships/metadata/core-properties'
+#Metadata elements of NuGet package that are not copied to symbols package
+SYMBOLS_PACKAGE_EXCLUDED_METADATA = ('dependencies', 'frameworkAssemblies', 'frameworkReferences', 'references', 'contentFiles', 'packageTypes')
+
+class NupkgWriter:
+  """
+    Writes .nupkg package in-process, with the OPC layout nuget pack creates: the nuspec, package files,
+    _rels/.rels, [Content_Types].xml and core properties part. Entries are written in sorted order with fixed
+    timestamps, so the same inputs always give byte-identical package.
+  """
+
+  logger = None
+
+  @classmethod
+  def init(cls):
+    """
+      Inits logger.
+    """
+    cls.logger = Logger.getLogger('NupkgWriter')
+    ParallelZip.init()
+
+  @classmethod
+  def write(cls, nuspec, packageFiles, packagePath):
+    """
+      Creates NuGet package.
+      :param nuspec: Nuspec model.
+      :param packageFiles: Package files returned by getPackageFiles.
+      :param packagePath: Path of .nupkg file to create.
+      :return ret: True if package is created.
+    """
+    return cls.__writePackage(copy.deepcopy(nuspec.metadata), packageFiles, packagePath)
+
+  @classmethod
+  def writeSymbols(cls, nuspec, symbolFiles, packagePath):
+    """
+      Creates symbols package (.snupkg), with the same id and version as NuGet package, and SymbolsPackage package type.
+      Pdb files are read directly from their source paths.
+      :param nuspec: Nuspec model of NuGet package.
+      :param symbolFiles: Dictionary with path in package as key and pdb file path as value.
+      :param packagePath: Path of .snupkg file to create.
+      :return ret: True if package is created.
+    """
+    metadata = copy.deepcopy(nuspec.metadata)
+    #Symbols package doesn't have dependencies and references of NuGet package
+    for element in list(metadata):
+      if element.tag in SYMBOLS_PACKAGE_EXCLUDED_METADATA:
+        metadata.remove(element)
+    packageTypes = ET.SubElement(metadata, 'packageTypes')
+    packageTypes.text = '\n\t\t\t'
+    packageTypes.tail = '\n\t'
+    ET.SubElement(packageTypes, 'packageType', {'name': 'SymbolsPackage'}).tail = '\n\t\t'
+    if len(metadata) > 1:
+      metadata[-2].tail = '\n\t\t'
+    return cls.__writePackage(metadata, symbolFiles, packagePath)
+
+  @classmethod
+  def getPackageFiles(cls, nuspec, basePath):
+    """
+      Resolves file elements of nuspec to files that go to the package.
+      :param nuspec: Nuspec model.
+      :param basePath: Folder that src attributes of file elements are relative to.
+      :return packageFiles: Dictionary with path in package as key and file path as value, or None if files can't be resolved.
+    """
+    packageFiles = dict()
+    #Paths in package are case insensitive {lower case path : path in package}
+    partNames = dict()
+    try:
+      for src, target, exclude in nuspec.getFiles():
+        for filePath, partName in cls.__resolveFiles(basePath, src, target, exclude):
+          #The same path can be added for more configurations, the last file element wins
+          if partName.lower() in partNames:
+            cls.logger.warning('File ' + partName + ' is added to the package more than once, ' + filePath + ' is used.')
+            del packageFiles[partNames[partName.lower()]]
+          partNames[partName.lower()] = partName
+          packageFiles[partName] = filePath
+    except Exception as error:
+      cls.logger.error(str(error))
+      return None
+    return packageFiles
+
+  @classmethod
+  def getContentKey(cls, nuspec, packageFiles):
+    """
+      Returns key of package content, hash of the manifest without version and of path and content hash of each package file.
+      Packages with the same key differ only in version. File hashes are taken from BackupStore, which has to be initialized.
+      :param nuspec: Nuspec model.
+      :param packageFiles: Package files returned by getPackageFiles.
+      :return key: Content key.
+    """
+    hashes = BackupStore.hashFiles(list(packageFiles.values()))
+    BackupStore.saveHashCache()
+
+    metadata = copy.deepcopy(nuspec.metadata)
+    metadata.find('version').text = ''
+    contentKey = hashlib.sha256(cls.__manifest(metadata))
+    for partName in sorted(packageFiles):
+      contentKey.update(('\n' + partName + ':' + hashes[packageFiles[partName]]).encode('utf-8'))
+    return contentKey.hexdigest()
+
+  #---------------------------------- Private methods --------------------------------------------
+  @classmethod
+  def __writePackage(cls, metadata, packageFiles, packagePath):
+    """
+      Writes package with manifest created from metadata element, package files, and OPC parts.
+      :param metadata: Manifest metadata element.
+      :param packageFiles: Dictionary with path in package as key and file path as value.
+      :param packagePath: Path of package file to create.
+      :return ret: True if package is created.
+    """
+    packageId = metadata.find('id').text
+    version = metadata.find('version').text
+
+    coreProperties = 'package/services/metadata/core-properties/' + hashlib.md5((packageId + version).encode('utf-8')).hexdigest() + '.psmdcp'
+    tempFolder = tempfile.mkdtemp()
+    try:
+      parts = [
+        (packageId + '.nuspec', cls.__manifest(metadata)),
+        ('_rels/.rels', cls.__relationships(packageId + '.nuspec', coreProperties)),
+        ('[Content_Types].xml', cls.__contentTypes(packageFiles.keys())),
+        (coreProperties, cls.__coreProperties(metadata))
+      ]
+      partPaths = []
+      for index, (partName, content) in enumerate(parts):
+        partPath = os.path.join(tempFolder, str(index))
+        with open(partPath, 'wb') as partFile:
+          partFile.write(content)
+        partPaths.append((partPath, partName))
+
+      filesToZip = [partPaths[0]]
+      filesToZip += [(packageFiles[partName], quote(partName, safe='/')) for partName in sorted(packageFiles)]
+      filesToZip += partPaths[1:]
+
+      tempPackagePath = packagePath + '.tmp'
+      if not ParallelZip.write(tempPackagePath, filesToZip, dateTime=config.NUPKG_ENTRY_DATE_TIME):
+        return False
+      if os.path.exists(packagePath):
+        os.remove(packagePath)
+      os.rename(tempPackagePath, packagePath)
+    except Exception as error:
+      cls.logger.error('Failed creating ' + packagePath + ': ' + str(error))
+      return False
+    finally:
+      shutil.rmtree(tempFolder, ignore_errors=True)
+
+    cls.logger.debug('Created ' + packagePath + ' with ' + str(len(packageFiles)) + ' files.')
+    return True
+
+  @staticmethod
+  def __wildcardRegex(pattern):
+    """
+      Converts NuGet wildcard pattern (*, ** and ?) to case insensitive regular expression.
+    """
+    regex = ''
+    index = 0
+    while index < len(pattern):
+      if pattern.startswith('**/', index):
+        regex += '(?:.*/)?'
+        index += 3
+      elif pattern.startswith('**', index):
+        regex += '.*'
+        index += 2
+      elif pattern[index] == '*':
+        regex += '[^/]*'
+        index += 1
+      elif pattern[index] == '?':
+        regex += '[^/]'
+        index += 1
+      else:
+        regex += re.escape(pattern[index])
+        index += 1
+    return re.compile('^' + regex + '$', re.IGNORECASE)
+
+  @classmethod
+  def __resolveFiles(cls, basePath, src, target, exclude):
+    """
+      Resolves file element to files and their paths in package, following nuget pack rules.
+      Single file goes to target folder, unless target has the same extension as the file. Files matched by
+      wildcards keep their path relative to the folder before the first wildcard.
+      :return files: List of (file path, path in package) tuples.
+    """
+    src = src.replace('\\', '/')
+    target = target.replace('\\', '/').strip('/')
+    targetFolder = target + '/' if target != '' else ''
+
+    if '*' not in src and '?' not in src:
+      filePath = os.path.join(basePath, src)
+      if not os.path.isfile(filePath):
+        raise Exception('File does NOT exist! ' + src)
+      extension = os.path.splitext(src)[1].lower()
+      if extension != '' and os.path.splitext(target)[1].lower() == extension:
+        return [(filePath, target)]
+      return [(filePath, targetFolder + os.path.basename(src))]
+
+    segments = src.split('/')
+    rootIndex = [index for index, segment in enumerate(segments) if '*' in segment or '?' in segment][0]
+    rootPath = os.path.join(basePath, '/'.join(segments[:rootIndex]))
+    srcRegex = cls.__wildcardRegex(src)
+    excludeRegexes = [cls.__wildcardRegex(pattern.strip().replace('\\', '/')) for pattern in exclude.split(';') if pattern.strip() != '']
+
+    files = []
+    for root, dirs, names in os.walk(rootPath):
+      #Files and folders starting with dot are excluded by default, as in nuget pack
+      dirs[:] = sorted(folder for folder in dirs if not folder.startswith('.'))
+      for name in sorted(names):
+        filePath = os.path.join(root, name)
+        relativePath = os.path.relpath(filePath, basePath).replace(os.sep, '/')
+        if name.startswith('.') or not srcRegex.match(relativePath) or any(regex.match(relativePath) for regex in excludeRegexes):
+          continue
+        files.append((filePath, targetFolder + os.path.relpath(filePath, rootPath).replace(os.sep, '/')))
+    return files
+
+  @staticmethod
+  def __manifest(metadata):
+    """
+      Returns package manifest, the nuspec with metadata element only.
+    """
+    package = ET.Element('package', {'xmlns': NUSPEC_NAMESPACE})
+    package.text = '\n\t'
+    metadata.tail = '\n'
+    package.append(metadata)
+    return b'<?xml version="1.0" encoding="utf-8"?>\n' + ET.tostring(package, encoding='utf-8')
+
+  @staticmethod
+  def __relationships(manifestName, coreProperties):
+    """
+      Returns _rels/.rels part, with relationships to manifest and core properties.
+    """
+    relationships = ET.Element('Relationships', {'xmlns': RELATIONSHIPS_NAMESPACE})
+    for relationshipType, partName in [(MANIFEST_RELATIONSHIP_TYPE, manifestName), (CORE_PROPERTIES_RELATIONSHIP_TYPE, coreProperties)]:
+      relationshipId = 'R' + hashlib.md5(partName.encode('utf-8')).hexdigest()[:16].upper()
+      ET.SubElement(relationships, 'Relationship', {'Type': relationshipType, 'Target': '/' + partName, 'Id': relationshipId})
+    return b'<?xml version="1.0" encoding="utf-8"?>\n' + ET.tostring(relationships, encoding='utf-8')
+
+  @staticmethod
+  def __contentTypes(partNames):
+    """
+      Returns [Content_Types].xml part, with default content type for each file extension.
+    """
+    types = ET.Element('Types', {'xmlns': CONTENT_TYPES_NAMESPACE})
+    ET.SubElement(types, 'Default', {'Extension': 'rels', 'ContentType': 'application/vnd.openxmlformats-package.relationships+xml'})
+    ET.SubElement(types, 'Default', {'Extension': 'psmdcp', 'ContentType': 'application/vnd.openxmlformats-package.core-properties+xml'})
+    extensions = set(['nuspec'])
+    withoutExtension = []
+    for partName in partNames:
+      extension = os.path.splitext(partName)[1][1:].lower()
+      if extension == '':
+        withoutExtension.append(partName)
+      elif extension not in ('rels', 'psmdcp'):
+        extensions.add(extension)
+    for extension in sorted(extensions):
+      ET.SubElement(types, 'Default', {'Extension': extension, 'ContentType': 'application/octet'})
+    for partName in sorted(withoutExtension):
+      ET.SubElement(types, 'Override', {'PartName': '/' + quote(partName, safe='/'), 'ContentType': 'application/octet'})
+    return b'<?xml version="1.0" encoding="utf-8"?>\n' + ET.tostring(types, encoding='utf-8')
+
+  @staticmethod
+  def __coreProperties(metadata):
+    """
+      Returns core properties part, with package id, version, authors, description and tags.
+    """
+    properties = ET.Element('coreProperties', {
+      'xmlns': CORE_PROPERTIES_NAMESPACE,
+      'xmlns:dc': 'http://purl.org/dc/elements/1.1/',
+      'xmlns:dcterms': 'http://purl.org/dc/terms/',
+      'xmlns:xsi': 'http://www.w3.org/2001/XMLSchema-instance'
+    })
+    for name, elementName in [('dc:creator', 'authors'), ('dc:description', 'description'), ('dc:identifier', 'id'),
+                              ('version', 'version'), ('keywords', 'tags')]:
+      element = metadata.find(elementName)
+      ET.SubElement(properties, name).text = element.text if element is not None and element.text is not None else ''
+    ET.SubElement(properties, 'lastModifiedBy').text = config.NUPKG_LAST_MODIFIED_BY
+    return b'<?xml version="1.0" encoding="utf-8"?>\n' + ET.tostring(properties, encoding='utf-8')
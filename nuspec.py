@@ -0,0 +1,125 @@
+import os
+from xml.etree import ElementTree as ET
+
+class Nuspec(object):
+  """
+    In-memory model of .nuspec file. Template is parsed once, file elements, repository and release notes
+    are collected for all cpu and configuration combinations, and file is written once when the model is complete.
+    Template must not have xmlns="..." inside the package tag, otherwise metadata and files elements are not found.
+  """
+
+  def __init__(self, templatePath, version):
+    """
+      Loads .nuspec template and sets package version.
+      :param templatePath: Path of .nuspec template.
+      :param version: NuGet package version.
+    """
+    with open(templatePath, 'rb') as template:
+      self.tree = ET.parse(template)
+    self.metadata = self.tree.find('metadata')
+    self.files = self.tree.find('files')
+    self.setVersion(version)
+
+  def setVersion(self, version):
+    """
+      Sets package version.
+    """
+    self.metadata.find('version').text = version
+
+  def setReleaseNotes(self, releaseNotes):
+    """
+      Adds release notes element after the version element.
+    """
+    element = self.metadata.find('releaseNotes')
+    if element is None:
+      element = ET.Element('releaseNotes')
+      index = list(self.metadata).index(self.metadata.find('version')) + 1
+      element.tail = self.metadata[index - 1].tail
+      self.metadata.insert(index, element)
+    element.text = releaseNotes
+
+  def setRepository(self, url, repositoryType = 'git'):
+    """
+      Adds repository element to metadata.
+    """
+    self.__append(self.metadata, ET.Element('repository', attrib={'type': repositoryType, 'url': url}))
+
+  def addFile(self, src, target):
+    """
+      Adds file element.
+      :param src: Path of the file, relative to .nuspec file.
+      :param target: Path of the file inside NuGet package.
+    """
+    self.__append(self.files, ET.Element('file', attrib={'src': src, 'target': target}))
+
+  def updateFiles(self, srcParts, src, target):
+    """
+      Updates file elements whose src contains all specified strings.
+      :param srcParts: List of strings that src has to contain.
+      :param src: New src attribute.
+      :param target: New target attribute.
+      :return count: Number of updated elements.
+    """
+    count = 0
+    for element in self.files:
+      if all(part in element.attrib.get('src', '') for part in srcParts):
+        element.set('src', src)
+        element.set('target', target)
+        count += 1
+    return count
+
+  def removeFiles(self, srcParts):
+    """
+      Removes file elements whose src contains all specified strings.
+      :return removed: List of src attributes of removed elements.
+    """
+    removed = [element for element in self.files if all(part in element.attrib.get('src', '') for part in srcParts)]
+    for element in removed:
+      self.files.remove(element)
+    return [element.attrib.get('src') for element in removed]
+
+  def getValue(self, name, default = ''):
+    """
+      Returns text of metadata element.
+    """
+    element = self.metadata.find(name)
+    return element.text if element is not None and element.text is not None else default
+
+  def getFiles(self):
+    """
+      Returns list of (src, target, exclude) attributes of file elements.
+    """
+    return [(element.attrib.get('src', ''), element.attrib.get('target', ''), element.attrib.get('exclude', '')) for element in self.files]
+
+  def getMissingFiles(self, basePath):
+    """
+      Checks, once for each distinct src, that files referenced by file elements exist.
+      :param basePath: Folder that src attributes are relative to.
+      :return missing: List of src attributes of files that don't exist.
+    """
+    sources = []
+    for element in self.files:
+      src = element.attrib.get('src')
+      #Wildcard sources are resolved by nuget pack
+      if src not in sources and '*' not in src:
+        sources.append(src)
+    return [src for src in sources if not os.path.exists(os.path.join(basePath, src))]
+
+  def write(self, path):
+    """
+      Writes .nuspec file.
+    """
+    self.tree.write(path)
+
+  @staticmethod
+  def __append(parent, element):
+    """
+      Appends element as the last child, with indentation of its siblings.
+    """
+    if len(parent) > 0:
+      element.tail = parent[-1].tail
+      parent[-1].tail = parent.text
+    else:
+      element.tail = parent.tail
+      parent.text = (parent.tail or '') + '\t'
+    parent.append(element)
@@ -0,0 +1,252 @@
+import os
+import time
+import zlib
+import struct
+import tempfile
+from collections import deque
+from multiprocessing.pool import ThreadPool
+try:
+  import lzma
+except ImportError:
+  #LZMA is available only in python 3
+  lzma = None
+
+import config
+from logger import Logger
+
+#Compression methods from zip specification
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+ZIP_LZMA = 14
+#LZMA properties of zip entries, as in preset 6 of xz: literal context bits, literal position bits, position bits and dictionary size
+LZMA_LC = 3
+LZMA_LP = 0
+LZMA_PB = 2
+LZMA_DICTIONARY_SIZE = 8 * 1024 * 1024
+
+class ParallelZip:
+  """
+    Writes zip64 archive whose entries are compressed concurrently by worker pool.
+    Compressed entries are written to archive in the order they are passed, so the same input always gives the same archive.
+    Only a few entries, two for each worker, are compressed ahead of the entry that is written, so compressed data
+    that waits to be written doesn't take memory or temporary space of the whole archive.
+  """
+
+  logger = None
+
+  @classmethod
+  def init(cls):
+    """
+      Inits logger.
+    """
+    cls.logger = Logger.getLogger('ParallelZip')
+
+  @classmethod
+  def write(cls, output, filesToZip, compression = 'deflate', workers = None, progress = None, dateTime = None):
+    """
+      Creates zip archive.
+      :param output: Path of zip archive to create, or stream with write and tell methods that archive is written to,
+        i.e. upload stream, so archive doesn't have to be written to file.
+      :param filesToZip: List of (file path, name in zip) tuples.
+      :param compression: 'deflate' or 'lzma'. LZMA requires python 3.
+      :param workers: Number of compression threads. If None, config.ZIP_COMPRESSION_WORKERS is used.
+      :param progress: Function called with number of processed bytes and total number of bytes, after each entry is written.
+      :param dateTime: (year, month, day, hour, minute, second) tuple used as modification time of all entries.
+        If None, modification time of each file is used.
+      :return ret: True if archive is created.
+    """
+    method = ZIP_DEFLATED
+    if compression == 'lzma':
+      if lzma != None:
+        method = ZIP_LZMA
+      elif cls.logger != None:
+        cls.logger.warning('LZMA compression is not supported by this python version. Deflate is used instead.')
+
+    totalBytes = sum(os.path.getsize(filePath) for filePath, name in filesToZip)
+    processedBytes = 0
+    centralDirectory = []
+
+    workers = workers if workers != None else config.ZIP_COMPRESSION_WORKERS
+    pool = ThreadPool(workers)
+    filesIterator = iter(filesToZip)
+    #Entries that are compressed, or wait to be written, in input order
+    pending = deque()
+    def submitEntries():
+      while len(pending) < 2 * workers:
+        fileToZip = next(filesIterator, None)
+        if fileToZip == None:
+          break
+        pending.append(pool.apply_async(cls.__compressEntry, (fileToZip[0], fileToZip[1], method, dateTime)))
+
+    zipFile = None
+    try:
+      zipFile = output if hasattr(output, 'write') else open(output, 'wb')
+      submitEntries()
+      while len(pending) > 0:
+        entry = pending.popleft().get()
+        #Workers compress following entries while this one is written
+        submitEntries()
+        try:
+          entry['offset'] = zipFile.tell()
+          zipFile.write(cls.__localHeader(entry))
+          entry['data'].seek(0)
+          for chunk in iter(lambda: entry['data'].read(config.ZIP_CHUNK_SIZE), b''):
+            zipFile.write(chunk)
+        finally:
+          entry['data'].close()
+          del entry['data']
+        centralDirectory.append(entry)
+
+        processedBytes += entry['size']
+        if progress != None:
+          progress(processedBytes, totalBytes)
+
+      cls.__writeCentralDirectory(zipFile, centralDirectory)
+    except Exception as error:
+      if cls.logger != None:
+        cls.logger.error('Failed creating ' + (output if zipFile is not output else 'zip archive') + ': ' + str(error))
+      return False
+    finally:
+      if zipFile != None and zipFile is not output:
+        zipFile.close()
+      pool.close()
+      pool.join()
+      #Compressed data of entries that are not written, if writing failed
+      for result in pending:
+        try:
+          result.get()['data'].close()
+        except Exception:
+          pass
+
+    return True
+
+  #---------------------------------- Private methods --------------------------------------------
+  @classmethod
+  def __compressEntry(cls, filePath, name, method, dateTime):
+    """
+      Compresses file to spooled temporary file. Files that are already compressed are stored.
+      :return entry: Dictionary with zip entry attributes and compressed data.
+    """
+    if os.path.splitext(filePath)[1].lower() in config.ZIP_STORED_EXTENSIONS:
+      method = ZIP_STORED
+
+    if method == ZIP_DEFLATED:
+      compressor = zlib.compressobj(config.ZIP_COMPRESSION_LEVEL, zlib.DEFLATED, -15)
+    elif method == ZIP_LZMA:
+      compressor, header = cls.__createLzmaCompressor()
+    else:
+      compressor = None
+
+    data = tempfile.SpooledTemporaryFile(max_size=config.ZIP_SPOOL_MAX_SIZE)
+    if method == ZIP_LZMA:
+      data.write(header)
+    crc = 0
+    size = 0
+    with open(filePath, 'rb') as fileToZip:
+      for chunk in iter(lambda: fileToZip.read(config.ZIP_CHUNK_SIZE), b''):
+        crc = zlib.crc32(chunk, crc)
+        size += len(chunk)
+        data.write(compressor.compress(chunk) if compressor != None else chunk)
+    if compressor != None:
+      data.write(compressor.flush())
+
+    if dateTime != None:
+      modificationTime = time.struct_time(tuple(dateTime) + (0, 0, -1))
+    else:
+      modificationTime = time.localtime(os.path.getmtime(filePath))
+    if modificationTime.tm_year < 1980:
+      modificationTime = time.localtime(time.mktime((1980, 1, 1, 0, 0, 0, 0, 0, -1)))
+
+    return {
+      'name' : name.replace(os.sep, '/').encode('utf-8'),
+      'method' : method,
+      'crc' : crc & 0xffffffff,
+      'size' : size,
+      'compressedSize' : data.tell(),
+      'time' : (modificationTime.tm_hour << 11) | (modificationTime.tm_min << 5) | (modificationTime.tm_sec // 2),
+      'date' : ((modificationTime.tm_year - 1980) << 9) | (modificationTime.tm_mon << 5) | modificationTime.tm_mday,
+      'data' : data
+    }
+
+  @staticmethod
+  def __createLzmaCompressor():
+    """
+      Creates raw LZMA compressor with fixed properties, and header that zip specification requires in front of
+      compressed data: LZMA SDK version, properties size, and properties byte followed by dictionary size.
+      :return compressor, header: LZMA compressor and entry data header.
+    """
+    properties = struct.pack('<BI', (LZMA_PB * 5 + LZMA_LP) * 9 + LZMA_LC, LZMA_DICTIONARY_SIZE)
+    compressor = lzma.LZMACompressor(lzma.FORMAT_RAW, filters=[{ 'id' : lzma.FILTER_LZMA1, 'dict_size' : LZMA_DICTIONARY_SIZE,
+                                                                 'lc' : LZMA_LC, 'lp' : LZMA_LP, 'pb' : LZMA_PB }])
+    return compressor, struct.pack('<BBH', 9, 20, len(properties)) + properties
+
+  @staticmethod
+  def __entryFields(entry):
+    """
+      Returns version needed to extract, flags and zip64 extra field values for entry.
+    """
+    version = 63 if entry['method'] == ZIP_LZMA else 20
+    #UTF-8 names, and end of stream marker for LZMA
+    flags = 0x800 | (0x02 if entry['method'] == ZIP_LZMA else 0)
+    zip64 = entry['size'] >= 0xffffffff or entry['compressedSize'] >= 0xffffffff or entry.get('offset', 0) >= 0xffffffff
+    if zip64:
+      version = max(version, 45)
+    return version, flags, zip64
+
+  @classmethod
+  def __localHeader(cls, entry):
+    """
+      Returns local file header for entry.
+    """
+    version, flags, zip64 = cls.__entryFields(entry)
+    extra = b''
+    size = entry['size']
+    compressedSize = entry['compressedSize']
+    if zip64:
+      extra = struct.pack('<HHQQ', 1, 16, size, compressedSize)
+      size = compressedSize = 0xffffffff
+
+    return struct.pack('<IHHHHHIIIHH', 0x04034b50, version, flags, entry['method'], entry['time'], entry['date'],
+                       entry['crc'], compressedSize, size, len(entry['name']), len(extra)) + entry['name'] + extra
+
+  @classmethod
+  def __writeCentralDirectory(cls, zipFile, entries):
+    """
+      Writes central directory and end of central directory records, with zip64 records if they are required.
+    """
+    centralDirectoryOffset = zipFile.tell()
+    for entry in entries:
+      version, flags, zip64 = cls.__entryFields(entry)
+      extraValues = []
+      size = entry['size']
+      compressedSize = entry['compressedSize']
+      offset = entry['offset']
+      if size >= 0xffffffff:
+        extraValues.append(size)
+        size = 0xffffffff
+      if compressedSize >= 0xffffffff:
+        extraValues.append(compressedSize)
+        compressedSize = 0xffffffff
+      if offset >= 0xffffffff:
+        extraValues.append(offset)
+        offset = 0xffffffff
+      extra = b''
+      if len(extraValues) > 0:
+        extra = struct.pack('<HH' + 'Q' * len(extraValues), 1, 8 * len(extraValues), *extraValues)
+
+      zipFile.write(struct.pack('<IHHHHHHIIIHHHHHII', 0x02014b50, version, version, flags, entry['method'], entry['time'], entry['date'],
+                                entry['crc'], compressedSize, size, len(entry['name']), len(extra), 0, 0, 0, 0, offset) + entry['name'] + extra)
+
+    centralDirectoryEnd = zipFile.tell()
+    centralDirectorySize = centralDirectoryEnd - centralDirectoryOffset
+    count = len(entries)
+
+    if count >= 0xffff or centralDirectorySize >= 0xffffffff or centralDirectoryOffset >= 0xffffffff:
+      #Zip64 end of central directory record and locator
+      zipFile.write(struct.pack('<IQHHIIQQQQ', 0x06064b50, 44, 45, 45, 0, 0, count, count, centralDirectorySize, centralDirectoryOffset))
+      zipFile.write(struct.pack('<IIQI', 0x07064b50, 0, centralDirectoryEnd, 1))
+      count = min(count, 0xffff)
+      centralDirectorySize = min(centralDirectorySize, 0xffffffff)
+      centralDirectoryOffset = min(centralDirectoryOffset, 0xffffffff)
+
+    zipFile.write(struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, count, count, centralDirectorySize, centralDirectoryOffset, 0))
@@ -1,11 +1,14 @@
 import os
 import time
 
+import config
 from logger import Logger
 from settings import Settings
 from nugetUtility import NugetUtility
+from nugetPush import NugetPush, PUSHED
+from nugetVersionIndex import NugetVersionIndex
 from utility import Utility
-from errors import NO_ERROR, ERROR_LOADING_NUGET_PACKAGES, ERROR_SELECTING_NUGET_PACKAGES
+from errors import NO_ERROR, ERROR_LOADING_NUGET_PACKAGES, ERROR_SELECTING_NUGET_PACKAGES, ERROR_PUBLISH_NUGET_FAILED
 from helper import convertToPlatformPath
 from system import System
 from createNuget import CreateNuget
@@ -20,7 +23,10 @@ class PublishNuget:
         cls.nugetFolderPath = Settings.nugetFolderPath
         cls.nugetExePath = cls.nugetFolderPath + '/nuget.exe'
         cls.serverURL = Settings.nugetServerURL
-        cls.serverKey = Settings.nugetAPIKey
+        cls.serverKey = Settings.nugetAPIKey if Settings.nugetAPIKey != '' else os.environ.get(config.NUGET_API_KEY_VARIABLE, '')
+        if cls.serverKey == '':
+            # key stored by earlier runs with -setnugetkey, or with nuget setapikey
+            cls.serverKey = NugetUtility.get_stored_api_key(cls.serverURL)
         cls.packages = []
 
     @classmethod
@@ -35,9 +41,6 @@ class PublishNuget:
         start_time = time.time()
         ret =  NO_ERROR
 
-        if Settings.nugetAPIKey != '':
-            cls.set_api_key(cls.serverKey, cls.serverURL)
-        
         #Select package that was just created.
         if hasattr(CreateNuget, 'version'):
             ret = cls.load_packages(['webrtc.'+CreateNuget.version+'.nupkg'])
@@ -50,14 +53,11 @@ class PublishNuget:
             if ret == NO_ERROR:
                 ret = cls.ask_user()
         if ret == NO_ERROR:
-            for package in cls.packages:
-                packagePath = convertToPlatformPath(cls.nugetFolderPath+'/'+package['fullName'])
-                #Api key needs to be placed diferently
-                ret = cls.publish(packagePath, cls.serverURL)
+            ret = cls.publish_packages(cls.packages, cls.serverURL)
         end_time = time.time()
         
-        if ret == NO_ERROR:
-            ReleaseNotes.set_note_version(package['packageVersionNumber'])
+        if ret == NO_ERROR and cls.packages:
+            ReleaseNotes.set_note_version(cls.packages[-1]['packageVersionNumber'])
         cls.executionTime = end_time - start_time
         
         # return to the base directory
@@ -126,31 +126,48 @@ class PublishNuget:
         return ret
 
     @classmethod
-    def set_api_key(cls, key, address = 'default'):
+    def publish_packages(cls, packages, address = 'default'):
         """
-        Sets the api key for the nuget server
-        :param key: key in a form of a string
-        :param address: server URL address (optional) if left out nuget.org is assumed
+        Publishes NuGet packages, and their symbols packages, on a server of choice.
+        Packages are pushed concurrently, and packages that are already published are skipped.
+        :param packages: list of package dictionaries created by load_packages.
+        :param address: server address.
+        :return: NO_ERROR if successfull. Otherwise returns error code
         """
-        if address is 'default':
-            NugetUtility.nuget_cli('setapikey', key, '-Source', 'https://www.nuget.org/')
-        else:
-            NugetUtility.nuget_cli('setapikey', key, '-Source', address)
+        if cls.serverKey == '':
+            print(NugetUtility.api_key_instruction)
+            return ERROR_PUBLISH_NUGET_FAILED
 
+        packages_to_push = []
+        for package in packages:
+            if address == 'default' and package['packageVersionNumber'].lower() in cls.get_published_versions(package['packageId']):
+                cls.logger.info(package['fullName'] + ' is already published on nuget.org, it is skipped.')
+                continue
+            package_path = convertToPlatformPath(cls.nugetFolderPath + '/' + package['fullName'])
+            symbols_path = package_path[:-len('.nupkg')] + '.snupkg'
+            packages_to_push.append((package_path, symbols_path if os.path.isfile(symbols_path) else None))
+        if not packages_to_push:
+            return NO_ERROR
+
+        ret = NugetPush.init(address, cls.serverKey)
+        if ret == NO_ERROR:
+            ret, results = NugetPush.pushPackages(packages_to_push)
+            # version index of published packages is read from nuget.org again
+            NugetVersionIndex.init()
+            for package in packages:
+                if results.get(convertToPlatformPath(cls.nugetFolderPath + '/' + package['fullName'])) == PUSHED:
+                    NugetVersionIndex.invalidate(package['packageId'], cls.nugetFolderPath)
+        return ret
 
     @classmethod
-    def publish(cls, nuget_package, address = 'default'):
+    def get_published_versions(cls, package_id):
         """
-        Publishes NuGet package on a server of choice.
-        :param nuget_package: full name of the nuget package to be published.
-        :param address: server address.
+        Returns lower case versions of the package published on nuget.org, from cached version index
+        :param package_id: id of the package.
         """
-        ret = NO_ERROR
-        if address is 'default':
-            ret = NugetUtility.nuget_cli('push', nuget_package, '-Source', 'https://www.nuget.org/')
-        else:
-            ret = NugetUtility.nuget_cli('push', nuget_package, '-Source', address)
-        return ret
+        NugetVersionIndex.init()
+        ret, versions = NugetVersionIndex.getVersions(package_id, cls.nugetFolderPath, Settings.offline)
+        return set(version.lower() for version in versions) if ret == NO_ERROR else set()
 
     @classmethod
     def delete(cls, package_id, package_veresion, address):
@@ -1,11 +1,12 @@
 import sys
 import os
-import re 
 from helper import module_exists, yes_no, convertToPlatformPath 
 from settings import Settings
 from logger import Logger
 from utility import Utility
-from nugetUtility import NugetUtility
+from nugetVersionIndex import NugetVersionIndex
+from releaseNotesStore import ReleaseNotesStore
+from errors import NO_ERROR
 
 
 class ReleaseNotes:
@@ -44,12 +45,10 @@ class ReleaseNotes:
         elif inputValue is 2:
             inputNote = cls.select_file()
         if inputNote is not False:
-            mode = 'r+' if os.path.exists(Settings.releaseNotePath) else 'w+'
-            with open(Settings.releaseNotePath, mode) as release_notes:
-                oldContent = release_notes.read()
-                release_notes.seek(0, 0)
-                release_notes.write(inputNote.rstrip('\r\n') + '\n' + oldContent)
-                cls.logger.info('Successfuly created release note')
+            # note is appended to the store, on top of the notes that don't have a version set
+            ReleaseNotesStore.init(Settings.releaseNotePath)
+            ReleaseNotesStore.addNote(inputNote)
+            cls.logger.info('Successfuly created release note')
         # return to the base directory
         Utility.popd()
         return inputNote
@@ -104,85 +103,65 @@ class ReleaseNotes:
 
     @classmethod
     def get_note(cls, note_source):
+        """
+        Returns release notes that don't have a version set, from release notes store
+        :param note_source: path of the release notes file, store is placed along side it.
+        :return note: release notes, or False if there are no notes without version
+        """
         cls.init()
-        note = ''
-        with open(note_source, 'r') as read_src:
-            for line in read_src:
-                if '--------------------------------------------' in line:
-                    break
-                else:
-                    note += line
+        ReleaseNotesStore.init(note_source)
+        note = ReleaseNotesStore.getCurrentNote()
         if note == '':
             note = False
             cls.logger.warning('Release note not written')
         return note
-        
 
     @classmethod
     def set_note_version(cls, version):
         """
-        Sets the version of the release note.
+        Sets the version of the release notes that don't have a version set.
         :param version: version of the release note to be set
         """
         #Change current working directory to root sdk directory
         Utility.pushd(Settings.rootSdkPath)
         cls.init()
-        notes_file = 'releases.txt'
-        note = cls.get_note(notes_file)
-        if note is not False:
-            new_note = '---------------------------------------------------------------------\n' + \
-                'Version:   '  + version + '\n' + \
-                '---------------------------------------------------------------------\n'
-            if os.path.isfile(notes_file):
-                with open(notes_file,"r") as src:
-                    all_notes=src.readlines()
-                    if '--------------------------------------------' not in all_notes[0]:
-                        all_notes.insert(0,new_note)
-            else:
-                all_notes = new_note
-
-            with open(notes_file, 'w') as release_notes:
-                release_notes.writelines(all_notes)
-                cls.logger.info("Release notes vesion set: " + version)
+        ReleaseNotesStore.init(Settings.releaseNotePath)
+        if ReleaseNotesStore.setVersion(version):
+            cls.logger.info("Release notes vesion set: " + version)
+        else:
+            cls.logger.warning('Release note not written')
         # return to the base directory
         Utility.popd()
 
     @classmethod
     def set_note_version_server(cls):
         """
-        Sets the version of the release notes by getting the latest 
-        published version of the nuget package published on nuget.org
+        Sets the version of the release notes to the latest 
+        version of the WebRtc nuget package published on nuget.org, taken from cached version index
         """
         #Change current working directory to root sdk directory
         Utility.pushd(Settings.rootSdkPath)
         cls.init()
-        notes_file = 'releases.txt'
-        #Get the list of WebRtc nuget pakcages with prereleases
-        packages = NugetUtility.nuget_cli('list', 'Id:WebRtc', '-PreRelease')
-        packages = packages.split('\r\n')
-        webrtcRegex = r"^WebRtc+\s"
-        #Search the list of the packages for a WebRtc package and set the version
-        for package in packages:
-            if re.match(webrtcRegex, package, flags=0):
-                version = package
-
-        note = cls.get_note(notes_file)
-        if note is not False:
-            new_note = '---------------------------------------------------------------------\n' + \
-                'Version:   '  + version + '\n' + \
-                '---------------------------------------------------------------------\n'
-            if os.path.isfile(notes_file):
-                with open(notes_file,"r") as src:
-                    all_notes=src.readlines()
-                    if '--------------------------------------------' not in all_notes[0]:
-                        all_notes.insert(0,new_note)
-            else:
-                all_notes = new_note
+        NugetVersionIndex.init()
+        ret, versions = NugetVersionIndex.getVersions('WebRtc', Settings.nugetFolderPath, Settings.offline)
+        version = NugetVersionIndex.getLatestVersion(versions) if ret == NO_ERROR else None
+        if version is None:
+            cls.logger.error('Failed to get the latest published version of WebRtc nuget package')
+        else:
+            cls.set_note_version(version)
+        # return to the base directory
+        Utility.popd()
 
-            with open(notes_file, 'w') as release_notes:
-                release_notes.writelines(all_notes)
-                cls.logger.info("Release notes vesion set: " + version)    
-                
+    @classmethod
+    def render_notes(cls):
+        """
+        Writes release notes file from release notes store
+        """
+        #Change current working directory to root sdk directory
+        Utility.pushd(Settings.rootSdkPath)
+        cls.init()
+        ReleaseNotesStore.init(Settings.releaseNotePath)
+        ReleaseNotesStore.render(Settings.releaseNotePath)
+        cls.logger.info('Release notes written to ' + Settings.releaseNotePath)
         # return to the base directory
         Utility.popd()
-            
\ No newline at end of file
@@ -0,0 +1,209 @@
+import os
+import io
+import json
+
+import config
+from logger import Logger
+from utility import Utility
+
+#Separator line around version header in rendered release notes
+RELEASE_NOTES_SEPARATOR = '-' * 69
+
+class ReleaseNotesStore:
+  """
+    Append-only store of release notes. Each note, and each version assigned to notes that don't have a version yet,
+    is appended as a JSON line to the store. Index with offsets of notes without version and notes of each version
+    is derived from the store: its checkpoint, with store size it covers, is kept next to the store, and records appended
+    after the checkpoint are read when the store is loaded. Checkpoint is saved only when these records outgrow it,
+    so adding notes doesn't rewrite the index. Current note and notes of any version are read by their offsets,
+    without reading the whole store. Release notes text file is rendered from the store only when it is requested.
+  """
+
+  logger = None
+  storePath = None
+  indexPath = None
+  #{'size' : indexed store size, 'pending' : [[offset, length]], 'versions' : {version : [[offset, length]]}, 'order' : [versions]}
+  index = None
+
+  @classmethod
+  def init(cls, notesPath):
+    """
+      Inits logger and loads index of the store next to release notes file. If the store doesn't exist yet,
+      notes from existing release notes file are imported to it.
+      :param notesPath: Path of release notes text file.
+    """
+    cls.logger = Logger.getLogger('ReleaseNotesStore')
+    folder = os.path.dirname(notesPath)
+    cls.storePath = os.path.join(folder, config.RELEASE_NOTES_STORE_FILE)
+    cls.indexPath = os.path.join(folder, config.RELEASE_NOTES_INDEX_FILE)
+
+    if not os.path.isfile(cls.storePath):
+      cls.index = { 'size' : 0, 'pending' : [], 'versions' : dict(), 'order' : [] }
+      if os.path.isfile(notesPath):
+        cls.__import(notesPath)
+      return
+
+    cls.index = None
+    checkpointSize = 0
+    if os.path.isfile(cls.indexPath):
+      try:
+        with open(cls.indexPath, 'r') as indexFile:
+          cls.index = json.load(indexFile)
+        checkpointSize = os.path.getsize(cls.indexPath)
+      except Exception as error:
+        cls.logger.warning('Failed loading release notes index: ' + str(error))
+    #Index is rebuilt if store is replaced by a smaller one
+    if cls.index == None or cls.index['size'] > os.path.getsize(cls.storePath):
+      cls.logger.debug('Rebuilding release notes index.')
+      cls.index = { 'size' : 0, 'pending' : [], 'versions' : dict(), 'order' : [] }
+      checkpointSize = 0
+    indexedSize = cls.index['size']
+    cls.__readRecords()
+    if cls.index['size'] - indexedSize > checkpointSize:
+      cls.__saveIndex()
+
+  @classmethod
+  def addNote(cls, note):
+    """
+      Adds note without version.
+    """
+    cls.index['pending'].append(cls.__append({ 'note' : note.rstrip('\r\n') + '\n' }))
+
+  @classmethod
+  def setVersion(cls, version):
+    """
+      Sets version of notes that don't have a version yet.
+      :return ret: True if version is set, False if there are no notes without version.
+    """
+    if len(cls.index['pending']) == 0:
+      return False
+    cls.__append({ 'version' : version })
+    cls.__addVersion(version, cls.index['pending'])
+    cls.index['pending'] = []
+    return True
+
+  @classmethod
+  def getCurrentNote(cls):
+    """
+      Returns notes without version, the latest first, or empty string if there are no such notes.
+    """
+    return cls.__readNotes(cls.index['pending'])
+
+  @classmethod
+  def getNote(cls, version):
+    """
+      Returns notes of specified version, or empty string if there are no notes of that version.
+    """
+    return cls.__readNotes(cls.index['versions'].get(version, []))
+
+  @classmethod
+  def render(cls, notesPath):
+    """
+      Writes release notes text file, with notes without version at the top, followed by notes of each version,
+      the latest version first.
+      :param notesPath: Path of release notes text file.
+    """
+    content = cls.getCurrentNote()
+    for version in reversed(cls.index['order']):
+      content += RELEASE_NOTES_SEPARATOR + '\n' + 'Version:   ' + version + '\n' + RELEASE_NOTES_SEPARATOR + '\n'
+      content += cls.getNote(version)
+    #File is written as UTF-8 regardless of locale encoding, with line endings of the platform
+    Utility.writeFileAtomically(notesPath, content.replace('\n', os.linesep).encode('utf-8'), True)
+
+  #---------------------------------- Private methods --------------------------------------------
+  @classmethod
+  def __append(cls, record):
+    """
+      Appends record to the store.
+      :return offset, length: Position of the record in the store.
+    """
+    line = (json.dumps(record) + '\n').encode('utf-8')
+    with open(cls.storePath, 'ab') as store:
+      store.seek(0, os.SEEK_END)
+      offset = store.tell()
+      store.write(line)
+    cls.index['size'] = offset + len(line)
+    return [offset, len(line)]
+
+  @classmethod
+  def __readNotes(cls, positions):
+    """
+      Reads note records at specified positions, and returns their notes, the latest first.
+    """
+    #Store is created when the first note is added
+    if len(positions) == 0 or not os.path.isfile(cls.storePath):
+      return ''
+    notes = []
+    with open(cls.storePath, 'rb') as store:
+      for offset, length in positions:
+        store.seek(offset)
+        notes.append(json.loads(store.read(length).decode('utf-8'))['note'])
+    return ''.join(reversed(notes))
+
+  @classmethod
+  def __addVersion(cls, version, positions):
+    """
+      Adds notes at specified positions to notes of version.
+    """
+    if version not in cls.index['versions']:
+      cls.index['versions'][version] = []
+      cls.index['order'].append(version)
+    cls.index['versions'][version] += positions
+
+  @classmethod
+  def __saveIndex(cls):
+    Utility.writeFileAtomically(cls.indexPath, json.dumps(cls.index))
+
+  @classmethod
+  def __readRecords(cls):
+    """
+      Adds records appended to the store after indexed size to the index.
+    """
+    offset = cls.index['size']
+    with open(cls.storePath, 'rb') as store:
+      store.seek(offset)
+      for line in store:
+        #Incomplete last record of interrupted append is ignored
+        if not line.endswith(b'\n'):
+          break
+        record = json.loads(line.decode('utf-8'))
+        if 'note' in record:
+          cls.index['pending'].append([offset, len(line)])
+        elif 'version' in record:
+          cls.__addVersion(record['version'], cls.index['pending'])
+          cls.index['pending'] = []
+        offset += len(line)
+    cls.index['size'] = offset
+
+  @classmethod
+  def __import(cls, notesPath):
+    """
+      Imports notes from release notes text file, the oldest version first.
+    """
+    with io.open(notesPath, 'r', encoding='utf-8') as notesFile:
+      lines = notesFile.readlines()
+
+    #Text before the first separator is note without version, followed by separator, version, separator and notes of that version
+    current = ''
+    versions = []
+    index = 0
+    while index < len(lines) and not lines[index].startswith('-' * 40):
+      current += lines[index]
+      index += 1
+    while index < len(lines):
+      version = lines[index + 1].replace('Version:', '').strip() if index + 1 < len(lines) else ''
+      index += 3
+      note = ''
+      while index < len(lines) and not lines[index].startswith('-' * 40):
+        note += lines[index]
+        index += 1
+      versions.append((version, note))
+
+    for version, note in reversed(versions):
+      if note.strip() != '' and version != '':
+        cls.addNote(note)
+        cls.setVersion(version)
+    if current.strip() != '':
+      cls.addNote(current)
+    cls.__saveIndex()
+    cls.logger.info('Imported ' + str(len(versions)) + ' versions of release notes from ' + notesPath)
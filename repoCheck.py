@@ -95,7 +95,7 @@ def main():
     print('Cloning into ' + destinationPath + '  ...')
     #Change current working folder to one just created and clone repo in it
     os.chdir(destinationPath)
-    result = Utility.executeCommand('git clone --recursive ' + gitRepo + ' -b ' + gitBranch + ' .')
+    result = Utility.executeCommand(Utility.getToolCommand('git') + ' clone --recursive ' + gitRepo + ' -b ' + gitBranch + ' .')
     
     if result != 'error':
       #If repo is successfully cloned, run script for building webrtc libs. Log  will be saved in repoCheckLog_folder_name.txt
@@ -6,19 +6,11 @@ from inputHandler import Input
 from system import System
 from settings import Settings
 from logger import Logger,ColoredFormatter
-from prepare import Preparation
-from builder import Builder
-from cleanup import Cleanup
-from createNuget import CreateNuget
 from nugetUtility import NugetUtility
-from publishNuget import PublishNuget
-from releaseNotes import ReleaseNotes
-from uploadBackup import UploadBackup
-from updateSample import UpdateSample
-from unitTestRunner import UnitTestRunner
+from actionRegistry import ActionRegistry
+from trash import Trash
 from errors import NO_ERROR, ERROR_TARGET_NOT_SUPPORTED, ERROR_PLATFORM_NOT_SUPPORTED, TERMINATED_BY_USER, ERROR_BUILD_FAILED
 from summary import Summary
-from backup import Backup
 from consts import *
 
 def actionClean():
@@ -32,7 +24,7 @@ def actionClean():
   Cleanup.init()
 
   for action in Settings.cleanupOptions['actions']:
-    if action == 'cleanOutput':
+    if action.lower() in ('cleanoutput', 'cleanstale'):
       for target in Settings.cleanupOptions['targets']:
         for platform in Settings.cleanupOptions['platforms']:
           for cpu in Settings.cleanupOptions['cpus']:
@@ -57,6 +49,25 @@ def actionCreateUserdef():
     #Terminate script execution if stopExecutionOnError is set to True in userdef
     shouldEndOnError(result)
 
+def actionFreeDiskSpace():
+  """
+    Deletes least recently used output folders of combinations that are not part of this run, if there is not enough free disk space.
+  """
+  Cleanup.init()
+
+  combinations = []
+  for target in Settings.targets:
+    for platform in Settings.targetPlatforms:
+      for cpu in Settings.targetCPUs:
+        if System.checkIfCPUIsSupportedForPlatform(cpu,platform):
+          for configuration in Settings.targetConfigurations:
+            combinations.append((target, platform, cpu, configuration))
+
+  result = Cleanup.freeDiskSpace(combinations)
+  if result != NO_ERROR:
+    #Terminate script execution if stopExecutionOnError is set to True in userdef
+    shouldEndOnError(result)
+
 def actionPrepare():
   """
     Prepare dev environment for all specified targets and platforms.
@@ -81,6 +92,7 @@ def actionPrepare():
               #Terminate script execution if stopExecutionOnError is set to True in userdef
               shouldEndOnError(result)
             else:
+              Cleanup.markOutputUsed(target, platform, cpu, configuration)
               Logger.printEndActionMessage('Prepare '  + target + ' ' + platform + ' ' + cpu + ' ' + configuration)
 
 def actionBuild():
@@ -91,9 +103,14 @@ def actionBuild():
   #Init builder logger
   Builder.init()
 
+  #Wrapper builds started in background (target, platform, list of (cpu, configuration), async result)
+  wrapperBuilds = []
+
   for target in Settings.targets:
     targetsToBuild, combineLibs, copyToOutput = Builder.getTargetGnPath(target)
     for platform in Settings.targetPlatforms:
+      #Combinations with successfully built native libraries, that will be used for building wrapper projects
+      builtCombinations = []
       for cpu in Settings.targetCPUs:
         if System.checkIfCPUIsSupportedForPlatform(cpu,platform):
           for configuration in Settings.targetConfigurations:
@@ -106,11 +123,28 @@ def actionBuild():
                   #Terminate script execution if stopExecutionOnError is set to True in userdef
                   shouldEndOnError(result)
               else:
+                builtCombinations.append((cpu, configuration))
+                Cleanup.markOutputUsed(target, platform, cpu, configuration)
                 Logger.printEndActionMessage('Build ' + target + ' ' + platform + ' ' + cpu + ' ' + configuration)
             else:
               Logger.printColorMessage('Build cannot run because preparation has failed for ' + target + ' ' + platform + ' ' + cpu + ' ' + configuration,ColoredFormatter.YELLOW)
               Logger.printEndActionMessage('Build not run for ' + target + ' ' + platform + ' ' + cpu + ' ' + configuration,ColoredFormatter.YELLOW)
 
+      #Native libraries for this target and platform are ready. Build all wrapper combinations while the next native build runs.
+      if Settings.buildWrapper and len(builtCombinations) > 0:
+        wrapperBuilds.append((target, platform, builtCombinations, Builder.startWrapperBuild(target, platform, builtCombinations)))
+
+  for target, platform, combinations, wrapperBuild in wrapperBuilds:
+    result, executionTime = wrapperBuild.get()
+    for cpu, configuration in combinations:
+      Summary.updateSummary(ACTION_BUILD, target, platform, cpu, configuration, result, executionTime)
+    if result != NO_ERROR:
+      Logger.printEndActionMessage('Failed building ' + target + ' ' + platform + ' wrapper projects',ColoredFormatter.RED)
+      #Terminate script execution if stopExecutionOnError is set to True in userdef
+      shouldEndOnError(result)
+    else:
+      Logger.printEndActionMessage('Build ' + target + ' ' + platform + ' wrapper projects')
+
 def actionBackup():
   """
     Backups the latest build.
@@ -124,6 +158,9 @@ def actionBackup():
             if not Summary.checkIfActionFailed(ACTION_BUILD, target, platform, cpu, configuration):
               Backup.run(target, platform, cpu, configuration)
 
+  #Delete backups that don't satisfy retention rules
+  Backup.prune()
+
 def actionCreateNuget():
   CreateNuget.init()
 
@@ -174,10 +211,11 @@ def actionReleaseNotes():
     Logger.printEndActionMessage('Release notes not run' ,ColoredFormatter.YELLOW)
 
 def actionSetNugetKey():
-  PublishNuget.set_api_key(Settings.nugetAPIKey)
+  NugetUtility.set_api_key(Settings.nugetAPIKey, Settings.nugetServerURL)
 
 def actionUploadBackup():
-  need_to_run_backup = UploadBackup.checkBackup()
+  #Outputs are uploaded directly if uploadBackupFromOutput is set, so backup folder is not needed
+  need_to_run_backup = not Settings.uploadBackupFromOutput and UploadBackup.checkBackup()
   if need_to_run_backup is True:
     actionBackup()
   Logger.printStartActionMessage("Upload Backup")
@@ -189,6 +227,16 @@ def actionUploadBackup():
   else:
       Logger.printEndActionMessage('Backup uploaded')
 
+def actionRestoreBackup():
+  Logger.printStartActionMessage("Restore Backup")
+  result = UploadBackup.restore()
+  if result != NO_ERROR:
+      Logger.printEndActionMessage('Failed to restore backup')
+      #Terminate script execution if stopExecutionOnError is set to True in userdef
+      shouldEndOnError(result)
+  else:
+      Logger.printEndActionMessage('Backup restored')
+
 def actionUpdatePublishedSample():
   UpdateSample.init()
   if not Summary.checkIfCreateNugetFailed('webrtc', 'winuwp'):
@@ -224,6 +272,20 @@ def actionRunUnitTests():
               Logger.printEndActionMessage('Executed all unit tests')
 
 
+def loadActions():
+  """
+    Imports modules only for selected actions and makes their classes available to action functions.
+  """
+  actionsToLoad = list(Settings.actions)
+  if Settings.runSetNugetKey:
+    actionsToLoad.append(ACTION_SET_NUGET_KEY)
+  if Settings.setservernoteversion:
+    actionsToLoad.append(ACTION_SET_SERVER_NOTE_VERSION)
+  if Settings.renderReleaseNotes:
+    actionsToLoad.append(ACTION_RENDER_RELEASE_NOTES)
+
+  globals().update(ActionRegistry.load(actionsToLoad, Settings.timingStartup))
+
 def shouldEndOnError(error):
   """
     Terminates script execution if stopExecutionOnError is set to True in userdef 
@@ -273,6 +335,13 @@ def main():
     #Create root logger
     mainLogger = Logger.getLogger('Main')
     mainLogger.info('Root logger is created')
+
+    #Import modules required for selected actions
+    loadActions()
+
+    #Continue deleting folders left in trash by previous runs
+    Trash.init()
+    Trash.emptyTrash(Settings.webrtcPath)
     
     #Check if required tools are installed. Currently git (used for downloading iOS binaries) and perl(used in assembly builds)
     errorCode = System.checkTools()
@@ -293,7 +362,7 @@ def main():
     #Start performing actions. Actions has to be executed in right order and that is the reason why it is handled this way
 
     #If uploadbackup is selected start the authentication process first, because user action is required.
-    if ACTION_UPLOAD_BACKUP in Settings.actions:
+    if ACTION_UPLOAD_BACKUP in Settings.actions or ACTION_RESTORE_BACKUP in Settings.actions:
       UploadBackup.init()
     
     if ACTION_CLEAN in Settings.actions:
@@ -302,6 +371,10 @@ def main():
     if ACTION_CREATE_USERDEF in Settings.actions:
       actionCreateUserdef()
 
+    #Make sure there is enough disk space before prepare and build
+    if ACTION_PREPARE in Settings.actions or ACTION_BUILD in Settings.actions:
+      actionFreeDiskSpace()
+
     if ACTION_PREPARE in Settings.actions:
       actionPrepare()
 
@@ -320,6 +393,9 @@ def main():
     if ACTION_UPLOAD_BACKUP in Settings.actions:
       actionUploadBackup()
 
+    if ACTION_RESTORE_BACKUP in Settings.actions:
+      actionRestoreBackup()
+
     if Settings.runSetNugetKey is True:
       actionSetNugetKey()
       
@@ -341,6 +417,12 @@ def main():
 
   if Settings.setservernoteversion is True:
     ReleaseNotes.set_note_version_server()
+
+  if Settings.renderReleaseNotes is True:
+    ReleaseNotes.render_notes()
+
+  #Wait for folders moved to trash to be deleted
+  Trash.wait()
     
   end_time = time.time()
   Summary.printSummary(end_time - start_time)
@@ -149,16 +149,29 @@ class Settings:
     cls.nugetFolderPath = nugetFolderPath
     cls.nugetVersionInfo = nugetVersionInfo
     cls.manualNugetVersionNumber = manualNugetVersionNumber
+    cls.createSymbolsPackage = createSymbolsPackage
     cls.nugetPackagesToPublish = nugetPackagesToPublish
     cls.releaseNotePath = releaseNotePath
     cls.nugetAPIKey = nugetAPIKey
     cls.nugetServerURL = nugetServerURL
     cls.updateSampleInfo = updateSampleInfo
 
+    cls.uploadBackend = uploadBackend
+    cls.uploadBackupURL = uploadBackupURL
+    cls.uploadDeduplicated = uploadDeduplicated
+    #If true, local index of uploaded content is refreshed from upload destination
+    cls.refreshUploadIndex = cls.inputArgs.refreshUploadIndex
+    #Name of uploaded backup to restore. If empty, the latest one is restored
+    cls.restoreBackupName = cls.inputArgs.restoreBackupName if cls.inputArgs.restoreBackupName else ''
     # If url is passed like input argument use that url instead of the one from userdef
     if cls.inputArgs.uploadBackupURL:
       cls.uploadBackupURL = cls.inputArgs.uploadBackupURL
     
+    #If true, uploadbackup archives build outputs directly instead of the latest backup folder
+    cls.uploadBackupFromOutput = uploadBackupFromOutput or cls.inputArgs.uploadBackupFromOutput
+
+    cls.backupArchiveCompression = backupArchiveCompression
+
     # If true API key is set for nuget.org server
     cls.runSetNugetKey = False
     if cls.inputArgs.setnugetkey:
@@ -168,16 +181,26 @@ class Settings:
     if cls.inputArgs.cmdPrerelease:
       cls.nugetVersionInfo['prerelease'] = cls.inputArgs.cmdPrerelease
     
+    #If true, cached NuGet version index is used instead of nuget.org
+    cls.offline = cls.inputArgs.offline
+
+    #If true, NuGet package is created even if its content is the same as content of already created package
+    cls.forceNugetPack = cls.inputArgs.forceNugetPack
+
     # If true sets release note version by geting latest published nuget version from nuget.org
     cls.setservernoteversion = False
     if cls.inputArgs.setservernoteversion:
       cls.setservernoteversion = cls.inputArgs.setservernoteversion
 
+    #If true, release notes file is written from release notes store
+    cls.renderReleaseNotes = cls.inputArgs.renderReleaseNotes
+
     cls.msvsPath = msvsPath
 
     cls.enabledBackup = enabledBackup
     cls.libsBackupPath = libsBackupPath
     cls.overwriteBackup = overwriteBackup
+    cls.backupRetention = backupRetention
 
     #This value will be set during VS path check
     cls.msvcToolsPath = ''
@@ -220,6 +243,10 @@ class Settings:
       cls.unitTestsToRun = list(unitTests)
 
     cls.unitTests = unitTests
+
+    cls.diskBudgetFreeSpaceGB = diskBudgetFreeSpaceGB
+
+    cls.timingStartup = cls.inputArgs.timingStartup
     
   @classmethod
   def getGnOutputPath(cls, path, target, platform, cpu, configuration):
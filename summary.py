@@ -20,6 +20,21 @@ class Summary:
 
     cls.action_results[action] = resultActionDict
 
+  @classmethod
+  def updateSummary(cls, action, target, platform, cpu, configuration, result, additionalTime = 0):
+    """
+      Adds time of an additional step to existing summary and marks it failed if the step failed.
+    """
+    key = target + '___' + platform + '___' + cpu + '___' + configuration
+
+    resultDict = cls.action_results.get(action,dict()).get(key,None)
+    if resultDict == None:
+      cls.addSummary(action, target, platform, cpu, configuration, result, additionalTime)
+    else:
+      if result != NO_ERROR:
+        resultDict['result'] = result
+      resultDict['time'] += additionalTime
+
   @classmethod
   def addNugetSummary(cls, target, platform, result, time = 0):
     key = target + '___' + platform
@@ -17,7 +17,7 @@ from settings import Settings
 from logger import Logger, ColoredFormatter
 import errors
 from errors import error_codes, NO_ERROR
-from helper import convertToPlatformPath, getCPUFamily
+from helper import convertToPlatformPath, getCPUFamily, iterateDict
 from consts import MAX_SDK_ROOT_PATH_LENGTH
 
 class System:
@@ -88,6 +88,10 @@ class System:
       #Determine Visual Studio and MSVC tools paths
       cls.__determineVisualStudioPath()
 
+    #Resolve and cache paths of used tools, once the PATH is set
+    for toolName, toolPath in iterateDict(Utility.resolveTools(config.TOOLS_TO_RESOLVE)):
+      cls.logger.debug('Tool ' + toolName + ' path is ' + str(toolPath))
+
     #Install missing python packages
     cls.installPythonModules(config.PYTHON_PACKAGES_TO_INSTALL)
 
@@ -102,7 +106,7 @@ class System:
       TODO: Check when it is best to call it
     """
     #Update pip tool.
-    cmd = 'python.exe -m pip install --upgrade pip'
+    cmd = Utility.getToolCommand('python') + ' -m pip install --upgrade pip'
     result = Utility.runSubprocess([cmd])
     if result != 0:
       cls.logger.error('Failed to update pip!')
@@ -119,7 +123,7 @@ class System:
         globals().update(import_module(module).__dict__)
       except:
          #Install python package
-        cmd = 'pip install ' + modulesDict[module]
+        cmd = Utility.getToolCommand('python') + ' -m pip install ' + modulesDict[module]
         result = Utility.runSubprocess([cmd], Settings.logLevel == 'DEBUG')
         if result != 0:
           cls.logger.error('Failed to install package ' + modulesDict[module] + ' required for module ' + module)
@@ -362,7 +366,7 @@ class System:
     #Run download
     flag = '-d' if isDirectory else '-s'
     modifier = '-r' if shouldRecurse else ''
-    cmd = 'python download_from_google_storage.py --bucket ' + bucket + ' ' + flag + ' ' + path + ' ' + modifier
+    cmd = Utility.getToolCommand('python') + ' download_from_google_storage.py --bucket ' + bucket + ' ' + flag + ' ' + path + ' ' + modifier
 
     result = Utility.runSubprocess([cmd], Settings.logLevel == 'DEBUG')
 
@@ -506,7 +510,7 @@ class System:
       #Update environment variable with DEPOT_TOOLS_WIN_TOOLCHAIN set to 0, to prevent requiring https://chrome-internal.googlesource.com
       my_env["DEPOT_TOOLS_WIN_TOOLCHAIN"] = "0"
       #Run clangg update script
-      cmd = 'python ' + clangUpdateScriptPath
+      cmd = Utility.getToolCommand('python') + ' ' + clangUpdateScriptPath
       result = Utility.runSubprocess([cmd], Settings.logLevel == 'DEBUG', my_env)
       #result = subprocess.call(['python', clangUpdateScriptPath], env=my_env)
       if result == NO_ERROR:
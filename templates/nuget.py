@@ -16,6 +16,10 @@ nugetVersionInfo = {
 #Imput NuGet package version number manualy, used if selected version number does not exist on nuget.org, E.g., '1.66.0.3-Alpha'
 manualNugetVersionNumber = ''
 
+#If True, symbols package (.snupkg) with pdb files of the packaged dlls is created together with NuGet package.
+#Pdb files of native dlls are Windows pdbs, which nuget.org doesn't accept, so symbols package is only for private symbol servers
+createSymbolsPackage = False
+
 #Path to a release notes file
 releaseNotePath = 'releases.txt'
 
@@ -0,0 +1,39 @@
+"""
+  Measures how long NugetVersionIndex.getLatestVersions takes for a large list of synthetic package versions.
+  Usage: python tests/benchmark_nugetVersionIndex.py [number of versions]
+"""
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nugetVersionIndex import NugetVersionIndex
+
+def generateVersions(count):
+  """
+    Generates distinct three and four part versions, some of them prerelease, in random order.
+  """
+  random.seed(count)
+  versions = set()
+  while len(versions) < count:
+    minor = random.randint(41, 80)
+    if random.random() < 0.5:
+      version = '%d.%d.%d.%d' % (random.randint(1, 2), minor, random.randint(0, 3), random.randint(0, count))
+    else:
+      version = '%d.%d.%d' % (random.randint(1, 2), minor, random.randint(0, count))
+    if random.random() < 0.3:
+      version += random.choice(['-Alpha', '-Beta'])
+    versions.add(version)
+  versions = list(versions)
+  random.shuffle(versions)
+  return versions
+
+if __name__ == '__main__':
+  count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+  versions = generateVersions(count)
+  start = time.time()
+  latestVersions = NugetVersionIndex.getLatestVersions(versions, 40)
+  elapsed = time.time() - start
+  print('%d versions, %d minor numbers: %.3f s' % (count, len(latestVersions), elapsed))
@@ -0,0 +1,69 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from settings import Settings
+from logger import Logger
+from backup import Backup
+from backupStore import BackupStore
+from errors import NO_ERROR
+
+class BackupTest(unittest.TestCase):
+  """
+    Checks that stored files of replaced backups are deleted from content store.
+  """
+
+  @classmethod
+  def setUpClass(cls):
+    Settings.logLevel = 'CRITICAL'
+    Logger.setUp('%(name)s: %(message)s', True)
+
+  def setUp(self):
+    self.folder = tempfile.mkdtemp()
+    self.outputPath = os.path.join(self.folder, 'output')
+    self.originalSettings = dict((name, getattr(Settings, name, None)) for name in
+                                 ['userWorkingPath', 'libsBackupPath', 'buildWrapper', 'overwriteBackup', 'backupRetention'])
+    Settings.userWorkingPath = self.folder
+    Settings.buildWrapper = False
+    Settings.overwriteBackup = True
+    Settings.backupRetention = { 'keepLast' : 0, 'keepDaily' : 0, 'keepWeekly' : 0, 'maxTotalGB' : 0 }
+    self.originalGetOutputPaths = Backup.getOutputPaths
+    Backup.getOutputPaths = staticmethod(lambda target, platform, cpu, configuration: (self.outputPath, ''))
+
+  def tearDown(self):
+    Backup.getOutputPaths = self.originalGetOutputPaths
+    for name, value in self.originalSettings.items():
+      setattr(Settings, name, value)
+    shutil.rmtree(self.folder)
+
+  def backup(self, backupFolder, content):
+    if os.path.isdir(self.outputPath):
+      shutil.rmtree(self.outputPath)
+    os.makedirs(self.outputPath)
+    for name, fileContent in [('Org.WebRtc.dll', content), ('Org.WebRtc.winmd', 'winmd')]:
+      with open(os.path.join(self.outputPath, name), 'w') as outputFile:
+        outputFile.write(fileContent)
+    Settings.libsBackupPath = backupFolder
+    self.assertEqual(Backup.init(), NO_ERROR)
+    self.assertEqual(Backup.run('webrtc', 'win', 'x64', 'Release'), NO_ERROR)
+    self.assertEqual(Backup.prune(), NO_ERROR)
+    return Backup.getBackupHashes(backupFolder)
+
+  def test_overwritten_backup_files_are_deleted_without_retention(self):
+    oldHashes = self.backup('Backup', 'old')
+    otherHashes = self.backup('Other', 'other')
+    newHashes = self.backup('Backup', 'new')
+
+    self.assertEqual(len(oldHashes - newHashes - otherHashes), 1)
+    for fileHash in oldHashes | newHashes | otherHashes:
+      self.assertEqual(os.path.isfile(BackupStore.getObjectPath(fileHash)), fileHash in newHashes | otherHashes)
+    index = Backup.loadIndex()
+    self.assertEqual(sorted(index['backups']), ['Backup', 'Other'])
+    self.assertEqual(index['latest'], 'Backup')
+
+if __name__ == '__main__':
+  unittest.main()
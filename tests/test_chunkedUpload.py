@@ -0,0 +1,178 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+try:
+  from http.server import HTTPServer, BaseHTTPRequestHandler
+  from urllib.error import HTTPError
+except ImportError:
+  from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+  from urllib2 import HTTPError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from settings import Settings
+from logger import Logger
+from utility import Utility
+from chunkedUpload import ChunkedUpload, LocalDirectoryBackend, OneDriveBackend
+from errors import NO_ERROR, ERROR_UPLOAD_BACKUP_FAILED
+
+class SessionHandler(BaseHTTPRequestHandler):
+  """
+    Stand-in for OneDrive upload sessions, which accept chunks only in order. Chunk uploads listed in server failures
+    are answered with listed statuses first, and sessions listed in server expired don't exist anymore.
+  """
+
+  def log_message(self, *args):
+    pass
+
+  def reply(self, status, document = None):
+    body = json.dumps(document).encode('utf-8') if document != None else b''
+    self.send_response(status)
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def do_POST(self):
+    self.rfile.read(int(self.headers['Content-Length']))
+    name = self.path.split(':/')[1]
+    sessionPath = '/session/' + str(len(self.server.sessions))
+    self.server.sessions[sessionPath] = { 'name' : name, 'data' : b'' }
+    self.reply(200, { 'uploadUrl' : 'http://127.0.0.1:' + str(self.server.server_port) + sessionPath,
+                      'expirationDateTime' : self.server.expiration })
+
+  def do_GET(self):
+    session = self.server.sessions.get(self.path)
+    if session == None or self.path in self.server.expired:
+      return self.reply(404)
+    self.reply(200, { 'nextExpectedRanges' : [str(len(session['data'])) + '-'] })
+
+  def do_PUT(self):
+    data = self.rfile.read(int(self.headers['Content-Length']))
+    session = self.server.sessions.get(self.path)
+    if session == None or self.path in self.server.expired:
+      return self.reply(404)
+    if len(self.server.failures) > 0:
+      return self.reply(self.server.failures.pop(0))
+    contentRange, size = self.headers['Content-Range'].split(' ')[1].split('/')
+    if int(contentRange.split('-')[0]) != len(session['data']):
+      return self.reply(416)
+    session['data'] += data
+    if len(session['data']) < int(size):
+      return self.reply(202, { 'nextExpectedRanges' : [str(len(session['data'])) + '-'] })
+    self.server.files[session['name']] = session['data']
+    del self.server.sessions[self.path]
+    self.reply(201, { 'name' : session['name'] })
+
+class ExpiringLocalBackend(LocalDirectoryBackend):
+  """
+    Local destination that doesn't accept chunks for the first session.
+  """
+
+  def startSession(self, remoteName, size):
+    session = LocalDirectoryBackend.startSession(self, remoteName, size)
+    self.sessionsCount = getattr(self, 'sessionsCount', 0) + 1
+    session['number'] = self.sessionsCount
+    return session
+
+  def uploadChunk(self, session, offset, data, checksum, size):
+    if session['number'] == 1:
+      raise HTTPError('local', 410, 'Gone', None, None)
+    LocalDirectoryBackend.uploadChunk(self, session, offset, data, checksum, size)
+
+class ChunkedUploadTest(unittest.TestCase):
+  """
+    Checks that interrupted uploads are resumed from chunks that destination has, and that upload starts again
+    with new session when the old one doesn't exist anymore.
+  """
+
+  @classmethod
+  def setUpClass(cls):
+    Settings.logLevel = 'CRITICAL'
+    Logger.setUp('%(name)s: %(message)s', True)
+    Utility.logger = Logger.getLogger('Utility')
+    ChunkedUpload.init()
+
+  def setUp(self):
+    self.server = HTTPServer(('127.0.0.1', 0), SessionHandler)
+    self.server.sessions = dict()
+    self.server.expired = []
+    self.server.failures = []
+    self.server.files = dict()
+    self.server.expiration = '2100-01-01T00:00:00.000Z'
+    self.serverThread = threading.Thread(target=self.server.serve_forever)
+    self.serverThread.start()
+    self.originalApiUrl = config.ONEDRIVE_API_URL
+    self.originalChunkSize = config.UPLOAD_CHUNK_SIZE
+    config.ONEDRIVE_API_URL = 'http://127.0.0.1:' + str(self.server.server_port)
+    config.UPLOAD_CHUNK_SIZE = OneDriveBackend.chunkSizeMultiple
+    self.folder = tempfile.mkdtemp()
+    self.filePath = os.path.join(self.folder, 'Backup.zip')
+    with open(self.filePath, 'wb') as uploadedFile:
+      uploadedFile.write(os.urandom(config.UPLOAD_CHUNK_SIZE * 3 + 1000))
+    self.backend = OneDriveBackend('WebRTC', 'token')
+
+  def tearDown(self):
+    self.server.shutdown()
+    self.serverThread.join()
+    self.server.server_close()
+    config.ONEDRIVE_API_URL = self.originalApiUrl
+    config.UPLOAD_CHUNK_SIZE = self.originalChunkSize
+    shutil.rmtree(self.folder)
+
+  def readFile(self, path):
+    with open(path, 'rb') as readFile:
+      return readFile.read()
+
+  def assertUploaded(self):
+    self.assertEqual(self.server.files['WebRTC/Backup.zip'], self.readFile(self.filePath))
+    self.assertFalse(os.path.exists(self.filePath + config.UPLOAD_JOURNAL_SUFFIX))
+
+  def interruptUpload(self):
+    self.server.failures = [200, 200, 500]
+    self.assertEqual(ChunkedUpload.upload(self.filePath, self.backend), ERROR_UPLOAD_BACKUP_FAILED)
+    self.assertEqual(len(json.loads(self.readFile(self.filePath + config.UPLOAD_JOURNAL_SUFFIX).decode('utf-8'))['checksums']), 2)
+    #Failures answered before chunks are received, so session has none of them
+    session = list(self.server.sessions.values())[0]
+    session['data'] = self.readFile(self.filePath)[:config.UPLOAD_CHUNK_SIZE]
+
+  def test_resume_from_expected_ranges(self):
+    self.interruptUpload()
+    self.assertEqual(ChunkedUpload.upload(self.filePath, self.backend), NO_ERROR)
+    self.assertUploaded()
+    self.assertEqual(len(self.server.sessions), 0)
+
+  def test_expired_session_starts_again(self):
+    self.interruptUpload()
+    self.server.expired.extend(self.server.sessions)
+    self.assertEqual(ChunkedUpload.upload(self.filePath, self.backend), NO_ERROR)
+    self.assertUploaded()
+
+  def test_expired_journal_starts_again(self):
+    self.server.expiration = '2000-01-01T00:00:00.000Z'
+    self.interruptUpload()
+    self.server.expiration = '2100-01-01T00:00:00.000Z'
+    self.assertEqual(ChunkedUpload.upload(self.filePath, self.backend), NO_ERROR)
+    self.assertUploaded()
+    #Old session is not resumed, and the whole file is uploaded with new one
+    self.assertEqual(len(self.server.sessions), 1)
+
+  def test_stream_with_rejected_session_starts_again(self):
+    backend = ExpiringLocalBackend(os.path.join(self.folder, 'destination'))
+    journalPath = os.path.join(self.folder, 'stream' + config.UPLOAD_JOURNAL_SUFFIX)
+    content = self.readFile(self.filePath)
+    def writeContent(stream):
+      for offset in range(0, len(content), 1000):
+        stream.write(content[offset:offset + 1000])
+      return True
+    self.assertEqual(ChunkedUpload.uploadStream(writeContent, backend, 'Backup.zip', 'key', journalPath), NO_ERROR)
+    self.assertEqual(backend.sessionsCount, 2)
+    self.assertEqual(self.readFile(os.path.join(self.folder, 'destination', 'Backup.zip')), content)
+    self.assertFalse(os.path.exists(journalPath))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,167 @@
+import os
+import sys
+import json
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+try:
+  from http.server import HTTPServer, BaseHTTPRequestHandler
+  from socketserver import ThreadingMixIn
+except ImportError:
+  from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+  from SocketServer import ThreadingMixIn
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from settings import Settings
+from logger import Logger
+from nugetPush import NugetPush, PUSHED, ALREADY_EXISTS, FAILED
+from errors import NO_ERROR, ERROR_PUBLISH_NUGET_FAILED
+
+class FeedHandler(BaseHTTPRequestHandler):
+  """
+    Stand-in for NuGet v3 feed, with service index and push endpoints. Pushes of packages listed in server failures
+    are answered with listed statuses first, and packages listed in server existing are answered with 409 Conflict.
+  """
+
+  protocol_version = 'HTTP/1.1'
+
+  def log_message(self, *args):
+    pass
+
+  def setup(self):
+    BaseHTTPRequestHandler.setup(self)
+    with self.server.lock:
+      self.server.sockets.append(self.connection)
+
+  def reply(self, status, body = b''):
+    self.send_response(status)
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def do_GET(self):
+    baseUrl = 'http://127.0.0.1:' + str(self.server.server_port)
+    self.reply(200, json.dumps({ 'resources' : [
+      { '@id' : baseUrl + '/package', '@type' : 'PackagePublish/2.0.0' },
+      { '@id' : baseUrl + '/symbols', '@type' : ['SymbolPackagePublish/4.9.0'] }
+    ] }).encode('utf-8'))
+
+  def do_PUT(self):
+    body = self.rfile.read(int(self.headers['Content-Length']))
+    name = body.split(b'filename="')[1].split(b'"')[0].decode('utf-8')
+    content = body.split(b'\r\n\r\n', 1)[1].rsplit(b'\r\n--', 1)[0]
+    with self.server.lock:
+      self.server.connections.add(self.client_address)
+      if self.headers['X-NuGet-ApiKey'] != 'key':
+        return self.reply(403)
+      failures = self.server.failures.get(name)
+      if failures:
+        return self.reply(failures.pop(0))
+      if name in self.server.existing:
+        return self.reply(409)
+      self.server.pushed[name] = (self.path, content)
+    self.reply(201)
+
+class FeedServer(ThreadingMixIn, HTTPServer):
+  daemon_threads = True
+
+class NugetPushTest(unittest.TestCase):
+  """
+    Checks NuGet push protocol client against local stand-in feed.
+  """
+
+  @classmethod
+  def setUpClass(cls):
+    Settings.logLevel = 'CRITICAL'
+    Logger.setUp('%(name)s: %(message)s', True)
+
+  def setUp(self):
+    self.originalRetryDelay = config.NUGET_PUSH_RETRY_DELAY
+    config.NUGET_PUSH_RETRY_DELAY = 0
+    self.server = FeedServer(('127.0.0.1', 0), FeedHandler)
+    self.server.lock = threading.Lock()
+    self.server.sockets = []
+    self.server.connections = set()
+    self.server.failures = dict()
+    self.server.existing = []
+    self.server.pushed = dict()
+    self.serverThread = threading.Thread(target=self.server.serve_forever)
+    self.serverThread.start()
+    self.folder = tempfile.mkdtemp()
+    self.assertEqual(NugetPush.init('http://127.0.0.1:' + str(self.server.server_port) + '/v3/index.json', 'key'), NO_ERROR)
+
+  def tearDown(self):
+    self.server.shutdown()
+    self.serverThread.join()
+    self.server.server_close()
+    #Connections that client keeps open are closed, so their handler threads end
+    for connection in self.server.sockets:
+      try:
+        connection.shutdown(socket.SHUT_RDWR)
+      except socket.error:
+        pass
+    shutil.rmtree(self.folder)
+    config.NUGET_PUSH_RETRY_DELAY = self.originalRetryDelay
+
+  def createPackage(self, name, size = 1000):
+    packagePath = os.path.join(self.folder, name)
+    with open(packagePath, 'wb') as packageFile:
+      packageFile.write(os.urandom(size))
+    return packagePath
+
+  def test_push_with_retries_and_existing_packages(self):
+    packages = []
+    for number in range(1, 9):
+      packagePath = self.createPackage('webrtc.1.0.0.' + str(number) + '.nupkg', 1000 * number)
+      symbolsPath = self.createPackage('webrtc.1.0.0.' + str(number) + '.snupkg') if number % 2 == 0 else None
+      packages.append((packagePath, symbolsPath))
+    self.server.failures['webrtc.1.0.0.2.nupkg'] = [503, 503]
+    self.server.failures['webrtc.1.0.0.4.nupkg'] = [429]
+    self.server.existing.append('webrtc.1.0.0.3.nupkg')
+
+    ret, results = NugetPush.pushPackages(packages)
+    self.assertEqual(ret, NO_ERROR)
+    self.assertEqual(results[packages[2][0]], ALREADY_EXISTS)
+    self.assertTrue(all(results[packagePath] == PUSHED for packagePath, symbolsPath in packages if packagePath != packages[2][0]))
+    self.assertEqual(len(self.server.pushed), 7 + 4)
+    for packagePath, symbolsPath in packages:
+      name = os.path.basename(packagePath)
+      if name in self.server.pushed:
+        with open(packagePath, 'rb') as packageFile:
+          self.assertEqual(self.server.pushed[name], ('/package', packageFile.read()))
+      if symbolsPath != None:
+        self.assertEqual(self.server.pushed[os.path.basename(symbolsPath)][0], '/symbols')
+    #Connections are reused, at most one for each worker and one more for each failed request that closed it
+    self.assertLessEqual(len(self.server.connections), config.NUGET_PUSH_WORKERS + 3)
+
+  def test_failed_symbols_push_is_not_failure(self):
+    packagePath = self.createPackage('webrtc.1.0.0.1.nupkg')
+    symbolsPath = self.createPackage('webrtc.1.0.0.1.snupkg')
+    self.server.failures['webrtc.1.0.0.1.snupkg'] = [400]
+
+    ret, results = NugetPush.pushPackages([(packagePath, symbolsPath)])
+    self.assertEqual(ret, NO_ERROR)
+    self.assertEqual(results[packagePath], PUSHED)
+    self.assertNotIn('webrtc.1.0.0.1.snupkg', self.server.pushed)
+
+  def test_failed_package_push(self):
+    packagePath = self.createPackage('webrtc.1.0.0.1.nupkg')
+    symbolsPath = self.createPackage('webrtc.1.0.0.1.snupkg')
+    self.server.failures['webrtc.1.0.0.1.nupkg'] = [400]
+
+    ret, results = NugetPush.pushPackages([(packagePath, symbolsPath)])
+    self.assertEqual(ret, ERROR_PUBLISH_NUGET_FAILED)
+    self.assertEqual(results[packagePath], FAILED)
+    self.assertEqual(self.server.pushed, dict())
+
+  def test_invalid_api_key(self):
+    NugetPush.apiKey = 'invalid'
+    ret, results = NugetPush.pushPackages([(self.createPackage('webrtc.1.0.0.1.nupkg'), None)])
+    self.assertEqual(ret, ERROR_PUBLISH_NUGET_FAILED)
+
+if __name__ == '__main__':
+  unittest.main()
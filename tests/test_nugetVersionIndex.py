@@ -0,0 +1,159 @@
+import io
+import os
+import sys
+import gzip
+import json
+import hashlib
+import shutil
+import tempfile
+import threading
+import unittest
+try:
+  from http.server import HTTPServer, BaseHTTPRequestHandler
+except ImportError:
+  from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from settings import Settings
+from logger import Logger
+from utility import Utility
+from nugetVersionIndex import NugetVersionIndex
+from errors import NO_ERROR, ERROR_GET_NUGET_PACKAGE_VERSIONS_FAILED
+
+class RegistrationHandler(BaseHTTPRequestHandler):
+  """
+    Serves registration documents of the server, gzipped and with ETag that changes with document content.
+  """
+
+  def log_message(self, *args):
+    pass
+
+  def do_GET(self):
+    self.server.requests.append((self.path, self.headers.get('If-None-Match')))
+    if self.path not in self.server.documents:
+      self.send_response(404)
+      self.send_header('Content-Length', '0')
+      self.end_headers()
+      return
+    content = json.dumps(self.server.documents[self.path], sort_keys=True).encode('utf-8')
+    etag = '"' + hashlib.sha1(content).hexdigest() + '"'
+    if self.headers.get('If-None-Match') == etag:
+      self.send_response(304)
+      self.end_headers()
+      return
+    buffer = io.BytesIO()
+    gzipFile = gzip.GzipFile(fileobj=buffer, mode='wb')
+    gzipFile.write(content)
+    gzipFile.close()
+    self.send_response(200)
+    self.send_header('Content-Encoding', 'gzip')
+    self.send_header('Content-Length', str(len(buffer.getvalue())))
+    self.send_header('ETag', etag)
+    self.end_headers()
+    self.wfile.write(buffer.getvalue())
+
+class NugetVersionIndexTest(unittest.TestCase):
+  """
+    Checks version index against local stand-in for NuGet registration API, with inlined and paged registration pages.
+  """
+
+  @classmethod
+  def setUpClass(cls):
+    Settings.logLevel = 'CRITICAL'
+    Logger.setUp('%(name)s: %(message)s', True)
+    Utility.logger = Logger.getLogger('Utility')
+    NugetVersionIndex.init()
+
+  def setUp(self):
+    self.server = HTTPServer(('127.0.0.1', 0), RegistrationHandler)
+    self.server.requests = []
+    self.baseUrl = 'http://127.0.0.1:' + str(self.server.server_port) + '/registration/webrtc/'
+    self.server.documents = {
+      '/registration/webrtc/index.json' : { 'items' : [
+        { '@id' : self.baseUrl + 'page0.json', 'items' : [self.leaf('1.0.0'), self.leaf('1.0.1')] },
+        { '@id' : self.baseUrl + 'page1.json', 'count' : 2, 'upper' : '1.71.0.6-Alpha' },
+        { '@id' : self.baseUrl + 'page2.json', 'count' : 1, 'upper' : '1.79.0.1' }
+      ] },
+      '/registration/webrtc/page1.json' : { 'items' : [self.leaf('1.71.0.5'), self.leaf('1.71.0.6-Alpha')] },
+      '/registration/webrtc/page2.json' : { 'items' : [self.leaf('1.79.0.1')] }
+    }
+    self.serverThread = threading.Thread(target=self.server.serve_forever)
+    self.serverThread.start()
+    self.originalBaseUrl = config.NUGET_REGISTRATION_BASE_URL
+    config.NUGET_REGISTRATION_BASE_URL = 'http://127.0.0.1:' + str(self.server.server_port) + '/registration/'
+    self.cacheFolder = tempfile.mkdtemp()
+
+  def tearDown(self):
+    self.stopServer()
+    config.NUGET_REGISTRATION_BASE_URL = self.originalBaseUrl
+    shutil.rmtree(self.cacheFolder)
+
+  def stopServer(self):
+    if self.server != None:
+      self.server.shutdown()
+      self.serverThread.join()
+      self.server.server_close()
+      self.server = None
+
+  @staticmethod
+  def leaf(version):
+    return { 'catalogEntry' : { 'version' : version } }
+
+  def test_paged_registration(self):
+    ret, versions = NugetVersionIndex.getVersions('WebRTC', self.cacheFolder)
+    self.assertEqual(ret, NO_ERROR)
+    self.assertEqual(versions, ['1.0.0', '1.0.1', '1.71.0.5', '1.71.0.6-Alpha', '1.79.0.1'])
+    self.assertEqual(sorted(path for path, etag in self.server.requests),
+                     ['/registration/webrtc/index.json', '/registration/webrtc/page1.json', '/registration/webrtc/page2.json'])
+
+  def test_fresh_cache_is_used_without_requests(self):
+    NugetVersionIndex.getVersions('webrtc', self.cacheFolder)
+    del self.server.requests[:]
+    ret, versions = NugetVersionIndex.getVersions('webrtc', self.cacheFolder)
+    self.assertEqual(ret, NO_ERROR)
+    self.assertEqual(len(versions), 5)
+    self.assertEqual(self.server.requests, [])
+
+  def test_revalidation_with_etag(self):
+    NugetVersionIndex.getVersions('webrtc', self.cacheFolder)
+
+    #Not modified index is revalidated with single request
+    NugetVersionIndex.invalidate('webrtc', self.cacheFolder)
+    del self.server.requests[:]
+    ret, versions = NugetVersionIndex.getVersions('webrtc', self.cacheFolder)
+    self.assertEqual(ret, NO_ERROR)
+    self.assertEqual(len(versions), 5)
+    self.assertEqual(len(self.server.requests), 1)
+    self.assertNotEqual(self.server.requests[0][1], None)
+
+    #When one page changes, its summary in the index changes too, and other pages are revalidated and not downloaded again
+    self.server.documents['/registration/webrtc/page2.json']['items'].append(self.leaf('1.79.0.2'))
+    self.server.documents['/registration/webrtc/index.json']['items'][2].update({ 'count' : 2, 'upper' : '1.79.0.2' })
+    NugetVersionIndex.invalidate('webrtc', self.cacheFolder)
+    del self.server.requests[:]
+    ret, versions = NugetVersionIndex.getVersions('webrtc', self.cacheFolder)
+    self.assertEqual(ret, NO_ERROR)
+    self.assertEqual(versions[-1], '1.79.0.2')
+    self.assertEqual(len(self.server.requests), 3)
+    self.assertTrue(all(etag != None for path, etag in self.server.requests))
+
+  def test_offline(self):
+    ret, versions = NugetVersionIndex.getVersions('webrtc', self.cacheFolder, True)
+    self.assertEqual(ret, ERROR_GET_NUGET_PACKAGE_VERSIONS_FAILED)
+    self.assertEqual(self.server.requests, [])
+
+    NugetVersionIndex.getVersions('webrtc', self.cacheFolder)
+    NugetVersionIndex.invalidate('webrtc', self.cacheFolder)
+    self.stopServer()
+    ret, versions = NugetVersionIndex.getVersions('webrtc', self.cacheFolder, True)
+    self.assertEqual(ret, NO_ERROR)
+    self.assertEqual(len(versions), 5)
+    #Expired cache is used when server can't be reached
+    ret, versions = NugetVersionIndex.getVersions('webrtc', self.cacheFolder)
+    self.assertEqual(ret, NO_ERROR)
+    self.assertEqual(len(versions), 5)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,119 @@
+import os
+import sys
+import shutil
+import zipfile
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from settings import Settings
+from logger import Logger
+from nuspec import Nuspec
+from nupkgWriter import NupkgWriter
+from backupStore import BackupStore
+
+NUSPEC_TEMPLATE = '''<?xml version="1.0"?>
+<package>
+\t<metadata>
+\t\t<id>WebRTC</id>
+\t\t<version>0.0</version>
+\t\t<authors>authors</authors>
+\t\t<description>description</description>
+\t\t<dependencies>
+\t\t\t<dependency id="Win2D.uwp" version="1.20.0" />
+\t\t</dependencies>
+\t</metadata>
+\t<files>
+\t\t<file src="x64\\Release\\Org.WebRtc.winmd" target="lib\\uap10.0" />
+\t\t<file src="x64\\Release\\Org.WebRtc.dll" target="runtimes\\win10-x64\\native" />
+\t\t<file src="build\\**" target="build" exclude="**\\*.tmp" />
+\t</files>
+</package>
+'''
+
+class NupkgWriterTest(unittest.TestCase):
+  """
+    Checks that NuGet packages written by NupkgWriter are byte-identical for the same inputs.
+  """
+
+  @classmethod
+  def setUpClass(cls):
+    Settings.logLevel = 'ERROR'
+    Logger.setUp('%(name)s: %(message)s', True)
+    NupkgWriter.init()
+
+  def setUp(self):
+    self.folder = tempfile.mkdtemp()
+    for path, content in [('x64/Release/Org.WebRtc.winmd', b'winmd'), ('x64/Release/Org.WebRtc.dll', os.urandom(100000)),
+                          ('x64/Release/Org.WebRtc.pdb', b'pdb' * 1000), ('build/native/WebRTC.targets', b'<Project />'),
+                          ('build/native/include/header.h', b'#pragma once'), ('build/native/skipped.tmp', b'tmp')]:
+      filePath = os.path.join(self.folder, path)
+      if not os.path.isdir(os.path.dirname(filePath)):
+        os.makedirs(os.path.dirname(filePath))
+      with open(filePath, 'wb') as packageFile:
+        packageFile.write(content)
+    templatePath = os.path.join(self.folder, 'WebRTC.nuspec')
+    with open(templatePath, 'w') as template:
+      template.write(NUSPEC_TEMPLATE)
+    self.nuspec = Nuspec(templatePath, '1.79.0.1')
+    BackupStore.init(os.path.join(self.folder, 'store'))
+
+  def tearDown(self):
+    shutil.rmtree(self.folder)
+
+  def readFile(self, path):
+    with open(path, 'rb') as readFile:
+      return readFile.read()
+
+  def touchFiles(self):
+    for root, dirs, names in os.walk(self.folder):
+      for name in names:
+        os.utime(os.path.join(root, name), (1000000000, 1000000000))
+
+  def test_repack_is_byte_identical(self):
+    packageFiles = NupkgWriter.getPackageFiles(self.nuspec, self.folder)
+    self.assertEqual(sorted(packageFiles), ['build/native/WebRTC.targets', 'build/native/include/header.h',
+                                            'lib/uap10.0/Org.WebRtc.winmd', 'runtimes/win10-x64/native/Org.WebRtc.dll'])
+
+    firstPath = os.path.join(self.folder, 'first.nupkg')
+    secondPath = os.path.join(self.folder, 'second.nupkg')
+    self.assertTrue(NupkgWriter.write(self.nuspec, packageFiles, firstPath))
+    self.touchFiles()
+    self.assertTrue(NupkgWriter.write(self.nuspec, NupkgWriter.getPackageFiles(self.nuspec, self.folder), secondPath))
+    self.assertEqual(self.readFile(firstPath), self.readFile(secondPath))
+
+    with zipfile.ZipFile(firstPath) as package:
+      self.assertIsNone(package.testzip())
+      names = package.namelist()
+      self.assertEqual(names[0], 'WebRTC.nuspec')
+      self.assertIn('[Content_Types].xml', names)
+      self.assertIn('_rels/.rels', names)
+      self.assertEqual(package.read('runtimes/win10-x64/native/Org.WebRtc.dll'), self.readFile(packageFiles['runtimes/win10-x64/native/Org.WebRtc.dll']))
+      self.assertIn(b'<version>1.79.0.1</version>', package.read('WebRTC.nuspec'))
+
+  def test_symbols_repack_is_byte_identical(self):
+    symbolFiles = { 'runtimes/win10-x64/native/Org.WebRtc.pdb' : os.path.join(self.folder, 'x64', 'Release', 'Org.WebRtc.pdb') }
+    firstPath = os.path.join(self.folder, 'first.snupkg')
+    secondPath = os.path.join(self.folder, 'second.snupkg')
+    self.assertTrue(NupkgWriter.writeSymbols(self.nuspec, symbolFiles, firstPath))
+    self.touchFiles()
+    self.assertTrue(NupkgWriter.writeSymbols(self.nuspec, symbolFiles, secondPath))
+    self.assertEqual(self.readFile(firstPath), self.readFile(secondPath))
+
+    with zipfile.ZipFile(firstPath) as package:
+      manifest = package.read('WebRTC.nuspec')
+      self.assertIn(b'<packageType name="SymbolsPackage" />', manifest)
+      self.assertNotIn(b'dependencies', manifest)
+
+  def test_content_key_ignores_version(self):
+    packageFiles = NupkgWriter.getPackageFiles(self.nuspec, self.folder)
+    contentKey = NupkgWriter.getContentKey(self.nuspec, packageFiles)
+    self.nuspec.setVersion('1.79.0.2')
+    self.assertEqual(NupkgWriter.getContentKey(self.nuspec, packageFiles), contentKey)
+    with open(os.path.join(self.folder, 'build', 'native', 'include', 'header.h'), 'ab') as changedFile:
+      changedFile.write(b'\n')
+    self.assertNotEqual(NupkgWriter.getContentKey(self.nuspec, packageFiles), contentKey)
+
+if __name__ == '__main__':
+  unittest.main()
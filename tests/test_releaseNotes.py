@@ -0,0 +1,49 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from settings import Settings
+from logger import Logger
+from releaseNotes import ReleaseNotes
+from releaseNotesStore import ReleaseNotesStore, RELEASE_NOTES_SEPARATOR
+
+class ReleaseNotesTest(unittest.TestCase):
+  """
+    Checks reading release notes from the store, when there are no notes to read.
+  """
+
+  @classmethod
+  def setUpClass(cls):
+    Settings.logLevel = 'CRITICAL'
+    Logger.setUp('%(name)s: %(message)s', True)
+
+  def setUp(self):
+    self.folder = tempfile.mkdtemp()
+    self.notesPath = os.path.join(self.folder, 'releases.txt')
+
+  def tearDown(self):
+    shutil.rmtree(self.folder)
+
+  def test_get_note_in_empty_folder(self):
+    self.assertEqual(ReleaseNotes.get_note(self.notesPath), False)
+    self.assertEqual(ReleaseNotesStore.getNote('1.71.0.1'), '')
+
+  def writeNotes(self, content):
+    with open(self.notesPath, 'w') as notesFile:
+      notesFile.write(content)
+
+  def test_get_note_without_importable_notes(self):
+    self.writeNotes(RELEASE_NOTES_SEPARATOR + '\nVersion:   1.71.0.1\n' + RELEASE_NOTES_SEPARATOR + '\n')
+    self.assertEqual(ReleaseNotes.get_note(self.notesPath), False)
+
+  def test_get_note_with_only_versioned_notes(self):
+    self.writeNotes(RELEASE_NOTES_SEPARATOR + '\nVersion:   1.71.0.1\n' + RELEASE_NOTES_SEPARATOR + '\nnote one\n')
+    self.assertEqual(ReleaseNotes.get_note(self.notesPath), False)
+    self.assertEqual(ReleaseNotesStore.getNote('1.71.0.1'), 'note one\n')
+
+if __name__ == '__main__':
+  unittest.main()
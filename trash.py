@@ -0,0 +1,166 @@
+import os
+import stat
+import shutil
+from datetime import datetime
+from multiprocessing.pool import ThreadPool
+
+import config
+from logger import Logger
+from helper import convertToPlatformPath
+
+class Trash:
+  """
+    Deletes big folders in background. Folders are first renamed to the trash folder
+    (.trash/<timestamp>), on the same volume, and then deleted by worker pool while other actions run.
+  """
+
+  logger = None
+  pool = None
+  #Deletions scheduled in worker pool {trash_path : list of async results}
+  pendingDeletions = dict()
+
+  @classmethod
+  def init(cls):
+    """
+      Inits logger.
+    """
+    cls.logger = Logger.getLogger('Trash')
+
+  @classmethod
+  def getTrashPath(cls, rootPath):
+    """
+      Returns trash folder path for specified root folder.
+      :param rootPath: Folder on the same volume as folders that will be moved to trash.
+      :return trashPath: Trash folder path.
+    """
+    return os.path.join(rootPath, config.TRASH_FOLDER_NAME)
+
+  @classmethod
+  def moveFoldersToTrash(cls, foldersList, rootPath):
+    """
+      Renames folders to the trash folder and schedules their deletion in background.
+      :param foldersList: List of folders to delete.
+      :param rootPath: Root folder where trash folder is created. It has to be on the same volume as folders to delete.
+      :return ret, tombstonePath: True if all folders are moved to trash, or deleted if rename is not possible,
+                                  and trash folder to pass to wait, or None if no folder is moved to trash.
+    """
+    ret = True
+    tombstonePath = os.path.join(cls.getTrashPath(rootPath), datetime.now().strftime('%Y-%m-%d_%H-%M-%S-%f'))
+
+    for path in foldersList:
+      dirPath = os.path.abspath(convertToPlatformPath(path))
+      if not os.path.exists(dirPath):
+        cls.logger.warning(dirPath + ' folder doesn\'t exist.')
+        continue
+      try:
+        if not os.path.exists(tombstonePath):
+          os.makedirs(tombstonePath)
+        #Keep relative path in tombstone name, so folders with the same name don't collide
+        tombstoneName = os.path.relpath(dirPath, os.path.abspath(rootPath)).replace(os.sep, '_').replace('.', '_')
+        os.rename(dirPath, os.path.join(tombstonePath, tombstoneName))
+        cls.logger.debug('Moved ' + dirPath + ' to trash ' + tombstonePath)
+      except Exception as error:
+        #Folder is on another volume or it is in use. Delete it in place.
+        cls.logger.warning('Failed moving ' + dirPath + ' to trash (' + str(error) + '). It will be deleted now.')
+        try:
+          shutil.rmtree(dirPath, onerror=cls.__onDeleteError)
+        except Exception as error:
+          cls.logger.error(str(error))
+          ret = False
+
+    if not os.path.exists(tombstonePath):
+      return ret, None
+
+    cls.scheduleDeletion(tombstonePath)
+    return ret, tombstonePath
+
+  @classmethod
+  def emptyTrash(cls, rootPath):
+    """
+      Schedules deletion of folders left in the trash by previous runs.
+      :param rootPath: Root folder that contains trash folder.
+    """
+    trashPath = cls.getTrashPath(rootPath)
+    if os.path.isdir(trashPath):
+      for tombstone in os.listdir(trashPath):
+        tombstonePath = os.path.join(trashPath, tombstone)
+        if tombstonePath not in cls.pendingDeletions:
+          cls.logger.info('Deleting ' + tombstonePath + ' left in trash by previous run.')
+          cls.scheduleDeletion(tombstonePath)
+
+  @classmethod
+  def scheduleDeletion(cls, tombstonePath):
+    """
+      Schedules background deletion of folder content. Each top level entry is deleted by separate task.
+      :param tombstonePath: Folder in trash to delete.
+    """
+    if cls.pool == None:
+      cls.pool = ThreadPool(config.TRASH_DELETION_WORKERS)
+
+    results = []
+    if os.path.isdir(tombstonePath):
+      for entry in os.listdir(tombstonePath):
+        for subEntry in cls.__listEntries(os.path.join(tombstonePath, entry)):
+          results.append(cls.pool.apply_async(cls.__deletePath, (subEntry,)))
+    cls.pendingDeletions[tombstonePath] = results
+
+  @classmethod
+  def wait(cls, tombstonePaths = None):
+    """
+      Waits until scheduled deletions are finished and removes emptied trash folders.
+      :param tombstonePaths: Trash folders returned by moveFoldersToTrash to wait for. If None, waits for all deletions.
+    """
+    if tombstonePaths == None:
+      tombstonePaths = list(cls.pendingDeletions)
+    tombstonePaths = [tombstonePath for tombstonePath in tombstonePaths if tombstonePath in cls.pendingDeletions]
+    if len(tombstonePaths) == 0:
+      return
+
+    cls.logger.info('Waiting for background deletion of trash folders to finish...')
+    for tombstonePath in tombstonePaths:
+      for result in cls.pendingDeletions[tombstonePath]:
+        result.wait()
+      cls.__deletePath(tombstonePath)
+      del cls.pendingDeletions[tombstonePath]
+
+      #Remove trash folder itself if it is empty
+      trashPath = os.path.dirname(tombstonePath)
+      if os.path.isdir(trashPath) and len(os.listdir(trashPath)) == 0:
+        os.rmdir(trashPath)
+
+  #---------------------------------- Private methods --------------------------------------------
+  @classmethod
+  def __listEntries(cls, path):
+    """
+      Returns folder's top level entries, or path itself if it is a file.
+    """
+    if os.path.isdir(path) and not os.path.islink(path):
+      entries = [os.path.join(path, entry) for entry in os.listdir(path)]
+      #Empty folder is deleted directly
+      if len(entries) == 0:
+        entries = [path]
+      return entries
+    return [path]
+
+  @classmethod
+  def __deletePath(cls, path):
+    """
+      Deletes file or folder. Errors are ignored, because the rest is deleted by the next run.
+    """
+    try:
+      if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, onerror=cls.__onDeleteError)
+      elif os.path.exists(path):
+        os.chmod(path, stat.S_IWRITE)
+        os.remove(path)
+    except Exception as error:
+      if cls.logger != None:
+        cls.logger.warning('Failed deleting ' + path + ': ' + str(error))
+
+  @staticmethod
+  def __onDeleteError(function, path, excinfo):
+    """
+      Clears read only flag and retries deletion.
+    """
+    os.chmod(path, stat.S_IWRITE)
+    function(path)
@@ -69,7 +69,7 @@ class UpdateSample:
             if not os.path.isdir(sample_dir_name):
                 os.makedirs(sample_dir_name)
                 cls.logger.debug("Cloning sample...")
-                cloneCommand = 'git clone -b ' + git_branch + ' ' + git_url + ' ' + sample_dir_name
+                cloneCommand = Utility.getToolCommand('git') + ' clone -b ' + git_branch + ' ' + git_url + ' ' + sample_dir_name
                 cloneCommand = cloneCommand.strip()
                 ret = Utility.runSubprocess([cloneCommand])
                 if ret == NO_ERROR:
@@ -1,18 +1,23 @@
 import os
-import zipfile
 import time
 import tempfile
 import shutil
 import glob
 import sys
+import hashlib
+import config
 from datetime import datetime
 from subprocess import Popen, PIPE, call
 
 from helper import convertToPlatformPath, module_exists, install
-from errors import NO_ERROR, ERROR_UPLOAD_BACKUP_FAILED, ERROR_UPLOAD_BACKUP_FILES_MISSING
+from errors import NO_ERROR, ERROR_UPLOAD_BACKUP_FAILED, ERROR_UPLOAD_BACKUP_FILES_MISSING, ERROR_RESTORE_BACKUP_FAILED
 from settings import Settings
 from utility import Utility
 from createNuget import CreateNuget
+from backup import Backup
+from parallelZip import ParallelZip
+from dedupUpload import DedupUpload
+from chunkedUpload import ChunkedUpload, LocalDirectoryBackend, HttpPutBackend, OneDriveBackend
 from settings import Settings
 from logger import Logger
 
@@ -23,9 +28,11 @@ class UploadBackup:
     def init(cls):
         """
         Initiates logger object.
-        Starts the authentication process.
+        Starts the authentication process, if backup is uploaded with onedrivecmd.
         """
         cls.logger = Logger.getLogger('UploadBackup')
+        if Settings.uploadBackend != 'onedrive' or cls.get_upload_backend() is not None:
+            return
         cls.logger.warning("The authentication process for uploading backup to OneDrive will be started, please follow the instructions.")
         # Install onedrivesdk package if not installed, and import it
         if module_exists('onedrivesdk') and module_exists('onedrivecmd') and module_exists('progress') and module_exists('requests'):
@@ -49,40 +56,115 @@ class UploadBackup:
     @classmethod
     def run(cls):
         """
-        Zipps latest backup based on configuration, and uploads it to onedrive
+        Zipps latest backup based on configuration, or build outputs if uploadBackupFromOutput is set, and uploads it to selected backend.
+        Archive is uploaded while it is written, if backend doesn't need its size upfront. Otherwise it is written to temporary file,
+        that is deleted after upload.
         :return ret: NO_ERROR if upload was successfull. Otherwise returns error code
         """
         ret = NO_ERROR
-        
-        cls.zip_name = ''
-        latest_backup = cls.get_backup_dir()
+        if Settings.uploadBackend in ('local', 'http') and not Settings.uploadBackupURL:
+            cls.logger.error('uploadBackupURL has to be set for ' + Settings.uploadBackend + ' upload backend.')
+            return ERROR_UPLOAD_BACKUP_FAILED
 
-        backup_path = convertToPlatformPath(os.getcwd()+'/' + latest_backup)
-        if os.path.isdir(backup_path):
-            ret = cls.zipdir(backup_path)
+        cls.zip_name = ''
+        if Settings.uploadBackupFromOutput:
+            backup_name = 'Output'
+            ret, files_to_upload = cls.get_output_files()
         else:
-            ret = ERROR_UPLOAD_BACKUP_FAILED
+            latest_backup = cls.get_backup_dir()
+            backup_name = os.path.basename(latest_backup)
 
-        if ret == NO_ERROR:
-            cls.upload_to_onedrive()
+            backup_path = convertToPlatformPath(os.getcwd()+'/' + latest_backup)
+            if os.path.isdir(backup_path):
+                ret, files_to_upload = cls.get_backup_files(backup_path)
+            else:
+                return ERROR_UPLOAD_BACKUP_FAILED
+        if ret != NO_ERROR:
+            return ret
+
+        # Only content that is not uploaded yet is uploaded, if upload destination supports it
+        backend = cls.get_upload_backend()
+        if Settings.uploadDeduplicated and backend is not None:
+            return cls.upload_deduplicated(backend, files_to_upload)
+
+        cls.zip_name, cls.archive_key = cls.get_archive_name(backup_name, files_to_upload)
+        # Journal is kept outside of temporary folder, so interrupted upload can be resumed
+        journal_path = os.path.join(Settings.userWorkingPath, cls.zip_name + config.UPLOAD_JOURNAL_SUFFIX)
+        if backend is not None and not backend.requiresSize:
+            ChunkedUpload.init()
+            return ChunkedUpload.uploadStream(lambda stream: cls.write_archive(stream, files_to_upload) == NO_ERROR,
+                                              backend, cls.zip_name, cls.archive_key, journal_path)
+
+        temp_folder = tempfile.mkdtemp(dir=Settings.userWorkingPath)
+        try:
+            archive_path = os.path.join(temp_folder, cls.zip_name)
+            ret = cls.write_archive(archive_path, files_to_upload)
+            if ret == NO_ERROR:
+                ret = cls.upload(archive_path, journal_path)
+        finally:
+            shutil.rmtree(temp_folder, ignore_errors=True)
         return ret
 
     @classmethod
-    def zipdir(cls, path):
+    def get_backup_files(cls, path):
         """
-        Zip pdb files and nuget package if available
-        :param path: path to the backup file that needs to be zipped.
-        :return ret: NO_ERROR if zipp was successfull. Otherwise returns error code
+        Gets pdb files and nuget package if available
+        :param path: path to the backup folder that needs to be uploaded.
+        :return ret, files_to_upload: NO_ERROR if all files are found, and list of (file path, name in backup) tuples
+        """
+        ret, files_to_upload = cls.get_nuget_package_entry()
+
+        # Upload only combination folders based on configuration from the userdef.py file
+        config_names = set(cls.get_config_names())
+        for name in sorted(os.listdir(path)):
+            combination_path = os.path.join(path, name)
+            if name not in config_names or not os.path.isdir(combination_path):
+                continue
+            for root, dirs, files in os.walk(combination_path):
+                dirs.sort()
+                for file in sorted(files):
+                    files_to_upload.append((os.path.join(root, file), os.path.relpath(os.path.join(root, file), path)))
+
+        return ret, files_to_upload
+
+    @classmethod
+    def get_output_files(cls):
+        """
+        Gets native and wrapper outputs, for configurations from userdef.py file, and nuget package if available.
+        Files are read directly from output folders, with the same layout as in backup folder, so backup action is not needed.
+        :return ret, files_to_upload: NO_ERROR if all files are found, and list of (file path, name in backup) tuples
+        """
+        ret, files_to_upload = cls.get_nuget_package_entry()
+
+        for target in Settings.targets:
+            for platform in Settings.targetPlatforms:
+                for cpu in Settings.targetCPUs:
+                    for configuration in Settings.targetConfigurations:
+                        name = target + '_' + platform + '_' + cpu + '_' + configuration
+                        native_path, wrapper_path = Backup.getOutputPaths(target, platform, cpu, configuration)
+                        output_paths = [('native', native_path)]
+                        if Settings.buildWrapper and wrapper_path != '':
+                            output_paths.append(('wrapper', wrapper_path))
+                        for folder, output_path in output_paths:
+                            if not os.path.isdir(output_path):
+                                cls.logger.error('Missing output folder: ' + output_path)
+                                ret = ERROR_UPLOAD_BACKUP_FILES_MISSING
+                                continue
+                            for root, dirs, files in os.walk(output_path):
+                                for file in files:
+                                    file_path = os.path.join(root, file)
+                                    files_to_upload.append((file_path, os.path.join(name, folder, os.path.relpath(file_path, output_path))))
+
+        return ret, files_to_upload
+
+    @classmethod
+    def get_nuget_package_entry(cls):
+        """
+        Gets nuget package that should be zipped with backup
+        :return ret, files_to_zip: NO_ERROR if package is found or missing package is not an error, and list with (path, name in zip) of the package
         """
         ret = NO_ERROR
-        cls.zip_name = datetime.now().strftime('Backup_%Y-%m-%d_%H-%M-%S') + '.zip'
-        zipf = zipfile.ZipFile(cls.zip_name, 'w', zipfile.ZIP_DEFLATED)
-        count = 0
-        #Get number of files to be zipped in order to display percentage
-        for root, dirs, files in os.walk(path):
-            for file in files:
-                count += 1
-        file_no = 0
+        files_to_zip = []
         nugetPackage = False
         Utility.pushd(Settings.rootSdkPath)
         #Get nuget package that was just created
@@ -104,40 +186,60 @@ class UploadBackup:
                 list_of_files = glob.iglob(Settings.nugetFolderPath + '/*.nupkg')
                 nugetPackage = max(list_of_files, key=os.path.getctime)
         if nugetPackage is not False:
-            zipf.write(nugetPackage, os.path.basename(nugetPackage))
+            files_to_zip.append((os.path.abspath(nugetPackage), os.path.basename(nugetPackage)))
             cls.logger.debug('Zipping nuget package: ' + convertToPlatformPath(nugetPackage))
         else:
             cls.logger.warning('Missing NuGet package!')
         Utility.popd()
-            
+        return ret, files_to_zip
+
+    @classmethod
+    def get_archive_name(cls, backup_name, files_to_zip):
+        """
+        Creates archive name from backup name and fingerprint of archived files. Fingerprint covers names, sizes and
+        modification times of files, that are also entry times in the archive, and compression, so the same files
+        give the same archive, with the same name, and its interrupted upload can be resumed.
+        :param backup_name: Name of uploaded backup.
+        :param files_to_zip: List of (file path, name in zip) tuples.
+        :return zip_name, archive_key: Archive name, and fingerprint used as its content key
+        """
+        fingerprint = hashlib.sha256(Settings.backupArchiveCompression.encode('utf-8'))
+        for file_path, name in files_to_zip:
+            file_stat = os.stat(file_path)
+            fingerprint.update(('\n' + name + '|' + str(file_stat.st_size) + '|' + repr(file_stat.st_mtime)).encode('utf-8'))
+        archive_key = fingerprint.hexdigest()
+        return backup_name + '_' + archive_key[:12] + '.zip', archive_key
+
+    @classmethod
+    def write_archive(cls, archive, files_to_zip):
+        """
+        Writes files to zip archive that will be uploaded. Files are compressed in parallel, and each file is read once.
+        :param archive: Path of the archive, or upload stream.
+        :param files_to_zip: List of (file path, name in zip) tuples.
+        :return ret: NO_ERROR if zipp was successfull. Otherwise returns error code
+        """
         cls.logger.debug('Zipping pdb files.')
         toolbar_width = 60
         sys.stdout.write("[%s]" % (" " * toolbar_width))
         sys.stdout.flush()
         sys.stdout.write("\b" * (toolbar_width+1)) # return to start of line, after '['
 
-        #Used to check if progress bar should progress
-        previous_percentage = -1
-        for root, dirs, files in os.walk(path):
-            for file in files:
-                file_no += 1
-                percent = int(toolbar_width * file_no/count)
-
-                # Add to progress bar
-                if percent != previous_percentage:
-                    sys.stdout.write("-")
-                    sys.stdout.flush()
-
-                # Zip only folders based on configuration from the userdef.py file
-                for name in cls.get_config_names():
-                    if name in root:
-                        zipf.write(os.path.join(root, file), os.path.relpath(os.path.join(root, file), path))
-                
-                previous_percentage = percent
+        #Progress bar advances by zipped bytes, so big pdbs are reflected properly
+        progress = {'width': 0}
+        def show_progress(processed_bytes, total_bytes):
+            width = toolbar_width * processed_bytes // total_bytes if total_bytes > 0 else toolbar_width
+            if width > progress['width']:
+                sys.stdout.write("-" * (width - progress['width']))
+                sys.stdout.flush()
+                progress['width'] = width
+
+        ParallelZip.init()
+        result = ParallelZip.write(archive, files_to_zip, Settings.backupArchiveCompression, progress=show_progress)
         sys.stdout.write("]\n")
+        if not result:
+            return ERROR_UPLOAD_BACKUP_FAILED
         cls.logger.debug('Files zipped to: ' + cls.zip_name)
-        zipf.close()
-        return ret
+        return NO_ERROR
 
     @classmethod
     def get_backup_dir(cls):
@@ -145,8 +247,12 @@ class UploadBackup:
         Get the latest backup folder name
         :return latest_backup: Name of the latest backup folder
         """
+        #The latest backup is recorded in backups index
+        latest_backup = Backup.getLatestBackup()
+        if latest_backup != '':
+            return latest_backup
+
         backupName = os.path.basename(Settings.libsBackupPath)
-        latest_backup = ''
         all_backups = [b_dir for b_dir in os.listdir('.') if os.path.isdir(b_dir) and backupName in b_dir]
 
         if len(all_backups) > 1:
@@ -194,9 +300,80 @@ class UploadBackup:
             return True
 
     @classmethod
-    def upload_to_onedrive(cls):
+    def get_upload_backend(cls):
+        """
+        Creates upload backend selected with uploadBackend setting
+        :return backend: Upload backend, or None if onedrivecmd should be used
+        """
+        if Settings.uploadBackend == 'local':
+            return LocalDirectoryBackend(Settings.uploadBackupURL)
+        if Settings.uploadBackend == 'http':
+            return HttpPutBackend(Settings.uploadBackupURL)
+        access_token = os.environ.get(config.ONEDRIVE_ACCESS_TOKEN_VARIABLE, '')
+        if access_token != '':
+            return OneDriveBackend(config.ONEDRIVE_BACKUP_FOLDER, access_token)
+        return None
+
+    @classmethod
+    def upload(cls, archive_path, journal_path):
+        """
+        Uploads zipped backup in chunks. Interrupted upload is resumed from the last uploaded chunk when upload is run again.
+        :param archive_path: Path of the archive.
+        :param journal_path: Path of resume journal.
+        :return ret: NO_ERROR if upload was successfull. Otherwise returns error code
+        """
+        backend = cls.get_upload_backend()
+        if backend is None:
+            cls.logger.warning(config.ONEDRIVE_ACCESS_TOKEN_VARIABLE + ' is not set. Backup will be uploaded with onedrivecmd, without resume support.')
+            return cls.upload_to_onedrive(archive_path)
+
+        ChunkedUpload.init()
+        ret = ChunkedUpload.upload(archive_path, backend, journalPath=journal_path, contentKey=cls.archive_key)
+        if ret == NO_ERROR:
+            cls.logger.debug('Backup uploaded successfully.')
+        return ret
+
+    @classmethod
+    def upload_deduplicated(cls, backend, files_to_upload):
+        """
+        Uploads only files whose content is not uploaded yet, and manifest of the backup
+        :param backend: Upload backend.
+        :param files_to_upload: List of (file path, name in backup) tuples.
+        :return ret: NO_ERROR if upload was successfull. Otherwise returns error code
+        """
+        backup_name = datetime.now().strftime('Backup_%Y-%m-%d_%H-%M-%S')
+        DedupUpload.init(Settings.userWorkingPath)
+        ret = DedupUpload.upload(backend, backup_name, files_to_upload, Settings.refreshUploadIndex)
+        if ret == NO_ERROR:
+            cls.logger.debug('Backup ' + backup_name + ' uploaded successfully.')
+        return ret
+
+    @classmethod
+    def restore(cls):
+        """
+        Restores uploaded backup, selected with --restoreBackup or the latest one, to the folder with the backup name
+        :return ret: NO_ERROR if backup is restored. Otherwise returns error code
+        """
+        backend = cls.get_upload_backend()
+        if backend is None or (Settings.uploadBackend in ('local', 'http') and not Settings.uploadBackupURL):
+            cls.logger.error('Restore requires ' + config.ONEDRIVE_ACCESS_TOKEN_VARIABLE + ' for onedrive, or uploadBackupURL for ' + Settings.uploadBackend + ' upload backend.')
+            return ERROR_RESTORE_BACKUP_FAILED
+
+        DedupUpload.init(Settings.userWorkingPath)
+        backup_name = Settings.restoreBackupName
+        if backup_name == '':
+            DedupUpload.loadIndex(backend, True)
+            if len(DedupUpload.index['manifests']) == 0:
+                cls.logger.error('There is no uploaded backup to restore.')
+                return ERROR_RESTORE_BACKUP_FAILED
+            backup_name = DedupUpload.index['manifests'][-1]
+        return DedupUpload.restore(backend, backup_name, os.path.join(Settings.userWorkingPath, backup_name))
+
+    @classmethod
+    def upload_to_onedrive(cls, file_path):
         """
         Upload file to onedrive
+        :param file_path: Path of the file to upload.
         :return ret: NO_ERROR if upload was successfull. Otherwise returns error code
         """
         ret = NO_ERROR
@@ -204,9 +381,7 @@ class UploadBackup:
         if not (module_exists('onedrivesdk') and module_exists('onedrivecmd') and module_exists('progress') and module_exists('requests')):
             cls.init()
         
-        file_name = cls.zip_name
-        # Full path of the file to be uploaded
-        file_path = r'./' + file_name
+        file_name = os.path.basename(file_path)
         dir_name_onedrive = 'WebRTC'
 
         upload = ['onedrivecmd', 'put', file_path, 'od:/'+dir_name_onedrive+'/']
@@ -220,7 +395,8 @@ class UploadBackup:
         if err:
             ret = ERROR_UPLOAD_BACKUP_FAILED
             cls.logger.error(err)
-        if file_name in output:
+        # Match whole name, so an older archive whose name contains this one is not taken as uploaded
+        if file_name in output.decode('utf-8', 'replace').split():
             ret = NO_ERROR
             cls.logger.debug('Backup uploaded successfully.')
         else:
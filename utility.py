@@ -1,10 +1,13 @@
 import os
 import sys
 import re
+import errno
 import logging
 import subprocess
 import signal
 import shutil
+import tempfile
+from xml.sax.saxutils import escape
 try:
   from _winreg import HKEY_LOCAL_MACHINE, OpenKey, QueryValueEx, CloseKey
 except:
@@ -19,6 +22,10 @@ class Utility:
   #Used in pushd and popd
   pushstack = list()
   actviveSubprocessList  = list()
+  #Cache of resolved executable paths {executable : path}
+  executablePaths = dict()
+  #Original content of updated files {file_path : content}, used to revert changes
+  originalFiles = dict()
 
   @classmethod
   def setUp(cls):
@@ -41,21 +48,66 @@ class Utility:
   @staticmethod
   def getExecutablePath(executable):
     """
-      Finds executable path.
+      Finds executable path. Found paths are cached, so PATH is searched only once for each executable.
       :param executable: Name of the executable.
       :return executablePath: Executable path.
     """
-    executablePath = None
-    if sys.version_info[0] < 3.3:
+    executablePath = Utility.executablePaths.get(executable, None)
+    if executablePath != None:
+      return executablePath
+
+    if sys.version_info < (3, 3):
       import distutils.spawn
       executablePath = distutils.spawn.find_executable(executable)
     else:
       #Used for Python 3.3 or newer
       import shutil 
       executablePath = shutil.which(executable)
+
+    if executablePath != None:
+      Utility.executablePaths[executable] = os.path.abspath(executablePath)
+      executablePath = Utility.executablePaths[executable]
     
     return executablePath
 
+  @staticmethod
+  def getToolCommand(toolName):
+    """
+      Returns tool executable for use in command line. Absolute path is used if tool is found, 
+      so subprocess doesn't have to search the PATH.
+      :param toolName: Name of the tool executable.
+      :return command: Quoted absolute path to the tool if found, otherwise executable name (with .exe on Windows).
+    """
+    toolName = Utility.getToolExecutableName(toolName)
+    executablePath = Utility.getExecutablePath(toolName)
+    if executablePath == None:
+      return toolName
+    return '\"' + executablePath + '\"'
+
+  @staticmethod
+  def getToolExecutableName(toolName):
+    """
+      Returns tool executable name that is looked up in the PATH.
+      :param toolName: Name of the tool executable.
+      :return executableName: Tool name with .exe on Windows, otherwise tool name.
+    """
+    #Subprocesses are run without shell, so on Windows only .exe is looked up, and not .bat or .cmd shims, i.e. from depot_tools
+    if sys.platform == 'win32' and not toolName.lower().endswith('.exe'):
+      return toolName + '.exe'
+    return toolName
+
+  @staticmethod
+  def resolveTools(toolNames):
+    """
+      Resolves and caches paths of provided tools, under the same executable names that getToolCommand looks up.
+      :param toolNames: List of tool executable names.
+      :return toolPaths: Dictionary with tool name as key and its path (or None if tool is not found) as value.
+    """
+    toolPaths = dict()
+    for toolName in toolNames:
+      toolPaths[toolName] = Utility.getExecutablePath(Utility.getToolExecutableName(toolName))
+    return toolPaths
+
   @staticmethod
   def searchFileInPATH(fileName):
     """
@@ -77,17 +129,30 @@ class Utility:
     """
     sys.path.append(path)
 
+  @staticmethod
+  def getUniquePaths(pathVariable):
+    """
+      Splits PATH like variable and removes empty and duplicated entries, keeping the first occurrence.
+      :param pathVariable: PATH like string.
+      :return uniquePaths: List of unique paths.
+    """
+    uniquePaths = []
+    seenPaths = set()
+    for path in pathVariable.split(os.pathsep):
+      normalizedPath = os.path.normcase(os.path.normpath(path)) if path != '' else ''
+      if normalizedPath != '' and normalizedPath not in seenPaths:
+        seenPaths.add(normalizedPath)
+        uniquePaths.append(path)
+    return uniquePaths
+
   @staticmethod
   def addPath(path):
     """
-      Adds path to system PATH.
+      Adds path to system PATH, if it is not already there. Duplicated PATH entries are removed.
       :param path: Path to add.
     """
-    newPath = os.environ['PATH']
-    if newPath.endswith(';'):
-      newPath = newPath[:-1]
-    newPath += ';' + path
-    os.environ['PATH'] = newPath
+    paths = Utility.getUniquePaths(os.environ['PATH'] + os.pathsep + path)
+    os.environ['PATH'] = os.pathsep.join(paths)
 
   @staticmethod
   def removePath(path):
@@ -95,8 +160,11 @@ class Utility:
       Removes path from the sytem PATH.
       :param path: Path to remove.
     """
-    newPath = os.environ['PATH'].replace(path + os.pathsep,'').replace(path,'')
-    os.environ['PATH'] = newPath
+    normalizedPath = os.path.normcase(os.path.normpath(path))
+    paths = [p for p in Utility.getUniquePaths(os.environ['PATH']) if os.path.normcase(os.path.normpath(p)) != normalizedPath]
+    os.environ['PATH'] = os.pathsep.join(paths)
+    #Cached tool paths can point to removed folder
+    Utility.executablePaths.clear()
 
   @staticmethod
   def getBranch():
@@ -104,7 +172,7 @@ class Utility:
       Returns the branch name for the root SDK git repository
       :return branch: branch name
     """
-    branch = Utility.executeCommand('git rev-parse --abbrev-ref HEAD')
+    branch = Utility.executeCommand(Utility.getToolCommand('git') + ' rev-parse --abbrev-ref HEAD')
     return branch
     
   @staticmethod
@@ -113,7 +181,7 @@ class Utility:
       Returns the repo url for the root SDK git repository
       :return repo: repo url
     """
-    repo = Utility.executeCommand('git remote get-url origin')
+    repo = Utility.executeCommand(Utility.getToolCommand('git') + ' remote get-url origin')
     return repo
 
   @classmethod
@@ -266,6 +334,35 @@ class Utility:
     
     return ret
 
+  @staticmethod
+  def linkFile(source, destination):
+    """
+      Creates hard link to file. Existing destination file is removed first, so its content, that may be shared with
+      other links, is not overwritten. File is copied, together with its modification time, only if hard link can't be
+      created because destination is on another volume or file system doesn't support hard links.
+      :param source: File to link.
+      :param destination: Path of the link to create.
+    """
+    if os.path.lexists(destination):
+      os.remove(destination)
+    try:
+      if hasattr(os, 'link'):
+        os.link(source, destination)
+        return
+      if sys.platform == 'win32':
+        import ctypes
+        kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        if kernel32.CreateHardLinkW(ctypes.c_wchar_p(destination), ctypes.c_wchar_p(source), None):
+          return
+        raise ctypes.WinError(ctypes.get_last_error())
+    except OSError as error:
+      unsupportedErrors = [errno.EXDEV, errno.EPERM, errno.EMLINK, getattr(errno, 'ENOTSUP', None), getattr(errno, 'EOPNOTSUPP', None)]
+      #ERROR_INVALID_FUNCTION, ERROR_NOT_SAME_DEVICE, ERROR_NOT_SUPPORTED, ERROR_TOO_MANY_LINKS
+      unsupportedWindowsErrors = [1, 17, 50, 1142]
+      if error.errno not in unsupportedErrors and getattr(error, 'winerror', None) not in unsupportedWindowsErrors:
+        raise
+    shutil.copy2(source, destination)
+
   @classmethod
   def deleteFiles(cls, files):
     """
@@ -357,55 +454,108 @@ class Utility:
   @classmethod
   def importDependencyForTarget(cls, gnFile, target, dependency):
     """
-      Insert additional dependencies for specified target.
+      Insert additional dependency for specified target.
       :param gnFile: Gn file to update.
       :param target: Target whose dependencies need to be updated.
       :param dependency: Dependency to add.
       :return ret: True if successfully update, otherwise False.
     """
+    return cls.importDependenciesForTarget(gnFile, target, [dependency])
+
+  @classmethod
+  def importDependenciesForTarget(cls, gnFile, target, dependencies):
+    """
+      Insert all additional dependencies for specified target in one pass. File is 
+      written only if its content is changed.
+      :param gnFile: Gn file to update.
+      :param target: Target whose dependencies need to be updated.
+      :param dependencies: List of dependencies to add.
+      :return ret: True if successfully update, otherwise False.
+    """
     ret = True
     if os.path.exists(gnFile):
       try:
-        #Search for "name_of_target"
-        targetMark = '(\"' + target + '\")'
-        #regex search for deps i.e. 'deps = ['. Re search for: spaces, 'deps', spaces, '=', spaces, '[' 
-        depsRegex = r'\s*deps\s*=\s*\[*'
-        depsFlag = False
-        insertFlag = False
-        #Read gn file content
         with open(gnFile, 'r') as gnReadFile:
-          gnContent = gnReadFile.readlines()
-        #Open file for writing
-        with open(gnFile,'w') as gnWriteFile:
-          for line in gnContent:
-            gnWriteFile.write(line)
-            #Check if read line contains 'name_of_target', and set depsFlag to true if contains
-            if targetMark in line:
-              depsFlag = True
-            else:
-              if depsFlag:
-                #If desired target is found, search fo deps and set insertFlag to true if found
-                if re.findall(depsRegex,line) != []:
-                  insertFlag = True
-                  depsFlag = False
-              elif insertFlag:
-                #If deps is found insert new dependecy
-                gnWriteFile.write('"' + dependency + '",')
-                insertFlag = False
+          gnContent = gnReadFile.read()
+
+        updatedContent = cls.addDependenciesToGnContent(gnContent, target, dependencies)
+        if updatedContent == None:
+          ret = False
+          cls.logger.error('Target ' + target + ' or its deps are not found in gn file ' + gnFile)
+        elif updatedContent != gnContent:
+          cls.writeFileAtomically(gnFile, updatedContent)
       except Exception as error:
         ret = False
         cls.logger.error(str(error))
-        cls.logger.error('Failed updating target ' + target + ' with dependency ' + dependency + ' in gn file ' + gnFile)
+        cls.logger.error('Failed updating target ' + target + ' with dependencies ' + str(dependencies) + ' in gn file ' + gnFile)
     else:
       ret = False
       cls.logger.error('Gn file ' + gnFile + ' doesn\'t exist')
 
     return ret
 
+  @staticmethod
+  def addDependenciesToGnContent(gnContent, target, dependencies):
+    """
+      Inserts dependencies in the first deps list found after target declaration. 
+      Dependencies that are already in that list are skipped.
+      :param gnContent: Gn file content.
+      :param target: Target whose dependencies need to be updated.
+      :param dependencies: List of dependencies to add.
+      :return updatedContent: Updated gn content, or None if target or its deps list is not found.
+    """
+    #Search for "name_of_target"
+    targetIndex = gnContent.find('(\"' + target + '\")')
+    if targetIndex == -1:
+      return None
+
+    #regex search for deps i.e. 'deps = ['. Re search for: 'deps', spaces, '=', spaces, '['
+    depsMatch = re.compile(r'deps\s*=\s*\[').search(gnContent, targetIndex)
+    if depsMatch == None:
+      return None
+
+    insertIndex = depsMatch.end()
+    depsEndIndex = gnContent.find(']', insertIndex)
+    existingDeps = gnContent[insertIndex:depsEndIndex]
+
+    newDeps = ''
+    for dependency in dependencies:
+      quotedDependency = '"' + dependency + '"'
+      if quotedDependency not in existingDeps and quotedDependency not in newDeps:
+        newDeps += quotedDependency + ','
+
+    return gnContent[:insertIndex] + newDeps + gnContent[insertIndex:]
+
+  @classmethod
+  def writeFileAtomically(cls, filePath, content, binary = False):
+    """
+      Writes content to temporary file in the same folder and renames it to the specified file.
+      :param filePath: Path of the file to write.
+      :param content: File content.
+      :param binary: If True, content is bytes, written as they are.
+    """
+    fileHandle, tempFilePath = tempfile.mkstemp(prefix=os.path.basename(filePath) + '.', suffix='.tmp', dir=os.path.dirname(os.path.abspath(filePath)))
+    try:
+      with os.fdopen(fileHandle, 'wb' if binary else 'w') as tempFile:
+        tempFile.write(content)
+      if os.path.exists(filePath):
+        shutil.copymode(filePath, tempFilePath)
+      if hasattr(os, 'replace'):
+        os.replace(tempFilePath, filePath)
+      else:
+        #Python 2 on Windows can't rename over existing file
+        if os.name == 'nt' and os.path.exists(filePath):
+          os.remove(filePath)
+        os.rename(tempFilePath, filePath)
+    except:
+      if os.path.exists(tempFilePath):
+        os.remove(tempFilePath)
+      raise
+
   @classmethod
   def backUpAndUpdateGnFile(cls, filePath, targetToUpdate, dependencyToAdd):
     """
-      Backups specified gn files and updates dependency for target in that file.
+      Keeps original gn file content in memory and updates dependencies for target in that file.
       :param filePath: Gn file path.
       :param targetToUpdate: Name of the target to update.
       :param dependencyToAdd: List of dependecies to add.
@@ -414,16 +564,17 @@ class Utility:
     ret = True
     if os.path.isfile(filePath):
       try:
-        #Backup gn file
-        shutil.copyfile(filePath, filePath + '.bak')
+        #Keep the first original content, if file is updated more than once before it is returned to original
+        if filePath not in cls.originalFiles:
+          with open(filePath, 'r') as originalFile:
+            cls.originalFiles[filePath] = originalFile.read()
       except Exception as error:
         ret = False
         cls.logger.error(str(error))
-        cls.logger.error('Failed creating ' + filePath + ' backup file')
+        cls.logger.error('Failed reading ' + filePath + ' original content')
       if ret:
         #Add dependencies
-        for dependecy in dependencyToAdd:
-          ret = cls.importDependencyForTarget(filePath, targetToUpdate, dependecy)
+        ret = cls.importDependenciesForTarget(filePath, targetToUpdate, dependencyToAdd)
     else:
       ret = False
       cls.logger.warning(filePath + ' doesn\'t exist.')
@@ -433,26 +584,62 @@ class Utility:
   @classmethod
   def returnOriginalFile(cls, filePath):
     """
-      Replace file with its backup version.
+      Replace file with its original content, saved by backUpAndUpdateGnFile.
       :param filePath: Path to file to revert to original state.
       :return ret: True if original file is recovered.
     """
     ret = True
-    backupFilePath = filePath + '.bak'
-    if os.path.isfile(filePath) and os.path.isfile(backupFilePath):
+    originalContent = cls.originalFiles.pop(filePath, None)
+    if originalContent != None and os.path.isfile(filePath):
       try:
-        shutil.copyfile(backupFilePath, filePath)
-        os.remove(backupFilePath)
+        with open(filePath, 'r') as currentFile:
+          currentContent = currentFile.read()
+        if currentContent != originalContent:
+          cls.writeFileAtomically(filePath, originalContent)
       except Exception as error:
         ret = False
         cls.logger.error(str(error))
-        cls.logger.error('Failed replacing ' + filePath + ' with its backup version.')
+        cls.logger.error('Failed replacing ' + filePath + ' with its original content.')
     else:
       ret = False
-      cls.logger.warning(filePath + ' or its backup doesn\'t exist.')
+      cls.logger.warning(filePath + ' or its original content doesn\'t exist.')
     
     return ret
 
+  @staticmethod
+  def getSolutionProjects(solutionPath, solutionFolder = None):
+    """
+      Returns paths of projects listed in solution.
+      :param solutionPath: Path to solution file.
+      :param solutionFolder: Folder from which project paths are resolved. If None, solution folder is used.
+      :return projects: List of project paths.
+    """
+    if solutionFolder == None:
+      solutionFolder = os.path.dirname(solutionPath)
+
+    with open(solutionPath, 'r') as solutionFile:
+      solutionContent = solutionFile.read()
+
+    projectPaths = re.findall(r'^Project\("[^"]*"\)\s*=\s*"[^"]*"\s*,\s*"([^"]+proj)"', solutionContent, re.MULTILINE)
+    return [os.path.normpath(os.path.join(solutionFolder, convertToPlatformPath(projectPath))) for projectPath in projectPaths]
+
+  @staticmethod
+  def createTraversalProject(solutionPath, msbuildTarget, combinations):
+    """
+      Creates msbuild project that runs target on solution for multiple cpu and configuration combinations in parallel.
+      :param solutionPath: Path to solution.
+      :param msbuildTarget: MSBuild target to run (Build, Clean...).
+      :param combinations: List of (cpu, configuration) tuples.
+      :return projectContent: Traversal project content.
+    """
+    items = ''
+    for cpu, configuration in combinations:
+      items += '    <SolutionConfiguration Include="' + escape(solutionPath) + '">\n' + \
+               '      <Properties>Configuration=' + escape(configuration) + ';Platform=' + escape(cpu) + '</Properties>\n' + \
+               '    </SolutionConfiguration>\n'
+
+    return config.MSBUILD_TRAVERSAL_PROJECT_TEMPLATE.replace('[TARGET]', msbuildTarget).replace('[ITEMS]', items)
+
   @classmethod
   def getValueForTargetAndPlatformDict(cls, dict, target, platform):
     """
@@ -626,4 +813,39 @@ class Utility:
       ret = ret and os.path.isfile(destinationFile)
 
     return ret
-    
\ No newline at end of file
+    
+
+  @staticmethod
+  def getFreeDiskSpace(path):
+    """
+      Returns free space on the volume that contains specified path.
+      :param path: Path on the volume.
+      :return freeSpace: Free space in bytes.
+    """
+    if hasattr(shutil, 'disk_usage'):
+      return shutil.disk_usage(path).free
+    if sys.platform == 'win32':
+      import ctypes
+      freeBytes = ctypes.c_ulonglong(0)
+      ctypes.windll.kernel32.GetDiskFreeSpaceExW(ctypes.c_wchar_p(os.path.abspath(path)), None, None, ctypes.pointer(freeBytes))
+      return freeBytes.value
+    stats = os.statvfs(path)
+    return stats.f_bavail * stats.f_frsize
+
+  @staticmethod
+  def getFolderSize(path):
+    """
+      Returns size of all files in folder and its subfolders.
+      :param path: Folder path.
+      :return size: Size in bytes.
+    """
+    size = 0
+    for root, dirs, files in os.walk(path):
+      for file in files:
+        filePath = os.path.join(root, file)
+        if not os.path.islink(filePath):
+          try:
+            size += os.path.getsize(filePath)
+          except OSError:
+            pass
+    return size